@@ -0,0 +1,780 @@
+import os
+
+# config.py insists on credentials at import time; nothing here talks to a real cluster or signs with them.
+os.environ.setdefault("PRIVATE_KEY", "offline-benchmark")
+os.environ.setdefault("RPC", "http://127.0.0.1")
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import random
+import struct
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from functools import partial
+
+import aiohttp
+from aiohttp import web
+from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import ID as ADDRESS_LOOKUP_TABLE_PROGRAM, AddressLookupTable, \
+    derive_lookup_table_address
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.transaction import VersionedTransaction
+from spl.token.constants import ASSOCIATED_TOKEN_PROGRAM_ID
+
+import raydium_amm
+from blockhash import SLOT_TIME, BlockhashService
+from campaigns import Campaign, run_campaigns
+from confirmation import ConfirmationTracker
+from constants import OPEN_BOOK_PROGRAM, RAY_AUTHORITY_V4, RAY_V4, SOL, TOKEN_PROGRAM_ID, WSOL
+from derivations import ata_address
+from fast_layouts import LIQUIDITY_STATE_V4, MARKET_STATE_V3, TOKEN_ACCOUNT, TOKEN_ACCOUNT_AMOUNT_OFFSET, \
+    TOKEN_ACCOUNT_AMOUNT_SIZE
+from fee_engine import percentile
+from logging_config import setup_logging
+from lookup_tables import CREATE_LOOKUP_TABLE, EXTEND_LOOKUP_TABLE, LookupTableManager
+import metrics
+from pool_cache import PoolKeysCache
+from rate_limit import TokenBucket
+from reserve_feed import ws_url_from_http
+from rpc_pool import RpcPool
+from scheduler import TradeScheduler
+from settings import RPC_BURST, RPC_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+BASE_SLOT = 300_000_000
+# Blocks a fresh blockhash stays valid for
+BLOCKHASH_VALIDITY = 150
+SYSTEM_PROGRAM = Pubkey.from_string("11111111111111111111111111111111")
+# Rent-exempt balance of a 165-byte token account
+TOKEN_ACCOUNT_RENT = 2_039_280
+# Compute units reported by simulateTransaction for every transaction
+SIMULATED_UNITS = 60_000
+# Token program instruction tag of CloseAccount
+CLOSE_ACCOUNT = 9
+# Lookup table account header: type tag, deactivation slot, last extended slot and its start index, followed by
+# the optional authority and two bytes of padding
+LOOKUP_TABLE_META = struct.Struct("<IQQB")
+LOOKUP_TABLE_ACTIVE = 2 ** 64 - 1
+# Methods on the per-trade path that error and 429 injection apply to. Startup calls (pool resolution, the first
+# blockhash) are left alone: the bot does not retry them, so faulting them would only abort the run.
+FAULTY_METHODS = frozenset({
+    "getMultipleAccounts", "getTokenAccountsByOwner", "simulateTransaction", "sendTransaction",
+    "getSignatureStatuses",
+})
+
+
+class TransactionRejected(Exception):
+    """A sent transaction the stand-in cannot apply, answered like a failed preflight."""
+
+
+@dataclass
+class StandInAccount:
+    lamports: int
+    owner: Pubkey
+    data: bytes
+
+
+@dataclass
+class Fixture:
+    """Pool accounts served by the stand-in: recorded from a live cluster or synthesized."""
+
+    mint: Pubkey
+    amm_id: Pubkey
+    accounts: dict[Pubkey, StandInAccount]
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            json.dump({
+                "mint": str(self.mint),
+                "amm_id": str(self.amm_id),
+                "accounts": {str(key): {"lamports": account.lamports, "owner": str(account.owner),
+                                        "data": base64.b64encode(account.data).decode()}
+                             for key, account in self.accounts.items()},
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "Fixture":
+        with open(path) as f:
+            raw = json.load(f)
+        accounts = {Pubkey.from_string(key): StandInAccount(account["lamports"], Pubkey.from_string(account["owner"]),
+                                                            base64.b64decode(account["data"]))
+                    for key, account in raw["accounts"].items()}
+        return cls(Pubkey.from_string(raw["mint"]), Pubkey.from_string(raw["amm_id"]), accounts)
+
+
+def token_account_data(mint: Pubkey, owner: Pubkey, amount: int) -> bytes:
+    return TOKEN_ACCOUNT.build({
+        "mint": bytes(mint), "owner": bytes(owner), "amount": amount, "delegate_option": 0, "delegate": bytes(32),
+        "state": 1, "is_native_option": 0, "is_native": 0, "delegated_amount": 0, "close_authority_option": 0,
+        "close_authority": bytes(32),
+    })
+
+
+def synthetic_fixture(sol_reserve: int = 500 * 10 ** 9, token_reserve: int = 10 ** 15,
+                      token_decimals: int = 6) -> Fixture:
+    mint, amm_id, market_id = Pubkey.new_unique(), Pubkey.new_unique(), Pubkey.new_unique()
+    base_vault, quote_vault = Pubkey.new_unique(), Pubkey.new_unique()
+    for nonce in range(256):
+        # create_program_address panics (a BaseException) on an on-curve result, so test the hash up front.
+        seeds = bytes(market_id) + bytes([nonce]) + bytes(7)
+        digest = hashlib.sha256(seeds + bytes(OPEN_BOOK_PROGRAM) + b"ProgramDerivedAddress").digest()
+        if not Pubkey(digest).is_on_curve():
+            break
+
+    amm = {name: 0 for name, kind in LIQUIDITY_STATE_V4.fields if kind in ("u64", "u128")}
+    amm.update({name: bytes(Pubkey.new_unique()) for name, kind in LIQUIDITY_STATE_V4.fields if kind == "pubkey"})
+    amm.update(status=6, coinDecimals=token_decimals, pcDecimals=9, tradeFeeNumerator=25, tradeFeeDenominator=10000,
+               poolCoinTokenAccount=bytes(base_vault), poolPcTokenAccount=bytes(quote_vault),
+               coinMintAddress=bytes(mint), pcMintAddress=bytes(WSOL), serumMarket=bytes(market_id),
+               serumProgramId=bytes(OPEN_BOOK_PROGRAM))
+    market = {name: 0 for name, kind in MARKET_STATE_V3.fields if kind == "u64"}
+    market.update({name: bytes(Pubkey.new_unique()) for name, kind in MARKET_STATE_V3.fields if kind == "pubkey"})
+    market.update(account_flags=0b11, own_address=bytes(market_id), vault_signer_nonce=nonce, base_mint=bytes(mint),
+                  quote_mint=bytes(WSOL))
+    market_data = b"serum" + MARKET_STATE_V3.build(market)[5:-7] + b"padding"
+
+    accounts = {
+        amm_id: StandInAccount(10 ** 9, RAY_V4, LIQUIDITY_STATE_V4.build(amm)),
+        market_id: StandInAccount(10 ** 9, OPEN_BOOK_PROGRAM, market_data),
+        base_vault: StandInAccount(TOKEN_ACCOUNT_RENT, TOKEN_PROGRAM_ID,
+                                   token_account_data(mint, RAY_AUTHORITY_V4, token_reserve)),
+        quote_vault: StandInAccount(TOKEN_ACCOUNT_RENT + sol_reserve, TOKEN_PROGRAM_ID,
+                                    token_account_data(WSOL, RAY_AUTHORITY_V4, sol_reserve)),
+    }
+    return Fixture(mint, amm_id, accounts)
+
+
+async def record_fixture(rpc: str, pair_address: str) -> Fixture:
+    # Captures the AMM, market and vault accounts of a live pool so runs replay its exact bytes.
+    async with AsyncClient(rpc) as client:
+        pool_keys = await raydium_amm.fetch_pool_keys(client, pair_address)
+        keys = [pool_keys["amm_id"], pool_keys["market_id"], pool_keys["base_vault"], pool_keys["quote_vault"]]
+        response = await client.get_multiple_accounts(keys)
+    accounts = {key: StandInAccount(info.lamports, info.owner, bytes(info.data))
+                for key, info in zip(keys, response.value)}
+    mint = pool_keys["base_mint"] if pool_keys["base_mint"] != WSOL else pool_keys["quote_mint"]
+    return Fixture(mint, pool_keys["amm_id"], accounts)
+
+
+class StandInServer:
+    """Local aiohttp stand-in for the Solana JSON-RPC methods and the DexScreener endpoint the bot uses.
+
+    The same URL also accepts websocket upgrades for accountSubscribe: subscribers get an accountNotification
+    whenever an account changes through update_token_amount and after every landed transaction, and
+    drop_connections (or ws_drop_interval) cuts them off to exercise reconnects. ws_enabled=False refuses the
+    upgrade, leaving the reserve feed on its polling fallback.
+
+    Swaps are not executed, but a sent transaction does apply the account lifecycle the bot depends on: a
+    wallet's wSOL account it closes reads as missing until an associated token account instruction creates it
+    again, and address lookup tables it creates or extends are served like any other account. Other token
+    accounts stay put, as the stand-in does not track the balances that decide whether their close would succeed.
+    A transaction the stand-in cannot apply is refused the way a failed preflight would be, and simulating one that
+    loads addresses from a missing table fails.
+    """
+
+    def __init__(self, fixture: Fixture, latency: float = 0.0, jitter: float = 0.5, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, drop_rate: float = 0.0, confirm_delay: float = 2 * SLOT_TIME,
+                 token_balance: int = 10 ** 9, wallet_lamports: int = 10 ** 9, ws_enabled: bool = True,
+                 ws_drop_interval: float = 0.0):
+        self.fixture = fixture
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.drop_rate = drop_rate
+        self.confirm_delay = confirm_delay
+        self.ws_enabled = ws_enabled
+        self.ws_drop_interval = ws_drop_interval
+        # Every account the fixture does not know is served as a funded token account: wallets, their ATAs and
+        # wSOL accounts all decode, so buys skip ATA creation and sells find a balance.
+        self.default_account = StandInAccount(wallet_lamports, TOKEN_PROGRAM_ID,
+                                              token_account_data(fixture.mint, SYSTEM_PROGRAM, token_balance))
+        self.closed: set[Pubkey] = set()
+        self.calls: Counter[str] = Counter()
+        self.errors = 0
+        self.throttled = 0
+        self.http_requests = 0
+        self.ws_connections = 0
+        self.ws_drops = 0
+        self.notifications = 0
+        self._landed: dict[str, tuple[float, int]] = {}
+        # subscription id -> (socket, account key, subscription config)
+        self._subscriptions: dict[int, tuple[web.WebSocketResponse, str, dict]] = {}
+        self._subscription_ids = itertools.count(1)
+        self._sockets: set[web.WebSocketResponse] = set()
+        self._tasks: set[asyncio.Task] = set()
+        self._started = time.monotonic()
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+        self.handlers = {
+            "getAccountInfo": self._get_account_info,
+            "getMultipleAccounts": self._get_multiple_accounts,
+            "getProgramAccounts": self._get_program_accounts,
+            "getTokenAccountsByOwner": self._get_token_accounts_by_owner,
+            "getLatestBlockhash": self._get_latest_blockhash,
+            "getBlockHeight": lambda params: self.block_height,
+            "getSlot": lambda params: self.slot,
+            "simulateTransaction": self._simulate_transaction,
+            "sendTransaction": self._send_transaction,
+            "getSignatureStatuses": self._get_signature_statuses,
+            "getRecentPrioritizationFees": self._get_recent_prioritization_fees,
+        }
+
+    @property
+    def slot(self) -> int:
+        return BASE_SLOT + int((time.monotonic() - self._started) / SLOT_TIME)
+
+    @property
+    def block_height(self) -> int:
+        return self.slot - BASE_SLOT // 10
+
+    @property
+    def rpc_calls(self) -> int:
+        return sum(count for method, count in self.calls.items() if method != "dexscreener")
+
+    def _context(self, value) -> dict:
+        return {"context": {"slot": self.slot}, "value": value}
+
+    def _encode_account(self, account: StandInAccount | None, config: dict) -> dict | None:
+        if account is None:
+            return None
+        data = account.data
+        data_slice = config.get("dataSlice")
+        if data_slice:
+            data = data[data_slice["offset"]:data_slice["offset"] + data_slice["length"]]
+        return {"data": [base64.b64encode(data).decode(), "base64"], "executable": False,
+                "lamports": account.lamports, "owner": str(account.owner), "rentEpoch": 0,
+                "space": len(account.data)}
+
+    def _account(self, key: str) -> StandInAccount | None:
+        pubkey = Pubkey.from_string(key)
+        if pubkey in self.closed:
+            return None
+        return self.fixture.accounts.get(pubkey, self.default_account)
+
+    def _get_account_info(self, params: list):
+        config = params[1] if len(params) > 1 else {}
+        return self._context(self._encode_account(self._account(params[0]), config))
+
+    def _get_multiple_accounts(self, params: list):
+        config = params[1] if len(params) > 1 else {}
+        return self._context([self._encode_account(self._account(key), config) for key in params[0]])
+
+    def _get_program_accounts(self, params: list):
+        program_id = Pubkey.from_string(params[0])
+        config = params[1] if len(params) > 1 else {}
+        matches = []
+        for key, account in self.fixture.accounts.items():
+            if account.owner != program_id:
+                continue
+            for account_filter in config.get("filters") or ():
+                if "dataSize" in account_filter and len(account.data) != account_filter["dataSize"]:
+                    break
+                if "memcmp" in account_filter:
+                    # The bot only ever compares pubkeys, so a base58 pubkey decode covers every memcmp it sends.
+                    offset, expected = account_filter["memcmp"]["offset"], bytes(
+                        Pubkey.from_string(account_filter["memcmp"]["bytes"]))
+                    if account.data[offset:offset + len(expected)] != expected:
+                        break
+            else:
+                matches.append({"pubkey": str(key), "account": self._encode_account(account, config)})
+        return matches
+
+    def _get_token_accounts_by_owner(self, params: list):
+        owner, token_filter = Pubkey.from_string(params[0]), params[1]
+        config = params[2] if len(params) > 2 else {}
+        mint = Pubkey.from_string(token_filter["mint"]) if "mint" in token_filter else self.fixture.mint
+        return self._context([{"pubkey": str(ata_address(owner, mint)),
+                               "account": self._encode_account(self.default_account, config)}])
+
+    def _get_latest_blockhash(self, params: list):
+        slot = self.slot
+        return self._context({"blockhash": str(Hash.hash(slot.to_bytes(8, "little"))),
+                              "lastValidBlockHeight": self.block_height + BLOCKHASH_VALIDITY})
+
+    def _simulate_transaction(self, params: list):
+        txn = VersionedTransaction.from_bytes(base64.b64decode(params[0]))
+        try:
+            self._message_keys(txn.message)
+        except TransactionRejected as e:
+            return self._context({"err": "AddressLookupTableNotFound", "logs": [str(e)], "accounts": None,
+                                  "unitsConsumed": 0, "returnData": None})
+        return self._context({"err": None, "logs": [], "accounts": None, "unitsConsumed": SIMULATED_UNITS,
+                              "returnData": None})
+
+    def _send_transaction(self, params: list):
+        txn = VersionedTransaction.from_bytes(base64.b64decode(params[0]))
+        signature = str(txn.signatures[0])
+        if signature not in self._landed and random.random() >= self.drop_rate:
+            self._apply(txn)
+            self._landed[signature] = (time.monotonic() + self.confirm_delay, self.slot)
+            if self._subscriptions:
+                # A landed swap moves the pool vaults, so their subscribers hear about it.
+                self._spawn(self.notify(*{key for _, key, _ in self._subscriptions.values()}))
+        return signature
+
+    def _lookup_table_addresses(self, table: Pubkey) -> list[Pubkey]:
+        account = self.fixture.accounts.get(table)
+        if account is None or account.owner != ADDRESS_LOOKUP_TABLE_PROGRAM:
+            raise TransactionRejected(f"Lookup table {table} not found")
+        return list(AddressLookupTable.deserialize(account.data).addresses)
+
+    def _message_keys(self, message) -> list[Pubkey]:
+        # Loaded addresses follow the static keys: the writable ones of every table first, then the read-only ones.
+        keys = list(message.account_keys)
+        lookups = list(getattr(message, "address_table_lookups", None) or ())
+        tables = [self._lookup_table_addresses(lookup.account_key) for lookup in lookups]
+        for indexes in ("writable_indexes", "readonly_indexes"):
+            for lookup, addresses in zip(lookups, tables):
+                keys += [addresses[index] for index in getattr(lookup, indexes)]
+        return keys
+
+    def _apply_lookup_table(self, accounts: list[Pubkey], data: bytes):
+        tag, = struct.unpack_from("<I", data)
+        table, authority = accounts[0], accounts[1]
+        if tag == CREATE_LOOKUP_TABLE:
+            recent_slot, bump = struct.unpack_from("<QB", data, 4)
+            if (table, bump) != derive_lookup_table_address(authority, recent_slot):
+                raise TransactionRejected(f"Lookup table {table} is not derived from {authority} "
+                                          f"and slot {recent_slot}")
+            if table in self.fixture.accounts:
+                raise TransactionRejected(f"Lookup table {table} already exists")
+            header = LOOKUP_TABLE_META.pack(1, LOOKUP_TABLE_ACTIVE, 0, 0) + b"\x01" + bytes(authority) + bytes(2)
+            self.fixture.accounts[table] = StandInAccount(TOKEN_ACCOUNT_RENT, ADDRESS_LOOKUP_TABLE_PROGRAM, header)
+        elif tag == EXTEND_LOOKUP_TABLE:
+            addresses = self._lookup_table_addresses(table)
+            count, = struct.unpack_from("<Q", data, 4)
+            extension = data[12:12 + 32 * count]
+            account = self.fixture.accounts[table]
+            header = LOOKUP_TABLE_META.pack(1, LOOKUP_TABLE_ACTIVE, self.slot, len(addresses))
+            account.data = header + account.data[LOOKUP_TABLE_META.size:] + extension
+        else:
+            raise TransactionRejected(f"Unsupported lookup table instruction {tag}")
+
+    def _apply(self, txn: VersionedTransaction):
+        message = txn.message
+        keys = self._message_keys(message)
+        for instruction in message.instructions:
+            program = keys[instruction.program_id_index]
+            accounts = [keys[index] for index in instruction.accounts]
+            if program == TOKEN_PROGRAM_ID and instruction.data[:1] == bytes([CLOSE_ACCOUNT]):
+                if accounts[0] == ata_address(accounts[2], WSOL):
+                    self.closed.add(accounts[0])
+            elif program == ASSOCIATED_TOKEN_PROGRAM_ID and len(accounts) > 1:
+                self.closed.discard(accounts[1])
+            elif program == ADDRESS_LOOKUP_TABLE_PROGRAM:
+                self._apply_lookup_table(accounts, bytes(instruction.data))
+
+    def _get_signature_statuses(self, params: list):
+        now = time.monotonic()
+        statuses = []
+        for signature in params[0]:
+            landed = self._landed.get(signature)
+            if landed is None or landed[0] > now:
+                statuses.append(None)
+            else:
+                statuses.append({"slot": landed[1], "confirmations": None, "err": None, "status": {"Ok": None},
+                                 "confirmationStatus": "confirmed"})
+        return self._context(statuses)
+
+    def _get_recent_prioritization_fees(self, params: list):
+        slot = self.slot
+        return [{"slot": slot - i, "prioritizationFee": random.randint(0, 200_000)} for i in range(150)]
+
+    def _dispatch(self, request: dict) -> dict:
+        method = request.get("method")
+        self.calls[method] += 1
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        handler = self.handlers.get(method)
+        if handler is None:
+            response["error"] = {"code": -32601, "message": f"Method not found: {method}"}
+        elif method in FAULTY_METHODS and random.random() < self.error_rate:
+            self.errors += 1
+            response["error"] = {"code": -32005, "message": "Node is behind by 42 slots",
+                                 "data": {"numSlotsBehind": 42}}
+        else:
+            try:
+                response["result"] = handler(request.get("params") or [])
+            except TransactionRejected as e:
+                response["error"] = {"code": -32002, "message": f"Transaction simulation failed: {e}",
+                                     "data": {"err": "InvalidAccountData", "logs": [str(e)], "accounts": None,
+                                              "unitsConsumed": 0, "returnData": None}}
+        return response
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def _handle_rpc(self, request: web.Request) -> web.Response:
+        await self._delay()
+        self.http_requests += 1
+        body = await request.json()
+        methods = {item.get("method") for item in body} if isinstance(body, list) else {body.get("method")}
+        if methods & FAULTY_METHODS and random.random() < self.throttle_rate:
+            self.throttled += 1
+            return web.Response(status=429, text="Too many requests")
+        if isinstance(body, list):
+            return web.json_response([self._dispatch(item) for item in body])
+        return web.json_response(self._dispatch(body))
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_ws(self, request: web.Request) -> web.StreamResponse:
+        if not self.ws_enabled:
+            return web.Response(status=503, text="Websocket subscriptions disabled")
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.ws_connections += 1
+        self._sockets.add(ws)
+        try:
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                body = json.loads(message.data)
+                method, params = body.get("method"), body.get("params") or []
+                self.calls[method] += 1
+                response = {"jsonrpc": "2.0", "id": body.get("id")}
+                if method == "accountSubscribe":
+                    subscription = next(self._subscription_ids)
+                    self._subscriptions[subscription] = (ws, params[0], params[1] if len(params) > 1 else {})
+                    response["result"] = subscription
+                elif method == "accountUnsubscribe":
+                    response["result"] = self._subscriptions.pop(params[0], None) is not None
+                else:
+                    response["error"] = {"code": -32601, "message": f"Method not found: {method}"}
+                await ws.send_json(response)
+        finally:
+            self._sockets.discard(ws)
+            for subscription, (socket, _, _) in list(self._subscriptions.items()):
+                if socket is ws:
+                    del self._subscriptions[subscription]
+        return ws
+
+    async def notify(self, *keys: str | Pubkey):
+        keys = {str(key) for key in keys}
+        for subscription, (ws, key, config) in list(self._subscriptions.items()):
+            if key not in keys or ws.closed:
+                continue
+            self.notifications += 1
+            await ws.send_json({"jsonrpc": "2.0", "method": "accountNotification", "params": {
+                "subscription": subscription,
+                "result": self._context(self._encode_account(self._account(key), config)),
+            }})
+
+    async def update_token_amount(self, key: Pubkey, amount: int):
+        account = self.fixture.accounts[key]
+        end = TOKEN_ACCOUNT_AMOUNT_OFFSET + TOKEN_ACCOUNT_AMOUNT_SIZE
+        account.data = account.data[:TOKEN_ACCOUNT_AMOUNT_OFFSET] + amount.to_bytes(8, "little") + account.data[end:]
+        await self.notify(key)
+
+    async def drop_connections(self):
+        for ws in list(self._sockets):
+            self.ws_drops += 1
+            await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b"stand-in dropped the connection")
+
+    async def _drop_periodically(self):
+        while True:
+            await asyncio.sleep(self.ws_drop_interval)
+            await self.drop_connections()
+
+    async def _handle_dexscreener(self, request: web.Request) -> web.Response:
+        await self._delay()
+        self.calls["dexscreener"] += 1
+        mint = request.match_info["mint"]
+        pairs = []
+        if mint == str(self.fixture.mint):
+            pairs.append({"dexId": "raydium", "pairAddress": str(self.fixture.amm_id),
+                          "baseToken": {"address": mint}, "quoteToken": {"address": SOL}})
+        return web.json_response({"pairs": pairs})
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"calls": dict(self.calls.most_common()), "rpc_calls": self.rpc_calls,
+                                  "errors": self.errors, "throttled": self.throttled,
+                                  "http_requests": self.http_requests, "ws_connections": self.ws_connections,
+                                  "ws_drops": self.ws_drops, "notifications": self.notifications})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post("/", self._handle_rpc)
+        app.router.add_get("/", self._handle_ws)
+        app.router.add_get("/latest/dex/tokens/{mint}", self._handle_dexscreener)
+        app.router.add_get("/stats", self._handle_stats)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        if self.ws_drop_interval:
+            self._spawn(self._drop_periodically())
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.drop_connections()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+
+def _serve(fixture: Fixture, options: dict, conn):
+    async def serve():
+        async with StandInServer(fixture, **options) as server:
+            conn.send(server.url)
+            await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+@contextlib.asynccontextmanager
+async def stand_in_process(fixture: Fixture, **options):
+    # The stand-in gets its own process so serving requests does not compete with the bot for the event loop.
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve, args=(fixture, options, child), daemon=True)
+    process.start()
+    try:
+        yield await asyncio.to_thread(parent.recv)
+    finally:
+        process.terminate()
+        await asyncio.to_thread(process.join)
+
+
+async def fetch_stats(url: str) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/stats") as response:
+            return await response.json()
+
+
+class StageRecorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def summary(self) -> dict[str, dict]:
+        return {stage: {"count": len(values),
+                        **{f"p{pct}_ms": round(percentile(values, pct) * 1000, 2) for pct in (50, 95, 99)}}
+                for stage, values in sorted(self.samples.items())}
+
+
+class TimedClient:
+    """Proxy that records the client-side latency of every RPC coroutine as an "rpc.<method>" stage."""
+
+    def __init__(self, client, recorder: StageRecorder):
+        self.client = client
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await attr(*args, **kwargs)
+            finally:
+                self.recorder.record(f"rpc.{name}", time.perf_counter() - started)
+
+        setattr(self, name, timed)
+        return timed
+
+
+class TimedScheduler(TradeScheduler):
+    def __init__(self, *args, recorder: StageRecorder, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recorder = recorder
+
+    async def _run_job(self, job) -> bool:
+        started = time.perf_counter()
+        try:
+            return await super()._run_job(job)
+        finally:
+            self.recorder.record(job.kind, time.perf_counter() - started)
+
+    async def _run_bundled(self, jobs, reserves=None):
+        started = time.perf_counter()
+        try:
+            await super()._run_bundled(jobs, reserves)
+        finally:
+            self.recorder.record("bundled_round", time.perf_counter() - started)
+
+
+async def run_benchmark(fixture: Fixture, wallets: int = 100, cycles: int = 3, threads: int = 50,
+                        rate_limit: float = RPC_RATE_LIMIT, burst: int = RPC_BURST, bundle: bool = False,
+                        persistent_wsol: bool = False, adaptive_compute_budget: bool = False, campaigns: int = 1,
+                        reserve_feed: bool = False, wsol_sweep_cycles: int = 0, lookup_tables: bool = False,
+                        **server_options) -> dict:
+    recorder = StageRecorder()
+    key_pairs = [Keypair() for _ in range(wallets)]
+    # Extra campaigns trade synthetic pools served next to the fixture's, each on its own slice of the wallets.
+    mints = [fixture.mint]
+    for _ in range(campaigns - 1):
+        extra = synthetic_fixture()
+        fixture.accounts.update(extra.accounts)
+        mints.append(extra.mint)
+    per_campaign = -(-wallets // campaigns)
+    campaign_list = [Campaign(str(mint), cycles=cycles, delay=0, wallets=(i * per_campaign, (i + 1) * per_campaign))
+                     for i, mint in enumerate(mints)]
+    async with stand_in_process(fixture, **server_options) as url:
+        # The stand-in replaces every network dependency, including the DexScreener fallback and the on-disk pool
+        # cache that would otherwise short-circuit (or be polluted by) the synthetic pool.
+        raydium_amm.DEXSCREENER_API = url
+        raydium_amm.pool_keys_cache = PoolKeysCache(None, raydium_amm._resolve_pool_keys,
+                                                    raydium_amm.revalidate_pool_keys)
+        async with RpcPool([url]) as pool:
+            for client in pool.clients:
+                client.bucket = TokenBucket(rate_limit, burst)
+            client = TimedClient(pool, recorder)
+            async with BlockhashService(client) as blockhash_service, ConfirmationTracker(client) as tracker:
+                started = time.perf_counter()
+                results = await run_campaigns(client, key_pairs, campaign_list, threads,
+                                              partial(TimedScheduler, recorder=recorder),
+                                              blockhash_service=blockhash_service, tracker=tracker, bundle=bundle,
+                                              persistent_wsol=persistent_wsol, wsol_sweep_cycles=wsol_sweep_cycles,
+                                              adaptive_compute_budget=adaptive_compute_budget,
+                                              lookup_table_manager=LookupTableManager(client, Keypair(), path=None)
+                                              if lookup_tables else None,
+                                              reserve_ws_url=ws_url_from_http(url) if reserve_feed else None)
+                elapsed = time.perf_counter() - started
+            throttle_events = pool.throttled
+        server_stats = await fetch_stats(url)
+    buys = sum(stats.buys for stats in results.values())
+    sells = sum(stats.sells for stats in results.values())
+    trades = buys + sells
+    return {
+        "wallets": wallets,
+        "cycles": cycles,
+        "campaigns": campaigns,
+        "trades": trades,
+        "buys": buys,
+        "sells": sells,
+        "failed": sum(stats.failed for stats in results.values()),
+        "elapsed_s": round(elapsed, 3),
+        "trades_per_s": round(trades / elapsed, 2) if elapsed else 0.0,
+        "rpc_calls": server_stats["rpc_calls"],
+        "rpc_calls_per_trade": round(server_stats["rpc_calls"] / trades, 2) if trades else None,
+        "http_requests": server_stats["http_requests"],
+        "ws": {"connections": server_stats["ws_connections"], "drops": server_stats["ws_drops"],
+               "notifications": server_stats["notifications"]},
+        "calls": server_stats["calls"],
+        "injected": {"errors": server_stats["errors"], "throttled": server_stats["throttled"]},
+        "client_throttle_events": throttle_events,
+        "confirmations": {status.value: count for status, count in tracker.counts.items()},
+        "rebroadcasts": tracker.rebroadcasts,
+        "stages": {**recorder.summary(), **{
+            f"stage.{name}": {"count": histogram.count,
+                              **{f"p{pct}_ms": round(histogram.quantile(pct / 100) * 1000, 2) for pct in (50, 95, 99)}}
+            for name, histogram in sorted(metrics.stage_histograms().items())}},
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"{report['trades']} trade(s) ({report['buys']} buy(s), {report['sells']} sell(s), {report['failed']} failed) "
+        f"across {report['wallets']} wallet(s) x {report['cycles']} cycle(s) "
+        f"in {report['campaigns']} campaign(s) in {report['elapsed_s']}s: "
+        f"{report['trades_per_s']} trades/s",
+        f"RPC calls: {report['rpc_calls']} ({report['rpc_calls_per_trade']} per trade) "
+        f"in {report['http_requests']} HTTP request(s), "
+        f"injected {report['injected']['errors']} error(s) and {report['injected']['throttled']} 429(s), "
+        f"{report['client_throttle_events']} client backoff(s), {report['rebroadcasts']} rebroadcast(s)",
+        "  " + ", ".join(f"{method}={count}" for method, count in report["calls"].items()),
+    ]
+    if report["ws"]["connections"]:
+        lines.append(f"Reserve feed: {report['ws']['connections']} websocket connection(s), "
+                     f"{report['ws']['drops']} dropped, {report['ws']['notifications']} notification(s) pushed")
+    lines += [
+        f"{'stage':<36}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}",
+    ]
+    for stage, summary in report["stages"].items():
+        lines.append(f"{stage:<36}{summary['count']:>8}{summary['p50_ms']:>10}{summary['p95_ms']:>10}"
+                     f"{summary['p99_ms']:>10}")
+    return "\n".join(lines)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Drive the trading loop against a local JSON-RPC/DexScreener "
+                                                 "stand-in and report throughput, per-stage latency and RPC usage.")
+    parser.add_argument("--wallets", type=int, default=100)
+    parser.add_argument("--cycles", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--campaigns", type=int, default=1, help="tokens traded side by side, splitting the wallets")
+    parser.add_argument("--latency", type=float, default=0.02, help="mean stand-in response latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency spread as a fraction of --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of JSON-RPC calls answered with "
+                                                                       "an error")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of sent transactions that never land")
+    parser.add_argument("--rate-limit", type=float, default=RPC_RATE_LIMIT, help="RPC requests/s (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=RPC_BURST)
+    parser.add_argument("--bundle", action="store_true")
+    parser.add_argument("--persistent-wsol", action="store_true")
+    parser.add_argument("--wsol-sweep-cycles", type=int, default=0, help="cycles between persistent wSOL sweeps")
+    parser.add_argument("--adaptive-compute-budget", action="store_true")
+    parser.add_argument("--lookup-tables", action="store_true", help="compile swaps against per-pool lookup tables "
+                                                                     "created on the stand-in")
+    parser.add_argument("--reserve-feed", action="store_true", help="push reserves over the stand-in's websocket")
+    parser.add_argument("--ws-drop-interval", type=float, default=0.0, help="seconds between dropped websocket "
+                                                                            "connections (0 = never)")
+    parser.add_argument("--fixture", help="JSON file with recorded pool accounts (see --record)")
+    parser.add_argument("--record", metavar="PAIR_ADDRESS", help="record the pool accounts of PAIR_ADDRESS from "
+                                                                 "--rpc into --fixture and exit")
+    parser.add_argument("--rpc", help="live RPC endpoint used by --record")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    setup_logging()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.record:
+        if not args.rpc or not args.fixture:
+            parser.error("--record needs --rpc and --fixture")
+        fixture = await record_fixture(args.rpc, args.record)
+        fixture.save(args.fixture)
+        print(f"Recorded {len(fixture.accounts)} account(s) of {args.record} into {args.fixture}")
+        return
+
+    fixture = Fixture.load(args.fixture) if args.fixture else synthetic_fixture()
+    report = await run_benchmark(fixture, wallets=args.wallets, cycles=args.cycles, threads=args.threads,
+                                 rate_limit=args.rate_limit, burst=args.burst, bundle=args.bundle,
+                                 persistent_wsol=args.persistent_wsol, wsol_sweep_cycles=args.wsol_sweep_cycles,
+                                 adaptive_compute_budget=args.adaptive_compute_budget, campaigns=args.campaigns,
+                                 reserve_feed=args.reserve_feed, lookup_tables=args.lookup_tables,
+                                 ws_drop_interval=args.ws_drop_interval,
+                                 latency=args.latency,
+                                 jitter=args.jitter, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                                 drop_rate=args.drop_rate)
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import time
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment
+from solders.hash import Hash
+
+from settings import BLOCKHASH_MAX_AGE, BLOCKHASH_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Average slot time used to estimate how far the chain has moved since the last refresh
+SLOT_TIME = 0.4
+
+
+class BlockhashService:
+    """Keeps a recent blockhash warm in the background so transactions can be signed without an RPC call."""
+
+    def __init__(self, client: AsyncClient, refresh_interval: float = BLOCKHASH_REFRESH_INTERVAL,
+                 max_age: float = BLOCKHASH_MAX_AGE, commitment: Commitment | None = None):
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.commitment = commitment
+        self._blockhash: Hash | None = None
+        self._last_valid_block_height = 0
+        self._block_height = 0
+        self._fetched_at = 0.0
+        self._task: asyncio.Task | None = None
+        self._refresh_lock = asyncio.Lock()
+
+    async def start(self):
+        await self.refresh()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("Failed to refresh blockhash: %s", e)
+
+    async def refresh(self):
+        async with self._refresh_lock:
+            await self._fetch()
+
+    async def _fetch(self):
+        blockhash_response, block_height_response = await asyncio.gather(
+            self.client.get_latest_blockhash(self.commitment),
+            self.client.get_block_height(self.commitment),
+        )
+        self._blockhash = blockhash_response.value.blockhash
+        self._last_valid_block_height = blockhash_response.value.last_valid_block_height
+        self._block_height = block_height_response.value
+        self._fetched_at = time.monotonic()
+        logger.debug("refreshed blockhash=%s last_valid_block_height=%d", self._blockhash,
+                     self._last_valid_block_height)
+
+    def current(self) -> Hash:
+        if self._blockhash is None:
+            raise RuntimeError("BlockhashService has not been started")
+        return self._blockhash
+
+    @property
+    def last_valid_block_height(self) -> int:
+        return self._last_valid_block_height
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    def estimated_block_height(self) -> int:
+        return self._block_height + int(self.age / SLOT_TIME)
+
+    def blocks_remaining(self) -> int:
+        return self._last_valid_block_height - self.estimated_block_height()
+
+    def is_stale(self, max_age: float | None = None) -> bool:
+        max_age = self.max_age if max_age is None else max_age
+        return self._blockhash is None or self.age > max_age or self.blocks_remaining() <= 0
+
+    async def get(self) -> tuple[Hash, int]:
+        if self.is_stale():
+            async with self._refresh_lock:
+                # Callers that queued behind another refresh take its result instead of fetching again.
+                if self.is_stale():
+                    await self._fetch()
+        return self._blockhash, self._last_valid_block_height
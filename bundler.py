@@ -0,0 +1,338 @@
+import asyncio
+import itertools
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from solders.hash import Hash
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+
+from blockhash import BlockhashService
+from config import UNIT_BUDGET, UNIT_PRICE
+from confirmation import ConfirmationTracker
+from fee_engine import MAX_TRANSACTION_UNITS, current_unit_price
+from settings import SEND_MODE
+from solana_helpers import SendMode, _get_blockhash, send_compiled_transaction
+
+logger = logging.getLogger(__name__)
+
+# Maximum serialized transaction size (IPv6 MTU minus headers)
+PACKET_DATA_SIZE = 1232
+SIGNATURE_SIZE = 64
+PUBKEY_SIZE = 32
+# Version prefix, message header and recent blockhash
+MESSAGE_OVERHEAD = 1 + 3 + 32
+# Instruction bytes of the set_compute_unit_limit/set_compute_unit_price header every bundle carries
+HEADER_INSTRUCTIONS = 2
+HEADER_INSTRUCTION_BYTES = (1 + 1 + 1 + 5) + (1 + 1 + 1 + 9)
+
+
+def _compact_len(n: int) -> int:
+    return 1 if n < 0x80 else 2 if n < 0x4000 else 3
+
+
+def _instruction_size(instruction: Instruction) -> int:
+    accounts = len(instruction.accounts)
+    data = len(instruction.data)
+    return 1 + _compact_len(accounts) + accounts + _compact_len(data) + data
+
+
+@dataclass
+class SwapGroup:
+    """The instructions of one wallet's swap, packed into a bundle as an indivisible unit."""
+    key_pair: Keypair
+    instructions: list[Instruction]
+    units: int = UNIT_BUDGET
+    tag: object = None
+    min_cost: int = field(init=False, default=0)
+    signers: frozenset = field(init=False, default=frozenset())
+    static_keys: frozenset = field(init=False, default=frozenset())
+    table_keys: dict = field(init=False, default_factory=dict)
+    instruction_bytes: int = field(init=False, default=0)
+
+    def classify(self, table_index: dict[Pubkey, int]):
+        # Signers and invoked programs always live in the static account list; any other account found in
+        # one of the lookup tables is referenced by a one-byte index instead of its 32-byte key.
+        signers = {self.key_pair.pubkey()}
+        programs = set()
+        accounts = set()
+        for instruction in self.instructions:
+            programs.add(instruction.program_id)
+            for meta in instruction.accounts:
+                if meta.is_signer:
+                    signers.add(meta.pubkey)
+                else:
+                    accounts.add(meta.pubkey)
+        accounts -= signers
+        static_keys = programs - signers
+        table_keys = {}
+        for key in accounts - programs:
+            table = table_index.get(key)
+            if table is None:
+                static_keys.add(key)
+            else:
+                table_keys[key] = table
+        self.signers = frozenset(signers)
+        self.static_keys = frozenset(static_keys)
+        self.table_keys = table_keys
+        self.instruction_bytes = sum(_instruction_size(instruction) for instruction in self.instructions)
+
+
+class Bundle:
+    """A set of swap groups from one or more wallets that compiles into a single multi-signer transaction."""
+
+    def __init__(self):
+        self.groups: list[SwapGroup] = []
+        self.signers: dict[Pubkey, None] = {}
+        self.static_keys: set[Pubkey] = set()
+        self.table_keys: dict[int, set[Pubkey]] = {}
+        self.instruction_count = HEADER_INSTRUCTIONS
+        self.instruction_bytes = HEADER_INSTRUCTION_BYTES
+        self.units = 0
+        # The compute budget program is the one static key every bundle starts with.
+        self.size = self._size(0, 1, {})
+
+    def _size(self, signers: int, static_keys: int, table_counts: dict[int, int],
+              instruction_count: int = 0, instruction_bytes: int = 0) -> int:
+        instruction_count += self.instruction_count
+        instruction_bytes += self.instruction_bytes
+        account_keys = signers + static_keys
+        return (_compact_len(signers) + SIGNATURE_SIZE * signers + MESSAGE_OVERHEAD
+                + _compact_len(account_keys) + PUBKEY_SIZE * account_keys
+                + _compact_len(instruction_count) + instruction_bytes
+                + _compact_len(len(table_counts))
+                + sum(PUBKEY_SIZE + 2 + count for count in table_counts.values()))
+
+    def size_with(self, group: SwapGroup) -> int:
+        signers = len(self.signers) + sum(1 for key in group.signers if key not in self.signers)
+        static_keys = len(self.static_keys) + 1 + sum(
+            1 for key in group.static_keys if key not in self.static_keys and key not in self.signers)
+        table_counts = {table: len(keys) for table, keys in self.table_keys.items()}
+        for key, table in group.table_keys.items():
+            keys = self.table_keys.get(table)
+            if keys is None or key not in keys:
+                table_counts[table] = table_counts.get(table, 0) + 1
+        return self._size(signers, static_keys, table_counts,
+                          len(group.instructions), group.instruction_bytes)
+
+    def add(self, group: SwapGroup, size: int):
+        self.groups.append(group)
+        for key in group.signers:
+            self.signers.setdefault(key)
+        self.static_keys.update(key for key in group.static_keys if key not in self.signers)
+        for key, table in group.table_keys.items():
+            self.table_keys.setdefault(table, set()).add(key)
+        self.instruction_count += len(group.instructions)
+        self.instruction_bytes += group.instruction_bytes
+        self.units += group.units
+        self.size = size
+
+    def key_pairs(self) -> list[Keypair]:
+        # Fee payer first, then every other wallet exactly once.
+        key_pairs = {}
+        for group in self.groups:
+            key_pairs.setdefault(group.key_pair.pubkey(), group.key_pair)
+        return list(key_pairs.values())
+
+    def instructions(self, unit_price: int = UNIT_PRICE) -> list[Instruction]:
+        return [
+            set_compute_unit_limit(min(self.units, MAX_TRANSACTION_UNITS)),
+            set_compute_unit_price(unit_price),
+            *(instruction for group in self.groups for instruction in group.instructions),
+        ]
+
+
+def pack_groups(groups: list[SwapGroup], lookup_tables: Sequence[AddressLookupTableAccount] = (),
+                max_size: int = PACKET_DATA_SIZE, max_units: int = MAX_TRANSACTION_UNITS) -> list[Bundle]:
+    table_index = {}
+    for i, table in enumerate(lookup_tables):
+        for address in table.addresses:
+            table_index.setdefault(address, i)
+    for group in groups:
+        group.classify(table_index)
+    if not groups:
+        return []
+
+    # Keys used by a single group (its wallet, wSOL account and token account) are new to every other bundle,
+    # so they give a lower bound on what adding that group costs anywhere.
+    occurrences = Counter(key for group in groups
+                          for key in itertools.chain(group.signers, group.static_keys, group.table_keys))
+    for group in groups:
+        group.min_cost = (group.instruction_bytes
+                          + sum(SIGNATURE_SIZE + PUBKEY_SIZE for key in group.signers if occurrences[key] == 1)
+                          + sum(PUBKEY_SIZE for key in group.static_keys if occurrences[key] == 1)
+                          + sum(1 for key in group.table_keys if occurrences[key] == 1))
+
+    # First-fit decreasing on that cost. A bundle is closed as soon as it cannot take even the cheapest group,
+    # which keeps the open list short when groups are similar in size.
+    ordered = sorted(groups, key=lambda g: g.min_cost, reverse=True)
+    min_cost = min(group.min_cost for group in groups)
+    min_units = min(group.units for group in groups)
+    open_bundles: list[Bundle] = []
+    bundles: list[Bundle] = []
+    for group in ordered:
+        for bundle in open_bundles:
+            if bundle.units + group.units > max_units:
+                continue
+            size = bundle.size_with(group)
+            if size <= max_size:
+                bundle.add(group, size)
+                break
+        else:
+            bundle = Bundle()
+            size = bundle.size_with(group)
+            if size > max_size:
+                logger.warning("Swap for %s alone needs %s bytes, sending it unbundled", group.key_pair.pubkey(), size)
+            bundle.add(group, size)
+            bundles.append(bundle)
+            open_bundles.append(bundle)
+        open_bundles = [b for b in open_bundles
+                        if max_size - b.size >= min_cost and max_units - b.units >= min_units]
+    return bundles
+
+
+def compile_bundle(bundle: Bundle, blockhash: Hash, lookup_tables: Sequence[AddressLookupTableAccount] = (),
+                   unit_price: int = UNIT_PRICE) -> VersionedTransaction:
+    key_pairs = bundle.key_pairs()
+    message = MessageV0.try_compile(key_pairs[0].pubkey(), bundle.instructions(unit_price),
+                                    list(lookup_tables), blockhash)
+    return VersionedTransaction(message, key_pairs)
+
+
+def _split(bundle: Bundle) -> tuple[Bundle, Bundle]:
+    halves = Bundle(), Bundle()
+    middle = len(bundle.groups) // 2
+    for i, group in enumerate(bundle.groups):
+        half = halves[i >= middle]
+        half.add(group, half.size_with(group))
+    return halves
+
+
+def compile_bundles(bundles: list[Bundle], blockhash: Hash, lookup_tables: Sequence[AddressLookupTableAccount] = (),
+                    unit_price: int = UNIT_PRICE) -> list[tuple[Bundle, VersionedTransaction]]:
+    compiled = []
+    pending = list(bundles)
+    while pending:
+        bundle = pending.pop()
+        txn = compile_bundle(bundle, blockhash, lookup_tables, unit_price)
+        size = len(bytes(txn))
+        if size > PACKET_DATA_SIZE and len(bundle.groups) > 1:
+            # The size model is exact for the layouts used here; splitting only guards against surprises.
+            logger.warning("Bundle of %s swap(s) compiled to %s bytes, splitting it", len(bundle.groups), size)
+            pending.extend(_split(bundle))
+            continue
+        compiled.append((bundle, txn))
+    compiled.reverse()
+    return compiled
+
+
+async def send_bundles(client: AsyncClient, groups: list[SwapGroup],
+                       blockhash_service: BlockhashService | None = None,
+                       send_mode: SendMode = SEND_MODE,
+                       tracker: ConfirmationTracker | None = None,
+                       lookup_tables: Sequence[AddressLookupTableAccount] = ()
+                       ) -> list[tuple[Bundle, Signature | None]]:
+    return await send_packed(client, pack_groups(groups, lookup_tables), blockhash_service, send_mode, tracker,
+                             lookup_tables)
+
+
+async def send_packed(client: AsyncClient, bundles: list[Bundle],
+                      blockhash_service: BlockhashService | None = None,
+                      send_mode: SendMode = SEND_MODE,
+                      tracker: ConfirmationTracker | None = None,
+                      lookup_tables: Sequence[AddressLookupTableAccount] = ()) -> list[tuple[Bundle, Signature | None]]:
+    # Bundles from pack_groups, for callers that adjust the packed swaps before they are signed.
+    blockhash, last_valid_block_height = await _get_blockhash(client, blockhash_service)
+    compiled = compile_bundles(bundles, blockhash, lookup_tables, current_unit_price())
+    swaps = sum(len(bundle.groups) for bundle in bundles)
+    logger.info("Packed %s swap(s) into %s transaction(s)", swaps, len(compiled))
+    results = await asyncio.gather(
+        *(send_compiled_transaction(client, txn, send_mode, tracker, last_valid_block_height)
+          for _, txn in compiled),
+        return_exceptions=True,
+    )
+    sent = []
+    for (bundle, _), result in zip(compiled, results):
+        if isinstance(result, BaseException):
+            logger.error("bundle send failed swaps=%d error=%s", len(bundle.groups), result)
+            sent.append((bundle, None))
+        else:
+            sent.append((bundle, result))
+    return sent
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    from spl.token.instructions import CloseAccountParams, close_account, create_associated_token_account
+
+    from constants import TOKEN_PROGRAM_ID
+    from derivations import ata_address
+    from lookup_tables import pool_lookup_addresses
+    from solana_helpers import create_wsol_account_instructions
+    from swap_template import swap_template
+
+    pool_keys = {name: Pubkey.new_unique() for name in (
+        "amm_id", "open_orders", "target_orders", "base_vault", "quote_vault", "market_id", "bids", "asks",
+        "event_queue", "market_base_vault", "market_quote_vault", "market_authority")}
+    mint = Pubkey.new_unique()
+    table = AddressLookupTableAccount(Pubkey.new_unique(), pool_lookup_addresses(pool_keys))
+    blockhash = Hash.new_unique()
+    random.seed(1)
+
+    def buy_group(key_pair: Keypair) -> SwapGroup:
+        owner = key_pair.pubkey()
+        wsol_account, wsol_instructions = create_wsol_account_instructions(key_pair, 100_000)
+        instructions = [*wsol_instructions,
+                        swap_template(pool_keys).build(100_000, 1, wsol_account, ata_address(owner, mint), owner),
+                        close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_account, owner, owner))]
+        if random.random() < 0.5:
+            instructions.insert(2, create_associated_token_account(owner, owner, mint))
+        return SwapGroup(key_pair, instructions)
+
+    def naive_pack(groups: list[SwapGroup], lookup_tables) -> list[list[SwapGroup]]:
+        # Greedy next-fit that compiles and signs the candidate transaction to test every addition.
+        bins, current = [], []
+        for group in groups:
+            candidate = Bundle()
+            for g in current + [group]:
+                candidate.add(g, 0)
+            if current and len(bytes(compile_bundle(candidate, blockhash, lookup_tables))) > PACKET_DATA_SIZE:
+                bins.append(current)
+                current = [group]
+            else:
+                current.append(group)
+        if current:
+            bins.append(current)
+        return bins
+
+    for label, lookup_tables in (("without lookup table", []), ("with lookup table", [table])):
+        groups = [buy_group(Keypair()) for _ in range(500)]
+
+        started = time.perf_counter()
+        bundles = pack_groups(groups, lookup_tables)
+        pack_time = time.perf_counter() - started
+        for bundle in bundles:
+            size = len(bytes(compile_bundle(bundle, blockhash, lookup_tables)))
+            assert size == bundle.size, (size, bundle.size)
+            assert size <= PACKET_DATA_SIZE
+        assert sorted(id(g) for b in bundles for g in b.groups) == sorted(id(g) for g in groups)
+
+        started = time.perf_counter()
+        naive = naive_pack(groups, lookup_tables)
+        naive_time = time.perf_counter() - started
+
+        print(f"{label}: {len(groups)} swaps -> {len(bundles)} transactions "
+              f"({len(groups) / len(bundles):.1f} swaps/tx, {len(naive)} with compile-and-check), "
+              f"packed in {pack_time * 1000:.1f} ms vs {naive_time * 1000:.1f} ms "
+              f"({naive_time / pack_time:.0f}x)")
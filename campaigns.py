@@ -0,0 +1,115 @@
+import asyncio
+import logging
+from dataclasses import dataclass, fields
+from typing import Callable
+
+from solana.rpc.async_api import AsyncClient
+from solders.keypair import Keypair
+
+from fee_engine import FeeEngine
+from scheduler import FairDispatcher, SchedulerStats, TradeScheduler
+from settings import ADAPTIVE_COMPUTE_BUDGET, CAMPAIGNS, CYCLES, DELAY_BETWEEN_ROUNDS, PERSISTENT_WSOL, \
+    SELL_PERCENTAGE_MAX, SELL_PERCENTAGE_MIN, SELL_PROBABILITY, SLIPPAGE, SOL_IN, THREADS, TOKEN_ADDRESS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Campaign:
+    """Trade settings of one token; anything left out falls back to the single-token settings."""
+
+    token_address: str
+    sol_in: float = SOL_IN
+    slippage: int = SLIPPAGE
+    cycles: int | None = CYCLES
+    delay: float = DELAY_BETWEEN_ROUNDS
+    sell_probability: float = SELL_PROBABILITY
+    sell_percentage_min: int = SELL_PERCENTAGE_MIN
+    sell_percentage_max: int = SELL_PERCENTAGE_MAX
+    # Total SOL the campaign may spend on buys in this run (None = unlimited)
+    budget: float | None = None
+    # (start, stop) slice of the wallets in PRIVATE_KEYS_FILE (None = all of them)
+    wallets: tuple[int, int] | None = None
+    name: str | None = None
+
+    @property
+    def label(self) -> str:
+        return self.name or self.token_address[:8]
+
+    def key_pairs(self, key_pairs: list[Keypair]) -> list[Keypair]:
+        return key_pairs if self.wallets is None else key_pairs[slice(*self.wallets)]
+
+
+def load_campaigns(entries: list[dict] = CAMPAIGNS) -> list[Campaign]:
+    if not entries:
+        return [Campaign(TOKEN_ADDRESS)]
+    known = {f.name for f in fields(Campaign)}
+    campaigns = []
+    for entry in entries:
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"Unknown campaign setting(s) {', '.join(sorted(unknown))} in {entry}")
+        campaigns.append(Campaign(**{**entry, "wallets": tuple(entry["wallets"]) if entry.get("wallets") else None}))
+    tokens = [campaign.token_address for campaign in campaigns]
+    if len(set(tokens)) != len(tokens):
+        # Campaign progress and wallet snapshots are keyed by token.
+        raise ValueError("Each token may only appear in one campaign")
+    return campaigns
+
+
+def _check_wallet_overlap(campaigns: list[Campaign], key_pairs: list[Keypair]):
+    # A persistent wSOL account per wallet cannot be topped up and swept by two campaigns at once.
+    owners: dict = {}
+    for campaign in campaigns:
+        for key_pair in campaign.key_pairs(key_pairs):
+            other = owners.setdefault(key_pair.pubkey(), campaign)
+            if other is not campaign:
+                raise ValueError(f"Wallet {key_pair.pubkey()} is in campaigns {other.label} and {campaign.label}; "
+                                 f"PERSISTENT_WSOL needs disjoint wallet subsets")
+
+
+async def run_campaigns(client: AsyncClient, key_pairs: list[Keypair], campaigns: list[Campaign],
+                        threads: int = THREADS, scheduler_type: Callable[..., TradeScheduler] = TradeScheduler,
+                        **scheduler_options) -> dict[str, SchedulerStats]:
+    if scheduler_options.get("persistent_wsol", PERSISTENT_WSOL):
+        _check_wallet_overlap(campaigns, key_pairs)
+    if len(campaigns) == 1:
+        campaign = campaigns[0]
+        scheduler = _scheduler(scheduler_type, client, key_pairs, campaign, threads, **scheduler_options)
+        return {campaign.label: await scheduler.run()}
+
+    # All campaigns draw from one worker pool, so THREADS bounds the concurrent trades of the whole process and the
+    # shared RPC rate limit is split between them rather than raced for.
+    dispatcher = FairDispatcher(threads)
+    fee_engine = None
+    if scheduler_options.get("adaptive_compute_budget", ADAPTIVE_COMPUTE_BUDGET):
+        fee_engine = FeeEngine(client)
+        await fee_engine.start()
+    try:
+        schedulers = [_scheduler(scheduler_type, client, key_pairs, campaign, threads, dispatcher=dispatcher,
+                                 fee_engine=fee_engine, name=campaign.label, **scheduler_options)
+                      for campaign in campaigns]
+        logger.info("Running %s campaign(s): %s", len(campaigns),
+                    ", ".join(f"{campaign.label} ({len(scheduler.key_pairs)} wallet(s))"
+                              for campaign, scheduler in zip(campaigns, schedulers)))
+        results = await asyncio.gather(*(scheduler.run() for scheduler in schedulers), return_exceptions=True)
+    finally:
+        if fee_engine is not None:
+            await fee_engine.stop()
+    stats = {}
+    for campaign, result in zip(campaigns, results):
+        if isinstance(result, BaseException):
+            # One campaign failing (e.g. an unresolvable pool) must not take the others down with it.
+            logger.error("Campaign %s failed: %s", campaign.label, result)
+            continue
+        stats[campaign.label] = result
+    return stats
+
+
+def _scheduler(scheduler_type: Callable[..., TradeScheduler], client: AsyncClient, key_pairs: list[Keypair],
+               campaign: Campaign, threads: int, **scheduler_options) -> TradeScheduler:
+    return scheduler_type(client, campaign.key_pairs(key_pairs), campaign.token_address, sol_in=campaign.sol_in,
+                          slippage=campaign.slippage, cycles=campaign.cycles, delay=campaign.delay, threads=threads,
+                          sell_probability=campaign.sell_probability,
+                          sell_percentage_range=(campaign.sell_percentage_min, campaign.sell_percentage_max),
+                          budget=campaign.budget, **scheduler_options)
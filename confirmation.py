@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from enum import Enum
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.types import TxOpts
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+from solders.transaction_status import TransactionConfirmationStatus
+
+import metrics
+from settings import CONFIRM_DRAIN_TIMEOUT, CONFIRM_POLL_INTERVAL, REBROADCAST_INTERVAL
+from state_store import WalletStateStore
+
+logger = logging.getLogger(__name__)
+
+# getSignatureStatuses accepts at most 256 signatures per request
+MAX_SIGNATURES_PER_REQUEST = 256
+
+LANDED_STATUSES = (TransactionConfirmationStatus.Confirmed, TransactionConfirmationStatus.Finalized)
+
+
+class TxStatus(str, Enum):
+    LANDED = "landed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+
+@dataclass
+class ConfirmationResult:
+    signature: Signature
+    status: TxStatus
+    slot: int | None = None
+    err: object = None
+    broadcasts: int = 1
+
+
+@dataclass
+class _Pending:
+    txn: VersionedTransaction
+    last_valid_block_height: int
+    future: asyncio.Future
+    last_broadcast: float
+    broadcasts: int = 1
+    sent_at: float = 0.0
+
+
+class ConfirmationTracker:
+    """Polls submitted signatures in batches and rebroadcasts them until they land or their blockhash expires."""
+
+    def __init__(self, client: AsyncClient, poll_interval: float = CONFIRM_POLL_INTERVAL,
+                 rebroadcast_interval: float = REBROADCAST_INTERVAL, store: WalletStateStore | None = None,
+                 drain_timeout: float = CONFIRM_DRAIN_TIMEOUT):
+        self.client = client
+        self.store = store
+        self.poll_interval = poll_interval
+        self.rebroadcast_interval = rebroadcast_interval
+        self.drain_timeout = drain_timeout
+        self.counts = {status: 0 for status in TxStatus}
+        self.rebroadcasts = 0
+        self._pending: dict[Signature, _Pending] = {}
+        self._task: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def track(self, txn: VersionedTransaction, last_valid_block_height: int) -> asyncio.Future:
+        signature = txn.signatures[0]
+        pending = self._pending.get(signature)
+        if pending is None:
+            future = asyncio.get_running_loop().create_future()
+            now = time.monotonic()
+            pending = _Pending(txn, last_valid_block_height, future, now, sent_at=now)
+            self._pending[signature] = pending
+            if self.store is not None:
+                self.store.add_pending(txn, last_valid_block_height)
+            self._wakeup.set()
+        return pending.future
+
+    async def wait(self, signature: Signature) -> ConfirmationResult:
+        return await asyncio.shield(self._pending[signature].future)
+
+    def outcome(self, signature: Signature) -> asyncio.Future | None:
+        # Resolves to the ConfirmationResult of a tracked signature; None once it has settled.
+        pending = self._pending.get(signature)
+        return pending.future if pending is not None else None
+
+    async def wait_idle(self, timeout: float | None = None) -> bool:
+        """Wait until nothing is pending, for at most timeout seconds; return whether that happened."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.drain_timeout if timeout is None else timeout)
+        while self._pending and loop.time() < deadline:
+            await asyncio.sleep(self.poll_interval)
+        return not self._pending
+
+    def expire_pending(self, reason: str):
+        # Settles the waiters without forgetting the transactions: they stay in the store, so the next run still
+        # finds out whether they landed.
+        for signature in list(self._pending):
+            self._resolve(signature, TxStatus.EXPIRED, err=reason, forget=False)
+
+    def pending_signers(self) -> set[Pubkey]:
+        signers = set()
+        for pending in self._pending.values():
+            message = pending.txn.message
+            signers.update(message.account_keys[:message.header.num_required_signatures])
+        return signers
+
+    async def start(self):
+        if self.store is not None:
+            # Transactions sent before a restart are polled (and rebroadcast) like any other until they settle.
+            resumed = self.store.load_pending()
+            for txn, last_valid_block_height in resumed:
+                self.track(txn, last_valid_block_height)
+            if resumed:
+                logger.info("Resumed tracking of %s pending transaction(s)", len(resumed))
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain: bool = False):
+        # An unreachable RPC never settles anything, so the drain is bounded by drain_timeout; the longest a
+        # blockhash stays valid is well within the default.
+        if drain and not await self.wait_idle():
+            logger.warning("%s transaction(s) still unconfirmed after %ss, counting them as expired",
+                           len(self._pending), self.drain_timeout)
+            self.expire_pending("unconfirmed at shutdown")
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop(drain=exc_type is None)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.warning("Confirmation poll failed: %s", e)
+
+    def _resolve(self, signature: Signature, status: TxStatus, slot: int | None = None, err=None,
+                 forget: bool = True):
+        pending = self._pending.pop(signature)
+        self.counts[status] += 1
+        metrics.inc("confirmations_total", (status.value,))
+        if status == TxStatus.LANDED:
+            metrics.observe_stage("confirm", time.monotonic() - pending.sent_at)
+        if self.store is not None and forget:
+            self.store.remove_pending(signature)
+        if not pending.future.done():
+            pending.future.set_result(ConfirmationResult(signature, status, slot, err, pending.broadcasts))
+        if status == TxStatus.LANDED:
+            logger.info("transaction landed signature=%s slot=%s broadcasts=%d", signature, slot, pending.broadcasts)
+        else:
+            logger.warning("transaction %s signature=%s error=%s", status.value, signature, err)
+
+    async def poll(self):
+        signatures = list(self._pending)
+        if not signatures:
+            return
+        chunks = [signatures[i:i + MAX_SIGNATURES_PER_REQUEST]
+                  for i in range(0, len(signatures), MAX_SIGNATURES_PER_REQUEST)]
+        responses = await asyncio.gather(
+            self.client.get_block_height(),
+            *(self.client.get_signature_statuses(chunk) for chunk in chunks),
+        )
+        block_height = responses[0].value
+
+        to_rebroadcast = []
+        now = time.monotonic()
+        for chunk, response in zip(chunks, responses[1:]):
+            for signature, status in zip(chunk, response.value):
+                if status is not None and status.err is not None:
+                    self._resolve(signature, TxStatus.FAILED, status.slot, status.err)
+                elif status is not None and status.confirmation_status in LANDED_STATUSES:
+                    self._resolve(signature, TxStatus.LANDED, status.slot)
+                elif block_height > self._pending[signature].last_valid_block_height:
+                    self._resolve(signature, TxStatus.EXPIRED)
+                elif status is None and now - self._pending[signature].last_broadcast >= self.rebroadcast_interval:
+                    to_rebroadcast.append(signature)
+
+        if to_rebroadcast:
+            await asyncio.gather(*(self._rebroadcast(signature) for signature in to_rebroadcast))
+
+    async def _rebroadcast(self, signature: Signature):
+        pending = self._pending.get(signature)
+        if pending is None:
+            return
+        pending.last_broadcast = time.monotonic()
+        pending.broadcasts += 1
+        self.rebroadcasts += 1
+        try:
+            await self.client.send_raw_transaction(bytes(pending.txn), opts=TxOpts(skip_preflight=True, max_retries=0))
+        except Exception as e:
+            logger.debug("rebroadcast failed signature=%s error=%s", signature, e)
@@ -0,0 +1,33 @@
+from typing import Iterable
+
+from solders.pubkey import Pubkey
+from solders.token.associated import get_associated_token_address
+
+from constants import WSOL
+
+# ATA derivation is a PDA bump search (up to 255 sha256 rounds); wallets and mints are fixed for a run, so
+# every (owner, mint) pair only needs to be derived once. The memo can also be seeded from persisted state.
+_atas: dict[tuple[Pubkey, Pubkey], Pubkey] = {}
+
+
+def ata_address(owner: Pubkey, mint: Pubkey) -> Pubkey:
+    address = _atas.get((owner, mint))
+    if address is None:
+        address = _atas[(owner, mint)] = get_associated_token_address(owner, mint)
+    return address
+
+
+def wsol_address(owner: Pubkey) -> Pubkey:
+    return ata_address(owner, WSOL)
+
+
+def warm_derivations(owners: list[Pubkey], mints: list[Pubkey]):
+    for owner in owners:
+        wsol_address(owner)
+        for mint in mints:
+            ata_address(owner, mint)
+
+
+def seed_derivations(entries: Iterable[tuple[Pubkey, Pubkey, Pubkey]]):
+    for owner, mint, address in entries:
+        _atas[(owner, mint)] = address
@@ -0,0 +1,252 @@
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+# Fixed-offset equivalents of the construct layouts in layouts.py. Each layout is described once as a list of
+# (name, kind) pairs; the struct format, the namedtuple returned by the decoder and the NumPy dtype used for
+# batch decoding are all derived from that description, so the three stay byte-for-byte in sync.
+
+_KINDS = {
+    "u8": ("B", "<u1"),
+    "u32": ("I", "<u4"),
+    "u64": ("Q", "<u8"),
+    "u128": ("QQ", ("<u8", (2,))),
+    "pubkey": ("32s", ("u1", (32,))),
+    "flags": ("Q", "<u8"),
+}
+
+ACCOUNT_FLAG_NAMES = ("initialized", "market", "open_orders", "request_queue", "event_queue", "bids", "asks")
+AccountFlags = namedtuple("AccountFlags", ACCOUNT_FLAG_NAMES)
+
+
+def _decode_account_flags(value: int) -> AccountFlags:
+    if value >> len(ACCOUNT_FLAG_NAMES):
+        raise ValueError(f"Unexpected bits set in account flags: {value:#x}")
+    return AccountFlags(*(bool(value >> bit & 1) for bit in range(len(ACCOUNT_FLAG_NAMES))))
+
+
+def _encode_account_flags(flags) -> int:
+    return sum(1 << bit for bit, name in enumerate(ACCOUNT_FLAG_NAMES) if getattr(flags, name))
+
+
+class FastLayout:
+    def __init__(self, name: str, fields: list[tuple[str, str]]):
+        self.fields = fields
+        fmt = "<"
+        dtype = []
+        self._names = []
+        self._u128 = []
+        self._flags = []
+        for field_name, kind in fields:
+            if kind.startswith("pad"):
+                size = int(kind[3:])
+                fmt += f"{size}x"
+                dtype.append((f"_{field_name}", f"V{size}"))
+                continue
+            struct_code, dtype_code = _KINDS[kind]
+            fmt += struct_code
+            if kind == "u128":
+                self._u128.append(len(self._names))
+            elif kind == "flags":
+                self._flags.append(len(self._names))
+            self._names.append(field_name)
+            dtype.append((field_name, *dtype_code) if isinstance(dtype_code, tuple) else (field_name, dtype_code))
+        self.struct = struct.Struct(fmt)
+        self.size = self.struct.size
+        self.tuple_type = namedtuple(name, self._names)
+        self.dtype = np.dtype(dtype)
+        assert self.dtype.itemsize == self.size
+        # u128 fields span two u64 words of the raw struct tuple, so only layouts without them can skip the fix-up.
+        self._u128 = frozenset(self._u128)
+        self._flags = frozenset(self._flags)
+        self._simple = not self._u128 and not self._flags
+
+    def parse(self, data: bytes):
+        values = self.struct.unpack_from(data)
+        if self._simple:
+            return self.tuple_type._make(values)
+        out = []
+        i = 0
+        for index in range(len(self._names)):
+            if index in self._u128:
+                out.append(values[i] | values[i + 1] << 64)
+                i += 2
+            else:
+                out.append(_decode_account_flags(values[i]) if index in self._flags else values[i])
+                i += 1
+        return self.tuple_type._make(out)
+
+    def build(self, obj) -> bytes:
+        values = []
+        for index, field_name in enumerate(self._names):
+            value = obj[field_name] if isinstance(obj, dict) else getattr(obj, field_name)
+            if index in self._u128:
+                values.extend((value & 0xFFFFFFFFFFFFFFFF, value >> 64))
+            elif index in self._flags:
+                values.append(value if isinstance(value, int) else _encode_account_flags(value))
+            else:
+                values.append(value)
+        return self.struct.pack(*values)
+
+    def parse_batch(self, datas: list[bytes]) -> np.ndarray:
+        buffer = b"".join(bytes(memoryview(data)[:self.size]) for data in datas)
+        return np.frombuffer(buffer, dtype=self.dtype)
+
+
+def u128_column(array: np.ndarray, field_name: str) -> list[int]:
+    words = array[field_name]
+    return [int(lo) | int(hi) << 64 for lo, hi in words]
+
+
+def pubkey_column(array: np.ndarray, field_name: str) -> list[bytes]:
+    return [column.tobytes() for column in array[field_name]]
+
+
+LIQUIDITY_STATE_V4 = FastLayout("LiquidityStateV4", [
+    ("status", "u64"),
+    ("nonce", "u64"),
+    ("orderNum", "u64"),
+    ("depth", "u64"),
+    ("coinDecimals", "u64"),
+    ("pcDecimals", "u64"),
+    ("state", "u64"),
+    ("resetFlag", "u64"),
+    ("minSize", "u64"),
+    ("volMaxCutRatio", "u64"),
+    ("amountWaveRatio", "u64"),
+    ("coinLotSize", "u64"),
+    ("pcLotSize", "u64"),
+    ("minPriceMultiplier", "u64"),
+    ("maxPriceMultiplier", "u64"),
+    ("systemDecimalsValue", "u64"),
+    ("minSeparateNumerator", "u64"),
+    ("minSeparateDenominator", "u64"),
+    ("tradeFeeNumerator", "u64"),
+    ("tradeFeeDenominator", "u64"),
+    ("pnlNumerator", "u64"),
+    ("pnlDenominator", "u64"),
+    ("swapFeeNumerator", "u64"),
+    ("swapFeeDenominator", "u64"),
+    ("needTakePnlCoin", "u64"),
+    ("needTakePnlPc", "u64"),
+    ("totalPnlPc", "u64"),
+    ("totalPnlCoin", "u64"),
+    ("poolOpenTime", "u64"),
+    ("punishPcAmount", "u64"),
+    ("punishCoinAmount", "u64"),
+    ("orderbookToInitTime", "u64"),
+    ("swapCoinInAmount", "u128"),
+    ("swapPcOutAmount", "u128"),
+    ("swapCoin2PcFee", "u64"),
+    ("swapPcInAmount", "u128"),
+    ("swapCoinOutAmount", "u128"),
+    ("swapPc2CoinFee", "u64"),
+    ("poolCoinTokenAccount", "pubkey"),
+    ("poolPcTokenAccount", "pubkey"),
+    ("coinMintAddress", "pubkey"),
+    ("pcMintAddress", "pubkey"),
+    ("lpMintAddress", "pubkey"),
+    ("ammOpenOrders", "pubkey"),
+    ("serumMarket", "pubkey"),
+    ("serumProgramId", "pubkey"),
+    ("ammTargetOrders", "pubkey"),
+    ("poolWithdrawQueue", "pubkey"),
+    ("poolTempLpTokenAccount", "pubkey"),
+    ("ammOwner", "pubkey"),
+    ("pnlOwner", "pubkey"),
+])
+
+MARKET_STATE_V3 = FastLayout("MarketStateV3", [
+    ("head_padding", "pad5"),
+    ("account_flags", "flags"),
+    ("own_address", "pubkey"),
+    ("vault_signer_nonce", "u64"),
+    ("base_mint", "pubkey"),
+    ("quote_mint", "pubkey"),
+    ("base_vault", "pubkey"),
+    ("base_deposits_total", "u64"),
+    ("base_fees_accrued", "u64"),
+    ("quote_vault", "pubkey"),
+    ("quote_deposits_total", "u64"),
+    ("quote_fees_accrued", "u64"),
+    ("quote_dust_threshold", "u64"),
+    ("request_queue", "pubkey"),
+    ("event_queue", "pubkey"),
+    ("bids", "pubkey"),
+    ("asks", "pubkey"),
+    ("base_lot_size", "u64"),
+    ("quote_lot_size", "u64"),
+    ("fee_rate_bps", "u64"),
+    ("referrer_rebate_accrued", "u64"),
+    ("tail_padding", "pad7"),
+])
+
+TOKEN_ACCOUNT = FastLayout("TokenAccount", [
+    ("mint", "pubkey"),
+    ("owner", "pubkey"),
+    ("amount", "u64"),
+    ("delegate_option", "u32"),
+    ("delegate", "pubkey"),
+    ("state", "u8"),
+    ("is_native_option", "u32"),
+    ("is_native", "u64"),
+    ("delegated_amount", "u64"),
+    ("close_authority_option", "u32"),
+    ("close_authority", "pubkey"),
+])
+
+SWAP = FastLayout("Swap", [
+    ("instruction", "u8"),
+    ("amount_in", "u64"),
+    ("min_amount_out", "u64"),
+])
+
+# Offsets needed by dataSlice/memcmp callers, derived from the dtype so they can never drift from the layout.
+TOKEN_ACCOUNT_AMOUNT_OFFSET = TOKEN_ACCOUNT.dtype.fields["amount"][1]
+TOKEN_ACCOUNT_AMOUNT_SIZE = 8
+LIQUIDITY_STATE_COIN_MINT_OFFSET = LIQUIDITY_STATE_V4.dtype.fields["coinMintAddress"][1]
+LIQUIDITY_STATE_PC_MINT_OFFSET = LIQUIDITY_STATE_V4.dtype.fields["pcMintAddress"][1]
+_swap_struct = SWAP.struct
+_amount_struct = struct.Struct("<Q")
+
+
+def decode_token_amount(data: bytes) -> int:
+    # Accepts either a full token account or just the amount returned by a dataSlice read.
+    offset = 0 if len(data) == TOKEN_ACCOUNT_AMOUNT_SIZE else TOKEN_ACCOUNT_AMOUNT_OFFSET
+    return _amount_struct.unpack_from(data, offset)[0]
+
+
+def build_swap_data(amount_in: int, min_amount_out: int, instruction: int = 9) -> bytes:
+    return _swap_struct.pack(instruction, amount_in, min_amount_out)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark against the construct layouts; byte-for-byte parity is checked in tests/test_fast_layouts.py.
+    import os
+    import timeit
+
+    from layouts import ACCOUNT_LAYOUT, LIQUIDITY_STATE_LAYOUT_V4, MARKET_STATE_LAYOUT_V3, SWAP_LAYOUT
+
+    market = bytearray(os.urandom(MARKET_STATE_V3.size))
+    market[5:13] = bytes(8)
+    samples = {
+        "LIQUIDITY_STATE_LAYOUT_V4": (LIQUIDITY_STATE_LAYOUT_V4, LIQUIDITY_STATE_V4,
+                                      [os.urandom(LIQUIDITY_STATE_V4.size) for _ in range(200)]),
+        "MARKET_STATE_LAYOUT_V3": (MARKET_STATE_LAYOUT_V3, MARKET_STATE_V3, [bytes(market)] * 200),
+        "ACCOUNT_LAYOUT": (ACCOUNT_LAYOUT, TOKEN_ACCOUNT, [os.urandom(TOKEN_ACCOUNT.size) for _ in range(200)]),
+    }
+
+    for name, (slow, fast, datas) in samples.items():
+        data = datas[0]
+        slow_time = timeit.timeit(lambda: slow.parse(data), number=2000)
+        fast_time = timeit.timeit(lambda: fast.parse(data), number=2000)
+        batch_time = timeit.timeit(lambda: fast.parse_batch(datas), number=10)
+        print(f"{name}: construct {2000 / slow_time:,.0f}/s, struct {2000 / fast_time:,.0f}/s "
+              f"({slow_time / fast_time:.0f}x), numpy batch {10 * len(datas) / batch_time:,.0f}/s")
+
+    swap_args = dict(instruction=9, amount_in=123456789, min_amount_out=987654321)
+    slow_time = timeit.timeit(lambda: SWAP_LAYOUT.build(swap_args), number=20000)
+    fast_time = timeit.timeit(lambda: build_swap_data(123456789, 987654321), number=20000)
+    print(f"SWAP_LAYOUT.build: construct {20000 / slow_time:,.0f}/s, struct {20000 / fast_time:,.0f}/s "
+          f"({slow_time / fast_time:.0f}x)")
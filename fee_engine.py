@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import math
+from collections import deque
+from typing import Sequence
+
+from solana.rpc.async_api import AsyncClient
+from solders.compute_budget import ID as COMPUTE_BUDGET_PROGRAM, set_compute_unit_limit, set_compute_unit_price
+from solders.instruction import Instruction
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+from solders.transaction import VersionedTransaction
+from spl.token.constants import ASSOCIATED_TOKEN_PROGRAM_ID
+
+from config import UNIT_BUDGET, UNIT_PRICE
+from constants import RAY_V4, TOKEN_PROGRAM_ID
+from settings import CU_MARGIN, PRIORITY_FEE_MAX, PRIORITY_FEE_MIN, PRIORITY_FEE_PERCENTILE, \
+    PRIORITY_FEE_REFRESH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Maximum compute units a single transaction may request
+MAX_TRANSACTION_UNITS = 1_400_000
+# ComputeBudgetInstruction::SetComputeUnitLimit discriminator
+SET_COMPUTE_UNIT_LIMIT = 2
+# Observations kept per instruction shape; the limit follows the largest of them
+UNITS_WINDOW = 50
+# getRecentPrioritizationFees accepts at most this many accounts
+MAX_FEE_ACCOUNTS = 128
+
+# (program id, first data byte) per non-compute-budget instruction: tells apart e.g. a buy that creates its token
+# account from one that does not, or a sell that closes the token account from one that keeps it.
+Shape = tuple[tuple[Pubkey, int], ...]
+
+PROGRAM_NAMES = {
+    SYSTEM_PROGRAM_ID: "system",
+    TOKEN_PROGRAM_ID: "token",
+    ASSOCIATED_TOKEN_PROGRAM_ID: "ata",
+    RAY_V4: "raydium",
+}
+
+# Engine used by buy/sell and the bundler while it runs
+_engine: "FeeEngine | None" = None
+
+
+def instruction_shape(instructions: Sequence[Instruction]) -> Shape:
+    return tuple((instruction.program_id, instruction.data[0] if instruction.data else -1)
+                 for instruction in instructions if instruction.program_id != COMPUTE_BUDGET_PROGRAM)
+
+
+def transaction_shape(txn: VersionedTransaction) -> tuple[Shape, int]:
+    account_keys = txn.message.account_keys
+    shape = []
+    limit = 0
+    for instruction in txn.message.instructions:
+        program_id = account_keys[instruction.program_id_index]
+        data = bytes(instruction.data)
+        if program_id == COMPUTE_BUDGET_PROGRAM:
+            if data and data[0] == SET_COMPUTE_UNIT_LIMIT:
+                limit = int.from_bytes(data[1:5], "little")
+            continue
+        shape.append((program_id, data[0] if data else -1))
+    return tuple(shape), limit
+
+
+def shape_label(shape: Shape) -> str:
+    return "+".join(f"{PROGRAM_NAMES.get(program_id, str(program_id)[:8])}/{op}" for program_id, op in shape)
+
+
+def _period(shape: Shape) -> int:
+    # A bundle of identical swap groups repeats the group's shape; its units then split evenly between them.
+    n = len(shape)
+    for period in range(1, n // 2 + 1):
+        if n % period == 0 and shape[:period] * (n // period) == shape:
+            return period
+    return n
+
+
+def percentile(values: Sequence[int], pct: float) -> int:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class FeeEngine:
+    """Learns compute units per instruction shape from simulations and prices transactions off recent fees."""
+
+    def __init__(self, client: AsyncClient, accounts: Sequence[Pubkey] = (),
+                 fee_percentile: float = PRIORITY_FEE_PERCENTILE, margin: float = CU_MARGIN,
+                 min_price: int = PRIORITY_FEE_MIN, max_price: int = PRIORITY_FEE_MAX,
+                 refresh_interval: float = PRIORITY_FEE_REFRESH_INTERVAL):
+        self.client = client
+        self.accounts = list(accounts)
+        self.fee_percentile = fee_percentile
+        self.margin = margin
+        self.min_price = min_price
+        self.max_price = max_price
+        self.refresh_interval = refresh_interval
+        self.unit_price = UNIT_PRICE
+        self.network_fee = None
+        self.observations = 0
+        self.exceeded = 0
+        self.fee_refreshes = 0
+        self._units: dict[Shape, deque] = {}
+        self._bumped: dict[Shape, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def watch(self, accounts: Sequence[Pubkey]):
+        # Several campaigns share one engine: fees are then priced off the writable accounts of all their pools.
+        for account in accounts:
+            if account not in self.accounts and len(self.accounts) < MAX_FEE_ACCOUNTS:
+                self.accounts.append(account)
+
+    def limit_for(self, shape: Shape) -> int:
+        samples = self._units.get(shape)
+        bumped = self._bumped.get(shape, 0)
+        if not samples and not bumped:
+            return UNIT_BUDGET
+        learned = math.ceil(max(samples) * (1 + self.margin)) if samples else 0
+        return min(MAX_TRANSACTION_UNITS, max(learned, bumped))
+
+    def observe(self, shape: Shape, units: int, exceeded: bool = False):
+        self.observations += 1
+        if exceeded:
+            # Only a lower bound is known when the limit was hit, so double it until a run fits.
+            self.exceeded += 1
+            self._bumped[shape] = min(MAX_TRANSACTION_UNITS, units * 2)
+            return
+        self._bumped.pop(shape, None)
+        self._units.setdefault(shape, deque(maxlen=UNITS_WINDOW)).append(units)
+
+    def observe_simulation(self, txn: VersionedTransaction, response):
+        units = response.value.units_consumed
+        if not units:
+            return
+        shape, limit = transaction_shape(txn)
+        exceeded = response.value.err is not None and 0 < limit <= units
+        if response.value.err is not None and not exceeded:
+            # Failed for another reason (slippage, balance), so the count stops short of a full run.
+            return
+        period = _period(shape)
+        repeats = len(shape) // period
+        if repeats == 1 and txn.message.header.num_required_signatures > 1:
+            # Mixed bundle: the total cannot be attributed to its swaps.
+            return
+        self.observe(shape[:period], math.ceil(units / repeats), exceeded)
+
+    def compute_budget(self, instructions: Sequence[Instruction]) -> list[Instruction]:
+        return [
+            set_compute_unit_limit(self.limit_for(instruction_shape(instructions))),
+            set_compute_unit_price(self.unit_price),
+        ]
+
+    async def refresh_fees(self):
+        fees = await self.client.get_recent_prioritization_fees(self.accounts)
+        if not fees:
+            return
+        self.network_fee = percentile([fee for _, fee in fees], self.fee_percentile)
+        self.unit_price = max(self.min_price, min(self.max_price, self.network_fee))
+        self.fee_refreshes += 1
+        logger.debug("Priority fee p%s over %s slot(s): %s, pricing at %s micro-lamports/CU", self.fee_percentile,
+                     len(fees), self.network_fee, self.unit_price)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_fees()
+            except Exception as e:
+                logger.warning("Priority fee refresh failed: %s", e)
+
+    async def start(self):
+        global _engine
+        try:
+            await self.refresh_fees()
+        except Exception as e:
+            logger.warning("Priority fee refresh failed, pricing at %s for now: %s", self.unit_price, e)
+        _engine = self
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        global _engine
+        if _engine is self:
+            _engine = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def describe(self) -> str:
+        limits = ", ".join(f"{shape_label(shape)}: {self.limit_for(shape)} CU ({len(self._units.get(shape, ()))} "
+                           f"sample(s))" for shape in {**self._units, **self._bumped})
+        return (f"unit price {self.unit_price} (network p{self.fee_percentile}: {self.network_fee}), "
+                f"{self.observations} observation(s), {self.exceeded} exceeded, limits: {limits or 'none learned'}")
+
+
+def compute_budget_instructions(instructions: Sequence[Instruction]) -> list[Instruction]:
+    if _engine is None:
+        return [set_compute_unit_limit(UNIT_BUDGET), set_compute_unit_price(UNIT_PRICE)]
+    return _engine.compute_budget(instructions)
+
+
+def estimate_units(instructions: Sequence[Instruction]) -> int:
+    if _engine is None:
+        return UNIT_BUDGET
+    return _engine.limit_for(instruction_shape(instructions))
+
+
+def current_unit_price() -> int:
+    return _engine.unit_price if _engine is not None else UNIT_PRICE
+
+
+def observe_simulation(txn: VersionedTransaction, response):
+    if _engine is not None:
+        _engine.observe_simulation(txn, response)
@@ -1,10 +1,22 @@
 import logging
 import logging.config
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _is_own_logger(name: str) -> bool:
+    # Module loggers (logging.getLogger(__name__)) of this project stay enabled; library loggers are silenced.
+    module = sys.modules.get(name.split(".")[0])
+    path = getattr(module, "__file__", None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == PROJECT_DIR
+
 
 def setup_logging():
     def disable_external_loggers(own_prefix="root"):
         for name in list(logging.root.manager.loggerDict):
-            if not name.startswith(own_prefix):
+            if not name.startswith(own_prefix) and not _is_own_logger(name):
                 logger = logging.getLogger(name)
                 logger.disabled = True
 
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed, Finalized
+from solana.rpc.types import TxOpts
+from solders.address_lookup_table_account import ID as ADDRESS_LOOKUP_TABLE_PROGRAM, AddressLookupTable, \
+    AddressLookupTableAccount, derive_lookup_table_address
+from solders.instruction import AccountMeta, Instruction
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.system_program import ID as SYSTEM_PROGRAM_ID
+
+from constants import OPEN_BOOK_PROGRAM, RAY_AUTHORITY_V4, RAY_V4, TOKEN_PROGRAM_ID, WSOL
+from settings import LOOKUP_TABLE_FILE
+from solana_helpers import compile_transaction
+
+logger = logging.getLogger(__name__)
+
+# Instruction discriminators of the address lookup table program (bincode u32 enum tags)
+CREATE_LOOKUP_TABLE = 0
+EXTEND_LOOKUP_TABLE = 2
+# Keeps a create + extend transaction well under the packet size limit
+MAX_ADDRESSES_PER_EXTEND = 20
+ACTIVATION_TIMEOUT = 30
+
+POOL_ACCOUNT_NAMES = (
+    "amm_id", "open_orders", "target_orders", "base_vault", "quote_vault", "market_id", "bids", "asks",
+    "event_queue", "market_base_vault", "market_quote_vault", "market_authority",
+)
+PROGRAM_ACCOUNTS = (TOKEN_PROGRAM_ID, RAY_AUTHORITY_V4, OPEN_BOOK_PROGRAM, RAY_V4, WSOL)
+
+# amm_id -> active lookup table, consulted by buy/sell when compiling their messages
+_tables: dict[Pubkey, AddressLookupTableAccount] = {}
+
+
+def lookup_tables_for(amm_id: Pubkey) -> list[AddressLookupTableAccount]:
+    table = _tables.get(amm_id)
+    return [table] if table is not None else []
+
+
+def _chunks(addresses: list[Pubkey]) -> list[list[Pubkey]]:
+    return [addresses[i:i + MAX_ADDRESSES_PER_EXTEND] for i in range(0, len(addresses), MAX_ADDRESSES_PER_EXTEND)]
+
+
+def pool_lookup_addresses(pool_keys: dict) -> list[Pubkey]:
+    return [pool_keys[name] for name in POOL_ACCOUNT_NAMES] + list(PROGRAM_ACCOUNTS)
+
+
+def create_lookup_table_instruction(authority: Pubkey, payer: Pubkey, recent_slot: int) -> tuple[Instruction, Pubkey]:
+    table, bump = derive_lookup_table_address(authority, recent_slot)
+    data = struct.pack("<IQB", CREATE_LOOKUP_TABLE, recent_slot, bump)
+    keys = [
+        AccountMeta(pubkey=table, is_signer=False, is_writable=True),
+        AccountMeta(pubkey=authority, is_signer=True, is_writable=False),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    return Instruction(ADDRESS_LOOKUP_TABLE_PROGRAM, data, keys), table
+
+
+def extend_lookup_table_instruction(table: Pubkey, authority: Pubkey, payer: Pubkey,
+                                    addresses: list[Pubkey]) -> Instruction:
+    data = struct.pack("<IQ", EXTEND_LOOKUP_TABLE, len(addresses)) + b"".join(bytes(a) for a in addresses)
+    keys = [
+        AccountMeta(pubkey=table, is_signer=False, is_writable=True),
+        AccountMeta(pubkey=authority, is_signer=True, is_writable=False),
+        AccountMeta(pubkey=payer, is_signer=True, is_writable=True),
+        AccountMeta(pubkey=SYSTEM_PROGRAM_ID, is_signer=False, is_writable=False),
+    ]
+    return Instruction(ADDRESS_LOOKUP_TABLE_PROGRAM, data, keys)
+
+
+class LookupTableManager:
+    """Creates, extends and caches one address lookup table per pool."""
+
+    def __init__(self, client: AsyncClient, authority: Keypair, path: str | None = LOOKUP_TABLE_FILE):
+        self.client = client
+        self.authority = authority
+        self.path = path
+        self._addresses: dict[str, str] = {}
+        # A table address derives from the authority and a slot, so tables are created one at a time, each from a
+        # slot no earlier table used.
+        self._lock = asyncio.Lock()
+        self._last_slot = -1
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._addresses = json.load(f)
+            except Exception as e:
+                logger.error("Failed to load lookup tables from %s: %s", path, e)
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._addresses, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    async def fetch(self, table: Pubkey) -> AddressLookupTableAccount | None:
+        response = await self.client.get_account_info(table, Confirmed)
+        if response.value is None:
+            return None
+        addresses = AddressLookupTable.deserialize(bytes(response.value.data)).addresses
+        return AddressLookupTableAccount(table, list(addresses))
+
+    async def _send(self, instructions: list[Instruction]):
+        blockhash = (await self.client.get_latest_blockhash()).value.blockhash
+        txn = compile_transaction(self.authority, instructions, blockhash)
+        response = await self.client.send_transaction(txn, opts=TxOpts(skip_preflight=False))
+        logger.info("Lookup table transaction: https://solscan.io/tx/%s", response.value)
+
+    async def _wait_for(self, table: Pubkey, addresses: list[Pubkey]) -> AddressLookupTableAccount:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ACTIVATION_TIMEOUT
+        while loop.time() < deadline:
+            account = await self.fetch(table)
+            if account is not None and set(addresses) <= set(account.addresses):
+                # Extended addresses only become usable from the next slot on.
+                await asyncio.sleep(0.5)
+                return account
+            await asyncio.sleep(0.5)
+        raise TimeoutError(f"Lookup table {table} did not activate within {ACTIVATION_TIMEOUT}s")
+
+    async def _fresh_slot(self) -> int:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + ACTIVATION_TIMEOUT
+        while loop.time() < deadline:
+            slot = (await self.client.get_slot(Finalized)).value
+            if slot > self._last_slot:
+                self._last_slot = slot
+                return slot
+            await asyncio.sleep(0.2)
+        raise TimeoutError(f"No new finalized slot after {self._last_slot} within {ACTIVATION_TIMEOUT}s")
+
+    async def ensure(self, pool_keys: dict) -> AddressLookupTableAccount:
+        async with self._lock:
+            return await self._ensure(pool_keys)
+
+    async def _ensure(self, pool_keys: dict) -> AddressLookupTableAccount:
+        amm_id = pool_keys["amm_id"]
+        wanted = pool_lookup_addresses(pool_keys)
+        authority = self.authority.pubkey()
+
+        account = None
+        cached = self._addresses.get(str(amm_id))
+        if cached:
+            account = await self.fetch(Pubkey.from_string(cached))
+            if account is None:
+                logger.warning("Cached lookup table %s for %s no longer exists", cached, amm_id)
+
+        if account is None:
+            recent_slot = await self._fresh_slot()
+            create_instr, table = create_lookup_table_instruction(authority, authority, recent_slot)
+            missing = wanted
+            batches = _chunks(missing)
+            await self._send([create_instr, extend_lookup_table_instruction(table, authority, authority, batches[0])])
+            batches = batches[1:]
+            logger.info("Created lookup table %s for pool %s", table, amm_id)
+        else:
+            table = account.key
+            existing = set(account.addresses)
+            missing = [address for address in wanted if address not in existing]
+            batches = _chunks(missing)
+
+        for batch in batches:
+            await self._send([extend_lookup_table_instruction(table, authority, authority, batch)])
+        if missing:
+            account = await self._wait_for(table, wanted)
+            self._addresses[str(amm_id)] = str(table)
+            self._save()
+
+        _tables[amm_id] = account
+        logger.debug("Using lookup table %s with %s address(es) for %s", table, len(account.addresses), amm_id)
+        return account
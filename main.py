@@ -0,0 +1,52 @@
+import asyncio
+import contextlib
+import logging
+
+from solders.keypair import Keypair
+
+import config
+import settings
+from blockhash import BlockhashService
+from campaigns import load_campaigns, run_campaigns
+from confirmation import ConfirmationTracker
+from logging_config import setup_logging
+from lookup_tables import LookupTableManager
+from metrics import MetricsServer
+from reserve_feed import ws_url_from_http
+from rpc_pool import RpcPool
+from solana_helpers import load_key_pairs
+from state_store import WalletStateStore
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    key_pairs = load_key_pairs(settings.PRIVATE_KEYS_FILE)
+    if not key_pairs:
+        logger.critical("No wallets found in %s", settings.PRIVATE_KEYS_FILE)
+        return
+
+    campaigns = load_campaigns()
+    endpoints = settings.RPC_ENDPOINTS or [settings.RPC or config.RPC]
+    metrics_server = MetricsServer() if settings.METRICS_PORT else contextlib.nullcontext()
+    async with metrics_server, RpcPool(endpoints) as client:
+        lookup_table_manager = None
+        if settings.USE_LOOKUP_TABLES:
+            lookup_table_manager = LookupTableManager(client, Keypair.from_base58_string(config.PRIVATE_KEY))
+        state_store = WalletStateStore(settings.STATE_DB) if settings.STATE_DB else contextlib.nullcontext()
+        async with state_store as store, BlockhashService(client) as blockhash_service, \
+                ConfirmationTracker(client, store=store) as tracker:
+            results = await run_campaigns(client, key_pairs, campaigns,
+                                          blockhash_service=blockhash_service, tracker=tracker,
+                                          reserve_ws_url=settings.RPC_WS or ws_url_from_http(endpoints[0]),
+                                          lookup_table_manager=lookup_table_manager, store=store)
+        logger.info("RPC endpoints: %s", client.describe())
+    for label, stats in results.items():
+        prefix = f"{label} done" if len(campaigns) > 1 else "Done"
+        logger.info("%s: %s buy(s), %s sell(s), %s failed", prefix, stats.buys, stats.sells, stats.failed)
+    logger.info("%s throttle event(s), %s hedged read(s)", client.throttled, client.hedged)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+import bisect
+import logging
+import time
+from urllib.parse import urlsplit
+
+from aiohttp import web
+
+from settings import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "volume_bot_"
+# Histogram bucket upper bounds in seconds, from an in-memory quote up to a slow confirmation
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0)
+
+# name -> (type, help, label names); every metric recorded below must be declared here
+METRICS = {
+    "stage_seconds": ("histogram", "Latency of each stage of a trade", ("stage",)),
+    "rpc_requests_total": ("counter", "RPC requests by method and endpoint", ("method", "endpoint")),
+    "rpc_errors_total": ("counter", "Failed RPC requests by method and endpoint", ("method", "endpoint")),
+    "rpc_in_flight": ("gauge", "RPC requests awaiting a response", ("endpoint",)),
+    "rpc_coalesced_total": ("counter", "RPC calls answered by an identical call already in flight", ("method",)),
+    "rpc_posts_total": ("counter", "HTTP requests sent by the batching transport, by endpoint", ("endpoint",)),
+    "rpc_backpressure_total": ("counter", "429s and timeouts that lowered the client rate limit", ()),
+    "trades_total": ("counter", "Finished trades by kind and result (landed, failed, expired; sent when untracked, "
+                                "error when never sent)", ("kind", "result")),
+    "trades_in_flight": ("gauge", "Trades currently being built or sent", ()),
+    "confirmations_total": ("counter", "Tracked transactions by final status", ("status",)),
+}
+
+Labels = tuple[str, ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation, like PromQL's histogram_quantile.
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                if index == len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[-1]
+                lower = LATENCY_BUCKETS[index - 1] if index else 0.0
+                return lower + (LATENCY_BUCKETS[index] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return 0.0
+
+
+class StageTimer:
+    """Context manager that records the wall time of a block into a stage histogram."""
+
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+# Process-wide registry: metric name -> label values -> histogram or value
+_histograms: dict[str, dict[Labels, Histogram]] = {name: {} for name, (kind, _, _) in METRICS.items()
+                                                  if kind == "histogram"}
+_values: dict[str, dict[Labels, float]] = {name: {} for name, (kind, _, _) in METRICS.items() if kind != "histogram"}
+
+
+def _histogram(name: str, labels: Labels) -> Histogram:
+    histograms = _histograms[name]
+    histogram = histograms.get(labels)
+    if histogram is None:
+        histogram = histograms[labels] = Histogram()
+    return histogram
+
+
+def stage(name: str) -> StageTimer:
+    return StageTimer(_histogram("stage_seconds", (name,)))
+
+
+def stage_histograms() -> dict[str, Histogram]:
+    return {labels[0]: histogram for labels, histogram in _histograms["stage_seconds"].items()}
+
+
+def observe_stage(name: str, seconds: float):
+    _histogram("stage_seconds", (name,)).observe(seconds)
+
+
+def inc(name: str, labels: Labels = (), value: float = 1):
+    values = _values[name]
+    values[labels] = values.get(labels, 0) + value
+
+
+def endpoint_label(url: str) -> str:
+    # Host and port only: RPC URLs often carry API keys in their path or query string.
+    parts = urlsplit(url)
+    return parts.hostname + (f":{parts.port}" if parts.port else "") if parts.hostname else url
+
+
+def _format_labels(names: tuple[str, ...], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def render() -> str:
+    lines = []
+    for name, (kind, help_text, label_names) in METRICS.items():
+        full_name = PREFIX + name
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {kind}")
+        if kind == "histogram":
+            for labels, histogram in _histograms[name].items():
+                cumulative = 0
+                for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                    cumulative += count
+                    bucket_labels = _format_labels(label_names, labels, f'le="{bound}"')
+                    lines.append(f"{full_name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{full_name}_sum{_format_labels(label_names, labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_format_labels(label_names, labels)} {histogram.count}")
+        else:
+            for labels, value in _values[name].items():
+                lines.append(f"{full_name}{_format_labels(label_names, labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves the registry in the Prometheus text format on /metrics."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # Metrics are diagnostics only; a taken port must not stop the bot from trading.
+            logger.error("Metrics endpoint unavailable on %s:%s: %s", self.host, self.port, e)
+            await self.stop()
+            return
+        logger.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+from solana.rpc.async_api import AsyncClient
+from solders.pubkey import Pubkey
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+
+Resolver = Callable[[AsyncClient, str], Awaitable[dict | None]]
+Validator = Callable[[AsyncClient, dict], Awaitable[dict | None]]
+
+
+def _serialize_pool_keys(pool_keys: dict) -> dict:
+    return {name: value if isinstance(value, int) else str(value) for name, value in pool_keys.items()}
+
+
+def _deserialize_pool_keys(raw: dict) -> dict:
+    return {name: value if isinstance(value, int) else Pubkey.from_string(value) for name, value in raw.items()}
+
+
+class PoolKeysCache:
+    """Token address -> pool keys, kept in memory and mirrored to a JSON file."""
+
+    def __init__(self, path: str | None, resolver: Resolver, validator: Validator, ttl: float = 0):
+        self.path = path
+        self.resolver = resolver
+        self.validator = validator
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, dict]] = {}
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") != CACHE_VERSION:
+                logger.info("Ignoring pool cache %s with version %s", self.path, data.get('version'))
+                return
+            for token_address, entry in data["pools"].items():
+                # Entries loaded from disk are stamped as expired so they get revalidated once on first use.
+                self._entries[token_address] = (0.0, _deserialize_pool_keys(entry))
+            logger.debug("Loaded %s pool(s) from %s", len(self._entries), self.path)
+        except Exception as e:
+            logger.error("Failed to load pool cache %s: %s", self.path, e)
+
+    def _save(self):
+        if not self.path:
+            return
+        data = {
+            "version": CACHE_VERSION,
+            "pools": {token: _serialize_pool_keys(keys) for token, (_, keys) in self._entries.items()},
+        }
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error("Failed to save pool cache %s: %s", self.path, e)
+
+    def peek(self, token_address: str) -> dict | None:
+        entry = self._entries.get(token_address)
+        return entry[1] if entry else None
+
+    def invalidate(self, token_address: str):
+        if self._entries.pop(token_address, None) is not None:
+            self._save()
+
+    async def get(self, client: AsyncClient, token_address: str) -> dict | None:
+        entry = self._entries.get(token_address)
+        if entry and entry[0] and (not self.ttl or time.monotonic() - entry[0] < self.ttl):
+            return entry[1]
+
+        future = self._in_flight.get(token_address)
+        if future is None:
+            future = asyncio.ensure_future(self._refresh(client, token_address, entry))
+            self._in_flight[token_address] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(token_address, None))
+        return await asyncio.shield(future)
+
+    async def _refresh(self, client: AsyncClient, token_address: str, entry: tuple[float, dict] | None) -> dict | None:
+        pool_keys = None
+        if entry:
+            try:
+                pool_keys = await self.validator(client, entry[1])
+            except Exception as e:
+                logger.warning("Failed to revalidate pool keys for %s: %s", token_address, e)
+                # Keep serving the cached keys if the RPC is flaky; a changed pool will fail the swap anyway.
+                self._entries[token_address] = (time.monotonic(), entry[1])
+                return entry[1]
+            if pool_keys is None:
+                logger.info("Pool accounts for %s changed, resolving again", token_address)
+            elif pool_keys != entry[1]:
+                logger.info("Pool keys for %s changed, updating cache", token_address)
+
+        if pool_keys is None:
+            pool_keys = await self.resolver(client, token_address)
+            if pool_keys is None:
+                self.invalidate(token_address)
+                return None
+
+        self._entries[token_address] = (time.monotonic(), pool_keys)
+        if entry is None or pool_keys != entry[1]:
+            self._save()
+        return pool_keys
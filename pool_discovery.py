@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Confirmed, Processed
+from solana.rpc.types import MemcmpOpts
+from solders.pubkey import Pubkey
+from solders.rpc.responses import GetProgramAccountsResp
+
+from constants import RAY_V4, WSOL
+from fast_layouts import LIQUIDITY_STATE_COIN_MINT_OFFSET, LIQUIDITY_STATE_PC_MINT_OFFSET, LIQUIDITY_STATE_V4, \
+    decode_token_amount
+import metrics
+from solana_helpers import TOKEN_AMOUNT_SLICE
+from wallet_snapshot import MAX_ACCOUNTS_PER_REQUEST
+
+logger = logging.getLogger(__name__)
+
+# AmmStatus values that reject swaps: uninitialized, disabled, withdraw only and liquidity only
+NON_SWAPPABLE_STATUSES = frozenset({0, 2, 3, 4})
+
+
+@dataclass
+class PoolCandidate:
+    amm_id: Pubkey
+    amm_data: bytes
+    market_id: Pubkey
+    sol_vault: Pubkey
+    token_vault: Pubkey
+    sol_reserve: int = 0
+    token_reserve: int = 0
+
+
+def _mint_filters(coin_mint: Pubkey, pc_mint: Pubkey) -> list:
+    return [
+        LIQUIDITY_STATE_V4.size,
+        MemcmpOpts(offset=LIQUIDITY_STATE_COIN_MINT_OFFSET, bytes=str(coin_mint)),
+        MemcmpOpts(offset=LIQUIDITY_STATE_PC_MINT_OFFSET, bytes=str(pc_mint)),
+    ]
+
+
+def _candidate(amm_id: Pubkey, amm_data: bytes) -> PoolCandidate | None:
+    state = LIQUIDITY_STATE_V4.parse(amm_data)
+    if state.status in NON_SWAPPABLE_STATUSES:
+        return None
+    coin_vault = Pubkey.from_bytes(state.poolCoinTokenAccount)
+    pc_vault = Pubkey.from_bytes(state.poolPcTokenAccount)
+    sol_is_coin = state.coinMintAddress == bytes(WSOL)
+    return PoolCandidate(
+        amm_id=amm_id,
+        amm_data=amm_data,
+        market_id=Pubkey.from_bytes(state.serumMarket),
+        sol_vault=coin_vault if sol_is_coin else pc_vault,
+        token_vault=pc_vault if sol_is_coin else coin_vault,
+    )
+
+
+class PoolIndex:
+    """Raydium V4 pools of each mint against SOL, found on chain and ranked by the SOL held in their vaults."""
+
+    def __init__(self):
+        self._pools: dict[Pubkey, list[PoolCandidate]] = {}
+
+    def candidates(self, mint: Pubkey) -> list[PoolCandidate]:
+        return self._pools.get(mint, [])
+
+    def best(self, mint: Pubkey) -> PoolCandidate | None:
+        candidates = self.candidates(mint)
+        return candidates[0] if candidates else None
+
+    async def discover(self, client: AsyncClient, mint: Pubkey) -> list[PoolCandidate]:
+        # The token can sit on either side of the pair, so query both orderings; each is an exact memcmp match on
+        # two mints plus the account size, which the RPC node can answer from its program index.
+        with metrics.stage("pool_discovery"):
+            responses = await asyncio.gather(*(
+                client.get_program_accounts(RAY_V4, Confirmed, "base64", filters=_mint_filters(coin, pc))
+                for coin, pc in ((mint, WSOL), (WSOL, mint))
+            ))
+            candidates = []
+            for response in responses:
+                if not isinstance(response, GetProgramAccountsResp):
+                    # solana-py hands JSON-RPC errors back as the parsed error instead of raising
+                    raise RuntimeError(f"getProgramAccounts failed: {response.message}")
+                for keyed_account in response.value:
+                    candidate = _candidate(keyed_account.pubkey, bytes(keyed_account.account.data))
+                    if candidate is not None:
+                        candidates.append(candidate)
+            await self.rank(client, mint, candidates)
+        logger.debug("discovered pools mint=%s count=%d", mint, len(candidates))
+        return self.candidates(mint)
+
+    async def rank(self, client: AsyncClient, mint: Pubkey, candidates: list[PoolCandidate] | None = None):
+        candidates = self.candidates(mint) if candidates is None else candidates
+        vaults = [vault for candidate in candidates for vault in (candidate.sol_vault, candidate.token_vault)]
+        responses = await asyncio.gather(*(
+            client.get_multiple_accounts(vaults[i:i + MAX_ACCOUNTS_PER_REQUEST], Processed,
+                                         data_slice=TOKEN_AMOUNT_SLICE)
+            for i in range(0, len(vaults), MAX_ACCOUNTS_PER_REQUEST)
+        ))
+        accounts = [account for response in responses for account in response.value]
+        for i, candidate in enumerate(candidates):
+            sol_account, token_account = accounts[2 * i], accounts[2 * i + 1]
+            candidate.sol_reserve = decode_token_amount(bytes(sol_account.data)) if sol_account else 0
+            candidate.token_reserve = decode_token_amount(bytes(token_account.data)) if token_account else 0
+        # Constant-product price impact shrinks with the reserves, so the deepest SOL side quotes best both ways.
+        self._pools[mint] = sorted((candidate for candidate in candidates if candidate.sol_reserve),
+                                   key=lambda candidate: candidate.sol_reserve, reverse=True)
+
+    def describe(self, mint: Pubkey) -> str:
+        return ", ".join(f"{candidate.amm_id}: {candidate.sol_reserve / 10 ** 9:,.2f} SOL"
+                         for candidate in self.candidates(mint)) or "no pools"
@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+# Slippage is configured in percent (see SLIPPAGE in settings.py); amounts are scaled in basis points so
+# fractional percentages still round down exactly.
+BPS = 10_000
+
+
+def trade_fee(amount_in: int, fee_numerator: int, fee_denominator: int) -> int:
+    if not fee_denominator:
+        return 0
+    # Raydium rounds the fee up, so the amount that reaches the curve is never overestimated.
+    return -(-amount_in * fee_numerator // fee_denominator)
+
+
+def quote_exact_in(amount_in: int, reserve_in: int, reserve_out: int,
+                   fee_numerator: int = 0, fee_denominator: int = 0) -> int:
+    amount_in_after_fee = amount_in - trade_fee(amount_in, fee_numerator, fee_denominator)
+    if amount_in_after_fee <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    return reserve_out * amount_in_after_fee // (reserve_in + amount_in_after_fee)
+
+
+def slippage_bps(slippage: float) -> int:
+    return int(round(slippage * 100))
+
+
+def apply_slippage(amount_out, slippage: float):
+    keep = BPS - slippage_bps(slippage)
+    if isinstance(amount_out, np.ndarray):
+        amount_out = amount_out.astype(np.uint64)
+        # Split the multiplication so large u64 amounts never overflow: (q * BPS + r) * keep // BPS.
+        return amount_out // BPS * keep + amount_out % BPS * keep // BPS
+    return amount_out * keep // BPS
+
+
+@dataclass
+class WavePlan:
+    is_buy: np.ndarray
+    amount_in: np.ndarray
+    amount_out: np.ndarray
+    worst_amount_out: np.ndarray
+    min_amount_out: np.ndarray
+    sol_reserve: np.ndarray
+    token_reserve: np.ndarray
+
+    def __len__(self):
+        return len(self.amount_in)
+
+    def quote(self, index: int) -> tuple[int, int]:
+        return int(self.amount_in[index]), int(self.min_amount_out[index])
+
+    @property
+    def final_reserves(self) -> tuple[int, int]:
+        return int(self.sol_reserve[-1]), int(self.token_reserve[-1])
+
+
+def plan_wave(sol_reserve: int, token_reserve: int, is_buy: Sequence[bool], amount_in: Sequence[int],
+              slippage: float, fee_numerator: int = 0, fee_denominator: int = 0) -> WavePlan:
+    """Price a batch of swaps that are sent together and land in whatever order the cluster picks.
+
+    Buys spend SOL for tokens and sells spend tokens for SOL. amount_out walks the wave in the given order, each
+    trade quoted against the reserves left by the ones before it; sol_reserve and token_reserve hold the reserves
+    after each trade. min_amount_out applies the slippage to worst_amount_out instead: what the trade gets in the
+    worst position it can land in, after every other trade in its direction and before any in the opposite one,
+    so the limits hold whatever order the wave lands in.
+    """
+    is_buy = np.asarray(is_buy, dtype=bool)
+    amounts = np.asarray(amount_in, dtype=np.uint64)
+    count = len(amounts)
+    amount_out = np.zeros(count, dtype=np.uint64)
+    sol_after = np.zeros(count, dtype=np.uint64)
+    token_after = np.zeros(count, dtype=np.uint64)
+
+    # Each quote depends on the reserves left by the previous trade, so the curve itself is walked in order
+    # with exact Python integers (products of u64 reserves and amounts overflow 64 bits).
+    sol, token = int(sol_reserve), int(token_reserve)
+    for i, (buy, amount) in enumerate(zip(is_buy.tolist(), amounts.tolist())):
+        if buy:
+            out = quote_exact_in(amount, sol, token, fee_numerator, fee_denominator)
+            sol, token = sol + amount, token - out
+        else:
+            out = quote_exact_in(amount, token, sol, fee_numerator, fee_denominator)
+            sol, token = sol - out, token + amount
+        amount_out[i] = out
+        sol_after[i] = sol
+        token_after[i] = token
+
+    # The input reserve a trade sees behind the rest of its direction is exact whatever their order. The fees they
+    # leave in the pool only add to the output reserve, so the fee-free constant product bounds it from below.
+    worst_amount_out = np.zeros(count, dtype=np.uint64)
+    sol_reserve, token_reserve = int(sol_reserve), int(token_reserve)
+    bought = sum(amount for buy, amount in zip(is_buy.tolist(), amounts.tolist()) if buy)
+    sold = sum(amount for buy, amount in zip(is_buy.tolist(), amounts.tolist()) if not buy)
+    for i, (buy, amount) in enumerate(zip(is_buy.tolist(), amounts.tolist())):
+        if buy:
+            sol = sol_reserve + bought - amount
+            worst_amount_out[i] = quote_exact_in(amount, sol, sol_reserve * token_reserve // sol if sol else 0,
+                                                 fee_numerator, fee_denominator)
+        else:
+            token = token_reserve + sold - amount
+            worst_amount_out[i] = quote_exact_in(amount, token, sol_reserve * token_reserve // token if token else 0,
+                                                 fee_numerator, fee_denominator)
+
+    return WavePlan(
+        is_buy=is_buy,
+        amount_in=amounts,
+        amount_out=amount_out,
+        worst_amount_out=worst_amount_out,
+        min_amount_out=apply_slippage(worst_amount_out, slippage),
+        sol_reserve=sol_after,
+        token_reserve=token_after,
+    )
@@ -0,0 +1,126 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+
+import httpx
+from solana.rpc.async_api import AsyncClient
+
+import metrics
+from settings import RPC_BURST, RPC_MIN_RATE_LIMIT, RPC_RATE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+def is_backpressure_error(exc: BaseException) -> bool:
+    # solana-py wraps transport errors in SolanaRpcException, so walk the whole cause chain.
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if isinstance(exc, (httpx.TimeoutException, asyncio.TimeoutError)):
+            return True
+        if isinstance(exc, httpx.HTTPStatusError) and exc.response.status_code == 429:
+            return True
+        if "429" in str(exc) or "Too Many Requests" in str(exc):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class TokenBucket:
+    """Token bucket whose refill rate backs off multiplicatively on 429s/timeouts and recovers additively.
+
+    A rate of 0 (or less) leaves requests unlimited.
+    """
+
+    def __init__(self, rate: float = RPC_RATE_LIMIT, burst: int = RPC_BURST, min_rate: float = RPC_MIN_RATE_LIMIT,
+                 backoff: float = 0.5, recovery: float = 0.05):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.backoff = backoff
+        self.recovery = recovery
+        self.tokens = float(burst)
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def unlimited(self) -> bool:
+        return self.max_rate <= 0
+
+    async def acquire(self):
+        if self.unlimited:
+            return
+        # The lock keeps waiters FIFO so a burst of wallets cannot starve an earlier caller.
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def on_success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery)
+
+    def on_backpressure(self):
+        self._refill()
+        self.throttled += 1
+        metrics.inc("rpc_backpressure_total")
+        if self.unlimited:
+            return
+        self.rate = max(self.min_rate, self.rate * self.backoff)
+        # Drain the bucket so the burst allowance does not immediately hit the endpoint again.
+        self.tokens = min(self.tokens, 0)
+        logger.warning("RPC backpressure detected, rate limit lowered to %.1f req/s", self.rate)
+
+
+class RateLimitedClient:
+    """Drop-in proxy for AsyncClient that passes every RPC coroutine through a TokenBucket."""
+
+    def __init__(self, client: AsyncClient, bucket: TokenBucket | None = None):
+        self.client = client
+        # A batching transport spends the tokens itself, per request it actually sends after coalescing.
+        self._batcher = getattr(client, "batcher", None)
+        self.bucket = bucket or TokenBucket()
+
+    @property
+    def bucket(self) -> TokenBucket:
+        return self._bucket
+
+    @bucket.setter
+    def bucket(self, bucket: TokenBucket):
+        self._bucket = bucket
+        if self._batcher is not None:
+            self._batcher.bucket = bucket
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not inspect.iscoroutinefunction(attr) or self._batcher is not None:
+            return attr
+
+        @functools.wraps(attr)
+        async def limited(*args, **kwargs):
+            await self.bucket.acquire()
+            try:
+                result = await attr(*args, **kwargs)
+            except Exception as e:
+                if is_backpressure_error(e):
+                    self.bucket.on_backpressure()
+                raise
+            self.bucket.on_success()
+            return result
+
+        setattr(self, name, limited)
+        return limited
+
+    async def close(self):
+        await self.client.close()
@@ -4,117 +4,80 @@ from solana.rpc.async_api import AsyncClient
 from solana.rpc.commitment import Processed
 from solana.rpc.types import TokenAccountOpts
 
-from solders.instruction import AccountMeta, Instruction
+from solders.instruction import Instruction
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
-from solders.compute_budget import set_compute_unit_limit, set_compute_unit_price
+from solders.signature import Signature
 from spl.token.instructions import (
     CloseAccountParams,
     close_account,
-    create_associated_token_account,
-    get_associated_token_address
+    create_associated_token_account
 )
 
-from config import UNIT_BUDGET, UNIT_PRICE
+from blockhash import BlockhashService
+from confirmation import ConfirmationTracker
 from constants import SOL
 from solana_helpers import create_wsol_account_instructions, compile_and_send_transaction, \
-    get_token_balance
-from constants import TOKEN_PROGRAM_ID, RAY_AUTHORITY_V4, OPEN_BOOK_PROGRAM, RAY_V4
-from layouts import SWAP_LAYOUT, MARKET_STATE_LAYOUT_V3, LIQUIDITY_STATE_LAYOUT_V4
+    get_raw_token_balance, EMPTY_SLICE, TOKEN_AMOUNT_SLICE
+from constants import TOKEN_PROGRAM_ID, OPEN_BOOK_PROGRAM
+from derivations import ata_address
+from fast_layouts import LIQUIDITY_STATE_V4, MARKET_STATE_V3, decode_token_amount
+from fee_engine import compute_budget_instructions
+from lookup_tables import lookup_tables_for
+import metrics
+from pool_cache import PoolKeysCache
+from pool_discovery import PoolIndex
+from quote import apply_slippage, quote_exact_in
+from reserve_feed import active_feed
+from settings import DEXSCREENER_API, DEXSCREENER_FALLBACK, POOL_CACHE_FILE, POOL_CACHE_TTL
+from swap_template import swap_template
+from wallet_snapshot import WalletSnapshot, WalletState
+from wsol_accounts import WsolAccounts
 
 logger = logging.getLogger(__name__)
 
 
-def calculate_transaction_amounts(amount_in: float, in_reserve, out_reserve,
-                                  slippage: int):
-    logging.debug(f"Calculating amounts: amount_in={amount_in}, in_reserve={in_reserve}, "
-                  f"out_reserve={out_reserve}, slippage={slippage}")
-    constant_product = in_reserve * out_reserve
-    new_in_reserve = in_reserve + amount_in
-    new_out_reserve = constant_product / new_in_reserve
-    amount_out = out_reserve - new_out_reserve
-    minimum_amount_out = amount_out * (1 - slippage / 100)
+async def get_raw_reserve(client: AsyncClient, pool_keys: dict) -> tuple[int, int, int]:
+    feed = active_feed(pool_keys["amm_id"])
+    if feed is not None:
+        return feed.reserves()
 
-    logging.debug(f"Calculated values: effective_amount_in={amount_in}, "
-                  f"amount_out={amount_out}, minimum_amount_out={minimum_amount_out}")
-    return amount_in, minimum_amount_out
-
-async def get_reserve(client: AsyncClient, pool_keys: dict) -> tuple:
-    try:
-        base_vault = pool_keys["base_vault"]
-        quote_vault = pool_keys["quote_vault"]
-        base_decimal = pool_keys["base_decimals"]
-        quote_decimal = pool_keys["quote_decimals"]
-        base_mint = pool_keys["base_mint"]
-
-        balances_response = await client.get_multiple_accounts_json_parsed(
-            [base_vault, quote_vault],
-            Processed
+    with metrics.stage("reserve_fetch"):
+        balances_response = await client.get_multiple_accounts(
+            [pool_keys["base_vault"], pool_keys["quote_vault"]],
+            Processed,
+            data_slice=TOKEN_AMOUNT_SLICE,
         )
-        balances = balances_response.value
+    pool_coin_account, pool_pc_account = balances_response.value
 
-        pool_coin_account = balances[0]
-        pool_pc_account = balances[1]
+    pool_coin_account_balance = decode_token_amount(bytes(pool_coin_account.data))
+    pool_pc_account_balance = decode_token_amount(bytes(pool_pc_account.data))
 
-        pool_coin_account_balance = pool_coin_account.data.parsed['info']['tokenAmount']['uiAmount']
-        pool_pc_account_balance = pool_pc_account.data.parsed['info']['tokenAmount']['uiAmount']
+    if pool_keys["base_mint"] == Pubkey.from_string(SOL):
+        return pool_coin_account_balance, pool_pc_account_balance, pool_keys["quote_decimals"]
+    return pool_pc_account_balance, pool_coin_account_balance, pool_keys["base_decimals"]
 
-        sol_mint_address = Pubkey.from_string(SOL)
-
-        if base_mint == sol_mint_address:
-            base_reserve = pool_coin_account_balance
-            quote_reserve = pool_pc_account_balance
-            token_decimal = quote_decimal
-        else:
-            base_reserve = pool_pc_account_balance
-            quote_reserve = pool_coin_account_balance
-            token_decimal = base_decimal
 
-        return base_reserve, quote_reserve, token_decimal
+def quote_swap(amount_in: int, in_reserve: int, out_reserve: int, slippage: int, pool_keys: dict) -> tuple[int, int]:
+    with metrics.stage("quote"):
+        amount_out = quote_exact_in(amount_in, in_reserve, out_reserve,
+                                    pool_keys["trade_fee_numerator"], pool_keys["trade_fee_denominator"])
+        minimum_amount_out = apply_slippage(amount_out, slippage)
+    logger.debug("quoted swap amount_in=%d amount_out=%d minimum_amount_out=%d",
+                 amount_in, amount_out, minimum_amount_out)
+    return amount_in, minimum_amount_out
 
-    except Exception as e:
-        logging.error(f"Error occurred: {e}")
 
 def make_swap_instruction(amount_in: int, minimum_amount_out: int, token_account_in: Pubkey,
                                 token_account_out: Pubkey, accounts: dict, owner: Keypair) -> Instruction | None:
-    keys = [
-        AccountMeta(pubkey=TOKEN_PROGRAM_ID, is_signer=False, is_writable=False),
-        AccountMeta(pubkey=accounts["amm_id"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=RAY_AUTHORITY_V4, is_signer=False, is_writable=False),
-        AccountMeta(pubkey=accounts["open_orders"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["target_orders"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["base_vault"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["quote_vault"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=OPEN_BOOK_PROGRAM, is_signer=False, is_writable=False),
-        AccountMeta(pubkey=accounts["market_id"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["bids"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["asks"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["event_queue"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["market_base_vault"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["market_quote_vault"], is_signer=False, is_writable=True),
-        AccountMeta(pubkey=accounts["market_authority"], is_signer=False, is_writable=False),
-        AccountMeta(pubkey=token_account_in, is_signer=False, is_writable=True),
-        AccountMeta(pubkey=token_account_out, is_signer=False, is_writable=True),
-        AccountMeta(pubkey=owner.pubkey(), is_signer=True, is_writable=False)
-    ]
-
-    data = SWAP_LAYOUT.build(
-        dict(
-            instruction=9,
-            amount_in=amount_in,
-            min_amount_out=minimum_amount_out
-        )
-    )
-    return Instruction(RAY_V4, data, keys)
+    return swap_template(accounts).build(amount_in, minimum_amount_out, token_account_in, token_account_out,
+                                         owner.pubkey())
 
 
-async def fetch_pool_keys(client: AsyncClient, pair_address: str) -> dict:
-    amm_id = Pubkey.from_string(pair_address)
-    account_info = await client.get_account_info_json_parsed(amm_id)
-    amm_data_decoded = LIQUIDITY_STATE_LAYOUT_V4.parse(account_info.value.data)
+def decode_pool_keys(amm_id: Pubkey, amm_data: bytes, market_data: bytes) -> dict:
+    amm_data_decoded = LIQUIDITY_STATE_V4.parse(amm_data)
     market_id = Pubkey.from_bytes(amm_data_decoded.serumMarket)
-    market_info = await client.get_account_info_json_parsed(market_id)
-    market_decoded = MARKET_STATE_LAYOUT_V3.parse(market_info.value.data)
+    market_decoded = MARKET_STATE_V3.parse(market_data)
 
     pool_keys = {
         "amm_id": amm_id,
@@ -122,6 +85,8 @@ async def fetch_pool_keys(client: AsyncClient, pair_address: str) -> dict:
         "quote_mint": Pubkey.from_bytes(market_decoded.quote_mint),
         "base_decimals": amm_data_decoded.coinDecimals,
         "quote_decimals": amm_data_decoded.pcDecimals,
+        "trade_fee_numerator": amm_data_decoded.tradeFeeNumerator,
+        "trade_fee_denominator": amm_data_decoded.tradeFeeDenominator,
         "open_orders": Pubkey.from_bytes(amm_data_decoded.ammOpenOrders),
         "target_orders": Pubkey.from_bytes(amm_data_decoded.ammTargetOrders),
         "base_vault": Pubkey.from_bytes(amm_data_decoded.poolCoinTokenAccount),
@@ -140,9 +105,29 @@ async def fetch_pool_keys(client: AsyncClient, pair_address: str) -> dict:
     return pool_keys
 
 
+async def fetch_pool_keys(client: AsyncClient, pair_address: str) -> dict:
+    amm_id = Pubkey.from_string(pair_address)
+    account_info = await client.get_account_info(amm_id, encoding="base64")
+    amm_data = bytes(account_info.value.data)
+    market_id = Pubkey.from_bytes(LIQUIDITY_STATE_V4.parse(amm_data).serumMarket)
+    market_info = await client.get_account_info(market_id, encoding="base64")
+    return decode_pool_keys(amm_id, amm_data, bytes(market_info.value.data))
+
+
+async def revalidate_pool_keys(client: AsyncClient, pool_keys: dict) -> dict | None:
+    response = await client.get_multiple_accounts([pool_keys["amm_id"], pool_keys["market_id"]])
+    amm_account, market_account = response.value
+    if amm_account is None or market_account is None:
+        return None
+    amm_data = bytes(amm_account.data)
+    if Pubkey.from_bytes(LIQUIDITY_STATE_V4.parse(amm_data).serumMarket) != pool_keys["market_id"]:
+        return None
+    return decode_pool_keys(pool_keys["amm_id"], amm_data, bytes(market_account.data))
+
+
 async def get_pool_keys(base_mint):
     try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{base_mint}"
+        url = f"{DEXSCREENER_API}/latest/dex/tokens/{base_mint}"
         headers = {
             "Accept": "application/json",
             "Content-Type": "application/json",
@@ -160,7 +145,8 @@ async def get_pool_keys(base_mint):
         ]
         if not raydium_pairs:
             return None
-        raydium_pair_id = raydium_pairs[0]['pairAddress']
+        deepest_pair = max(raydium_pairs, key=lambda pair: (pair.get('liquidity') or {}).get('usd') or 0)
+        raydium_pair_id = deepest_pair['pairAddress']
         logging.debug(f"Raydium pair: {raydium_pair_id}")
         return raydium_pair_id
     except Exception as e:
@@ -168,108 +154,209 @@ async def get_pool_keys(base_mint):
         return None
 
 
-async def _process_start_swap(client: AsyncClient, token_address: str):
-    pair_address = await get_pool_keys(token_address)
-    if not pair_address:
-        logging.critical("No pair address found...")
-        return False
+pool_index = PoolIndex()
+
+
+async def discover_pool_keys(client: AsyncClient, token_address: str) -> dict | None:
+    mint = Pubkey.from_string(token_address)
+    candidates = await pool_index.discover(client, mint)
+    if not candidates:
+        return None
+    best = candidates[0]
+    logging.info(f"Found {len(candidates)} Raydium V4 pool(s) for {token_address}: {pool_index.describe(mint)}")
+    market_info = await client.get_account_info(best.market_id, encoding="base64")
+    return decode_pool_keys(best.amm_id, best.amm_data, bytes(market_info.value.data))
 
-    pool_keys = await fetch_pool_keys(client, pair_address)
+
+async def _resolve_pool_keys(client: AsyncClient, token_address: str) -> dict | None:
+    try:
+        pool_keys = await discover_pool_keys(client, token_address)
+    except Exception as e:
+        # Many public RPC endpoints refuse getProgramAccounts on large programs such as Raydium V4.
+        if not DEXSCREENER_FALLBACK:
+            raise
+        logging.warning(f"On-chain pool discovery failed, falling back to DexScreener: {e}")
+        pair_address = await get_pool_keys(token_address)
+        if not pair_address:
+            logging.critical("No pair address found...")
+            return None
+        pool_keys = await fetch_pool_keys(client, pair_address)
     if not pool_keys:
         logging.critical("No pool keys found...")
-        return False
+        return None
 
     logging.debug(f"Fetched pool keys: {pool_keys}")
+    return pool_keys
+
+
+pool_keys_cache = PoolKeysCache(POOL_CACHE_FILE, _resolve_pool_keys, revalidate_pool_keys, POOL_CACHE_TTL)
+
+
+async def _process_start_swap(client: AsyncClient, token_address: str):
+    with metrics.stage("pool_resolution"):
+        pool_keys = await pool_keys_cache.get(client, token_address)
+    if not pool_keys:
+        return False
 
     mint = pool_keys['base_mint'] if str(pool_keys['base_mint']) != SOL else pool_keys['quote_mint']
-    logging.debug(f"Selected mint: {mint}")
+    logger.debug("selected mint=%s", mint)
     return mint, pool_keys
 
 
-async def buy(client: AsyncClient, key_pair: Keypair, token_address: str, sol_in: float, slippage: int) -> bool:
-    try:
-        logging.info(f"Starting buy transaction for token: {token_address}")
-        mint, pool_keys = await _process_start_swap(client, token_address)
-        token_account_check = await client.get_token_accounts_by_owner(key_pair.pubkey(),
-                                                                       TokenAccountOpts(mint),
-                                                                       Processed)
+def _snapshot_state(snapshot: WalletSnapshot | None, key_pair: Keypair, mint: Pubkey) -> WalletState | None:
+    if snapshot is None or snapshot.mint != mint:
+        return None
+    return snapshot.get(key_pair.pubkey())
+
+
+async def build_buy_instructions(client: AsyncClient, key_pair: Keypair, mint: Pubkey, pool_keys: dict,
+                                 sol_in: float, slippage: int, wallet_state: WalletState | None = None,
+                                 quote: tuple[int, int] | None = None,
+                                 wsol_accounts: WsolAccounts | None = None) -> list[Instruction]:
+    if wallet_state is not None:
+        token_account = wallet_state.ata
+        if wallet_state.ata_exists:
+            token_account_instr = None
+            logger.debug("token account from snapshot account=%s", token_account)
+        else:
+            token_account_instr = create_associated_token_account(key_pair.pubkey(), key_pair.pubkey(), mint)
+            logger.debug("creating token account account=%s", token_account)
+    else:
+        token_account_check = await client.get_token_accounts_by_owner(
+            key_pair.pubkey(),
+            TokenAccountOpts(mint, encoding="base64", data_slice=EMPTY_SLICE),
+            Processed,
+        )
         if token_account_check.value:
             token_account = token_account_check.value[0].pubkey
             token_account_instr = None
-            logging.debug(f"Found existing token account: {token_account}")
+            logger.debug("found token account account=%s", token_account)
         else:
-            token_account = get_associated_token_address(key_pair.pubkey(), mint)
+            token_account = ata_address(key_pair.pubkey(), mint)
             token_account_instr = create_associated_token_account(key_pair.pubkey(), key_pair.pubkey(), mint)
-            logging.debug(f"Creating associated token account: {token_account}")
-
-        base_reserve, quote_reserve, token_decimal = await get_reserve(client, pool_keys)
-        amount_in, minimum_amount_out = calculate_transaction_amounts(sol_in, base_reserve, quote_reserve, slippage)
-        amount_in = int(amount_in * (10 ** 9))
-        minimum_amount_out = int(minimum_amount_out * (10 ** token_decimal))
-
+            logger.debug("creating token account account=%s", token_account)
+
+    if quote is not None:
+        amount_in, minimum_amount_out = quote
+    else:
+        sol_reserve, token_reserve, _ = await get_raw_reserve(client, pool_keys)
+        amount_in, minimum_amount_out = quote_swap(int(sol_in * 10 ** 9), sol_reserve, token_reserve,
+                                                   slippage, pool_keys)
+
+    if wsol_accounts is not None and key_pair.pubkey() in wsol_accounts:
+        wsol_token_account, wsol_instr = wsol_accounts.spend_instructions(key_pair, amount_in)
+        close_instr = None
+    else:
         wsol_token_account, wsol_instr = create_wsol_account_instructions(key_pair, amount_in)
-        swap_instr = make_swap_instruction(amount_in, minimum_amount_out, wsol_token_account, token_account, pool_keys, key_pair)
         close_instr = close_account(CloseAccountParams(TOKEN_PROGRAM_ID, wsol_token_account, key_pair.pubkey(), key_pair.pubkey()))
+    swap_instr = make_swap_instruction(amount_in, minimum_amount_out, wsol_token_account, token_account, pool_keys, key_pair)
+
+    instructions = [*wsol_instr, swap_instr]
+    if close_instr:
+        instructions.append(close_instr)
+    if token_account_instr:
+        instructions.insert(len(wsol_instr), token_account_instr)
+        logger.debug("added token account instruction account=%s", token_account)
+    return instructions
+
+
+async def build_sell_instructions(client: AsyncClient, key_pair: Keypair, mint: Pubkey, pool_keys: dict,
+                                  percentage: int, slippage: int, wallet_state: WalletState | None = None,
+                                  quote: tuple[int, int] | None = None,
+                                  wsol_accounts: WsolAccounts | None = None) -> list[Instruction] | None:
+    if quote is not None:
+        amount_in, minimum_amount_out = quote
+    else:
+        if wallet_state is not None:
+            token_balance = wallet_state.token_amount
+        else:
+            token_balance = await get_raw_token_balance(client, key_pair, mint)
+        logger.debug("token balance amount=%d", token_balance)
+        amount_in, minimum_amount_out = token_balance * percentage // 100, 0
+        if amount_in:
+            sol_reserve, token_reserve, _ = await get_raw_reserve(client, pool_keys)
+            amount_in, minimum_amount_out = quote_swap(amount_in, token_reserve, sol_reserve, slippage, pool_keys)
+    if amount_in == 0:
+        logger.critical("no token balance to sell wallet=%s", key_pair.pubkey())
+        return None
 
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            *wsol_instr,
-            swap_instr,
-            close_instr
-        ]
-        if token_account_instr:
-            instructions.insert(4, token_account_instr)
-            logging.debug(f"Added token account instruction for: {token_account}")
+    token_account = ata_address(key_pair.pubkey(), mint)
+    if wsol_accounts is not None and key_pair.pubkey() in wsol_accounts:
+        wsol_token_account, wsol_instr = wsol_accounts.receive_instructions(key_pair)
+        swap_instr = make_swap_instruction(amount_in, minimum_amount_out, token_account,
+                                           wsol_token_account, pool_keys, key_pair)
+        instructions = [*wsol_instr, swap_instr]
+    else:
+        wsol_token_account, wsol_instr = create_wsol_account_instructions(key_pair,  0)
 
-        await compile_and_send_transaction(client, key_pair, instructions)
+        swap_instr =  make_swap_instruction(amount_in, minimum_amount_out, token_account,
+                                            wsol_token_account, pool_keys, key_pair)
+        create_instr, sync_instr, close_instr = wsol_instr
+        instructions = [create_instr, swap_instr, close_instr]
+    if percentage == 100:
+        close_token_instr = close_account(CloseAccountParams(
+            account=token_account,
+            dest=key_pair.pubkey(),
+            owner=key_pair.pubkey(),
+            program_id=TOKEN_PROGRAM_ID))
+        instructions.append(close_token_instr)
+        logger.debug("added close token account instruction account=%s", token_account)
+    return instructions
+
+
+async def buy(client: AsyncClient, key_pair: Keypair, token_address: str, sol_in: float, slippage: int,
+              blockhash_service: BlockhashService | None = None,
+              snapshot: WalletSnapshot | None = None,
+              quote: tuple[int, int] | None = None,
+              tracker: ConfirmationTracker | None = None,
+              wsol_accounts: WsolAccounts | None = None) -> Signature | None:
+    """Send a buy and return its signature, or None when it failed before reaching the RPC."""
+    try:
+        logger.info("starting buy token=%s wallet=%s", token_address, key_pair.pubkey())
+        mint, pool_keys = await _process_start_swap(client, token_address)
+        wallet_state = _snapshot_state(snapshot, key_pair, mint)
+        with metrics.stage("build"):
+            swap_instructions = await build_buy_instructions(client, key_pair, mint, pool_keys, sol_in, slippage,
+                                                             wallet_state, quote, wsol_accounts)
+        instructions = [*compute_budget_instructions(swap_instructions), *swap_instructions]
+
+        signature = await compile_and_send_transaction(client, key_pair, instructions, blockhash_service,
+                                                      tracker=tracker,
+                                                      lookup_tables=lookup_tables_for(pool_keys["amm_id"]))
+        if wallet_state is not None:
+            snapshot.mark_ata_created(key_pair.pubkey())
+        return signature
 
     except Exception as e:
-        logging.error(f"Error during buy transaction: {e}")
-        return False
+        logger.error("buy failed token=%s wallet=%s error=%s", token_address, key_pair.pubkey(), e)
+        return None
 
 
-async def sell(client: AsyncClient, key_pair: Keypair, token_address: str, percentage: int, slippage: int) -> bool:
+async def sell(client: AsyncClient, key_pair: Keypair, token_address: str, percentage: int, slippage: int,
+               blockhash_service: BlockhashService | None = None,
+               snapshot: WalletSnapshot | None = None,
+               quote: tuple[int, int] | None = None,
+               tracker: ConfirmationTracker | None = None,
+               wsol_accounts: WsolAccounts | None = None) -> Signature | None:
+    """Send a sell and return its signature, or None when it failed before reaching the RPC."""
     try:
-        logging.info(f"Starting sell transaction for token: {token_address}")
+        logger.info("starting sell token=%s wallet=%s percentage=%d", token_address, key_pair.pubkey(), percentage)
         mint, pool_keys = await _process_start_swap(client, token_address)
-        token_balance = await get_token_balance(client, key_pair, mint)
-        if token_balance == 0:
-            logging.critical("No token balance available to sell.")
-            return False
-        token_in = token_balance * percentage / 100
-        logging.debug(f"Token amount: {token_balance}")
-        base_reserve, quote_reserve, token_decimal = await get_reserve(client, pool_keys)
-
-        amount_in, minimum_amount_out = calculate_transaction_amounts(token_in, quote_reserve, base_reserve, slippage)
-
-        token_account = get_associated_token_address(key_pair.pubkey(), mint)
-        wsol_token_account, wsol_instr = create_wsol_account_instructions(key_pair,  0)
-
-        amount_in = int(amount_in * (10 ** token_decimal))
-        minimum_amount_out = int(minimum_amount_out * (10 ** 9))
-        swap_instr =  make_swap_instruction(amount_in, minimum_amount_out, token_account,
-                                            wsol_token_account, pool_keys, key_pair)
-        create_instr, sync_instr, close_instr = wsol_instr
-        instructions = [
-            set_compute_unit_limit(UNIT_BUDGET),
-            set_compute_unit_price(UNIT_PRICE),
-            create_instr,
-            swap_instr,
-            close_instr,
-        ]
-        if percentage == 100:
-            close_token_instr = close_account(CloseAccountParams(
-                account=token_account,
-                dest=key_pair.pubkey(),
-                owner=key_pair.pubkey(),
-                program_id=TOKEN_PROGRAM_ID))
-            instructions.append(close_token_instr)
-            logging.debug(f"Added close token account instruction for: {token_account}")
-
-        await compile_and_send_transaction(client, key_pair, instructions)
+        wallet_state = _snapshot_state(snapshot, key_pair, mint)
+        with metrics.stage("build"):
+            swap_instructions = await build_sell_instructions(client, key_pair, mint, pool_keys, percentage,
+                                                              slippage, wallet_state, quote, wsol_accounts)
+        if swap_instructions is None:
+            return None
+        instructions = [*compute_budget_instructions(swap_instructions), *swap_instructions]
 
+        signature = await compile_and_send_transaction(client, key_pair, instructions, blockhash_service,
+                                                      tracker=tracker,
+                                                      lookup_tables=lookup_tables_for(pool_keys["amm_id"]))
+        if wallet_state is not None and percentage == 100:
+            snapshot.mark_ata_closed(key_pair.pubkey())
+        return signature
 
     except Exception as e:
-        logging.error(f"Error during sell transaction: {e}")
-        return False
\ No newline at end of file
+        logger.error("sell failed token=%s wallet=%s error=%s", token_address, key_pair.pubkey(), e)
+        return None
@@ -0,0 +1,186 @@
+import asyncio
+import base64
+import itertools
+import json
+import logging
+import time
+
+import aiohttp
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Processed
+from solders.pubkey import Pubkey
+
+from constants import SOL
+from fast_layouts import decode_token_amount
+from settings import RESERVE_MAX_STALENESS, RESERVE_POLL_INTERVAL
+from solana_helpers import TOKEN_AMOUNT_SLICE
+
+logger = logging.getLogger(__name__)
+
+MAX_RECONNECT_DELAY = 10
+
+# amm_id -> running feed, consulted by get_raw_reserve before it goes to the RPC
+_feeds: dict[Pubkey, "ReserveFeed"] = {}
+
+
+def ws_url_from_http(url: str) -> str:
+    if url.startswith("https://"):
+        return "wss://" + url[len("https://"):]
+    if url.startswith("http://"):
+        return "ws://" + url[len("http://"):]
+    return url
+
+
+def active_feed(amm_id: Pubkey) -> "ReserveFeed | None":
+    feed = _feeds.get(amm_id)
+    if feed is None or not feed.is_fresh():
+        return None
+    return feed
+
+
+class ReserveFeed:
+    """Slot-stamped vault reserves for one pool, pushed over accountSubscribe with a polling fallback."""
+
+    def __init__(self, pool_keys: dict, ws_url: str, client: AsyncClient,
+                 poll_interval: float = RESERVE_POLL_INTERVAL, max_staleness: float = RESERVE_MAX_STALENESS):
+        self.pool_keys = pool_keys
+        self.ws_url = ws_url
+        self.client = client
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+        sol_is_base = pool_keys["base_mint"] == Pubkey.from_string(SOL)
+        self.sol_vault = pool_keys["base_vault"] if sol_is_base else pool_keys["quote_vault"]
+        self.token_vault = pool_keys["quote_vault"] if sol_is_base else pool_keys["base_vault"]
+        self.token_decimal = pool_keys["quote_decimals"] if sol_is_base else pool_keys["base_decimals"]
+        self.amounts = {self.sol_vault: 0, self.token_vault: 0}
+        self.slots = {self.sol_vault: -1, self.token_vault: -1}
+        self.updated_at = 0.0
+        self.connected = False
+        self.notifications = 0
+        self.polls = 0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def slot(self) -> int:
+        return min(self.slots.values())
+
+    def is_fresh(self) -> bool:
+        # Pushed state is fresh for as long as the socket is up; polled state only for max_staleness seconds.
+        if self.slot < 0:
+            return False
+        return self.connected or time.monotonic() - self.updated_at <= self.max_staleness
+
+    def reserves(self) -> tuple[int, int, int]:
+        return self.amounts[self.sol_vault], self.amounts[self.token_vault], self.token_decimal
+
+    def _update(self, vault: Pubkey, slot: int, amount: int):
+        if slot < self.slots[vault]:
+            return
+        self.slots[vault] = slot
+        self.amounts[vault] = amount
+        self.updated_at = time.monotonic()
+
+    async def poll(self):
+        vaults = [self.sol_vault, self.token_vault]
+        response = await self.client.get_multiple_accounts(vaults, Processed, data_slice=TOKEN_AMOUNT_SLICE)
+        slot = response.context.slot
+        for vault, account in zip(vaults, response.value):
+            if account is not None:
+                self._update(vault, slot, decode_token_amount(bytes(account.data)))
+        self.polls += 1
+
+    async def start(self):
+        await self.poll()
+        _feeds[self.pool_keys["amm_id"]] = self
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if _feeds.get(self.pool_keys["amm_id"]) is self:
+            del _feeds[self.pool_keys["amm_id"]]
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    async def _poll_until(self, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.debug("reserve poll failed error=%s", e)
+            try:
+                await asyncio.wait_for(stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        delay = 0.5
+        async with aiohttp.ClientSession() as session:
+            while True:
+                connected = asyncio.Event()
+                # Poll while the socket is down; the poller stops as soon as both subscriptions are confirmed.
+                poller = asyncio.create_task(self._poll_until(connected))
+                try:
+                    await self._listen(session, connected)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning("Reserve feed connection lost: %s", e)
+                finally:
+                    was_connected = self.connected
+                    self.connected = False
+                    connected.set()
+                    await asyncio.gather(poller, return_exceptions=True)
+                delay = 0.5 if was_connected else min(delay * 2, MAX_RECONNECT_DELAY)
+                await asyncio.sleep(delay)
+
+    async def _listen(self, session: aiohttp.ClientSession, connected: asyncio.Event):
+        async with session.ws_connect(self.ws_url, heartbeat=30) as ws:
+            request_ids = itertools.count(1)
+            pending = {}
+            for vault in (self.sol_vault, self.token_vault):
+                request_id = next(request_ids)
+                pending[request_id] = vault
+                await ws.send_json({
+                    "jsonrpc": "2.0",
+                    "id": request_id,
+                    "method": "accountSubscribe",
+                    "params": [str(vault), {"encoding": "base64", "commitment": "processed"}],
+                })
+            subscriptions = {}
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                payload = json.loads(message.data)
+                if "id" in payload and payload["id"] in pending:
+                    if "error" in payload:
+                        raise RuntimeError(f"accountSubscribe failed: {payload['error']}")
+                    subscriptions[payload["result"]] = pending.pop(payload["id"])
+                    if not pending:
+                        # Catch up on anything that changed between the last poll and the subscription.
+                        try:
+                            await self.poll()
+                        except Exception as e:
+                            logger.debug("reserve poll failed error=%s", e)
+                        self.connected = True
+                        connected.set()
+                        logger.info("Reserve feed subscribed to %s and %s", self.sol_vault, self.token_vault)
+                elif payload.get("method") == "accountNotification":
+                    params = payload["params"]
+                    vault = subscriptions.get(params["subscription"])
+                    if vault is None:
+                        continue
+                    result = params["result"]
+                    if result["value"] is None:
+                        continue
+                    data = base64.b64decode(result["value"]["data"][0])
+                    self._update(vault, result["context"]["slot"], decode_token_amount(data))
+                    self.notifications += 1
@@ -0,0 +1,158 @@
+import asyncio
+import itertools
+import json
+import logging
+
+from solana.rpc.providers.async_http import AsyncHTTPProvider
+from solders.rpc.requests import Body
+
+import metrics
+from rate_limit import TokenBucket, is_backpressure_error
+from settings import RPC_BATCH_SIZE, RPC_BATCH_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Calls that must reach the endpoint once per caller even when identical: a rebroadcast of the same transaction
+# is a deliberate second send.
+UNCOALESCED_METHODS = frozenset({"sendTransaction", "requestAirdrop"})
+
+
+class BatchingProvider(AsyncHTTPProvider):
+    """AsyncHTTPProvider that shares identical in-flight calls and packs concurrent ones into JSON-RPC batches."""
+
+    def __init__(self, endpoint: str, window: float = RPC_BATCH_WINDOW, max_batch: int = RPC_BATCH_SIZE,
+                 bucket: TokenBucket | None = None, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        # Spent once per request that actually goes upstream, so coalesced callers cost nothing.
+        self.bucket = bucket
+        self.label = metrics.endpoint_label(str(endpoint))
+        self.calls = 0
+        self.coalesced = 0
+        self.posts = 0
+        self._ids = itertools.count(1)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._queue: list[tuple[dict, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def make_request_unparsed(self, body: Body) -> str:
+        return await self.request(json.loads(body.to_json()))
+
+    async def request(self, payload: dict) -> str:
+        """Send one JSON-RPC request and return the raw text of its response object."""
+        self.calls += 1
+        method = payload["method"]
+        key = None
+        if method not in UNCOALESCED_METHODS:
+            key = method + json.dumps(payload.get("params"), separators=(",", ":"))
+            shared = self._in_flight.get(key)
+            if shared is not None:
+                self.coalesced += 1
+                metrics.inc("rpc_coalesced_total", (method,))
+                return await asyncio.shield(shared)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda done: self._settle(key, done))
+        if key is not None:
+            self._in_flight[key] = future
+        # solders numbers every request 0, so the batch needs ids of its own to route responses back.
+        self._queue.append(({**payload, "id": next(self._ids)}, future))
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush)
+        # Shielded: a cancelled caller (e.g. the losing side of a hedged read) must not fail the others sharing it.
+        return await asyncio.shield(future)
+
+    def _settle(self, key: str | None, future: asyncio.Future):
+        if key is not None and self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        if not future.cancelled():
+            # Marks the exception retrieved when every caller sharing it has been cancelled.
+            future.exception()
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            task = asyncio.create_task(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _post(self, content: str) -> str:
+        self.posts += 1
+        metrics.inc("rpc_posts_total", (self.label,))
+        response = await self.session.post(**self._build_common_request_kwargs(), content=content)
+        response.raise_for_status()
+        return response.text
+
+    async def _send(self, batch: list[tuple[dict, asyncio.Future]], retry: bool = True):
+        # Runs as a background task, so whatever goes wrong has to reach the callers waiting on the batch (and the
+        # ones coalesced onto them) instead of leaving them waiting forever.
+        try:
+            await self._exchange(batch, retry)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        for payload, future in batch:
+            if not future.done():
+                future.set_exception(RuntimeError(f"No response to {payload['method']} in the batch"))
+
+    async def _exchange(self, batch: list[tuple[dict, asyncio.Future]], retry: bool):
+        try:
+            if self.bucket is not None:
+                for _ in batch:
+                    await self.bucket.acquire()
+            if len(batch) == 1:
+                raw = await self._post(json.dumps(batch[0][0]))
+            else:
+                raw = await self._post(json.dumps([payload for payload, _ in batch]))
+        except Exception as e:
+            if is_backpressure_error(e):
+                if self.bucket is not None:
+                    self.bucket.on_backpressure()
+                if retry:
+                    # One 429 would otherwise fail every call in the batch; the drained bucket paces the retry.
+                    await self._send(batch, retry=False)
+                    return
+            raise
+        if self.bucket is not None:
+            self.bucket.on_success()
+        if len(batch) == 1:
+            future = batch[0][1]
+            if not future.done():
+                future.set_result(raw)
+            return
+
+        responses = json.loads(raw)
+        if not isinstance(responses, list):
+            # The endpoint rejected the batch as a whole; fall back to one request per call from now on.
+            logger.warning("%s does not accept JSON-RPC batches, sending calls one by one: %s", self.label, raw[:200])
+            self.max_batch = 1
+            await asyncio.gather(*(self._send([entry]) for entry in batch))
+            return
+        by_id = {response["id"]: response for response in responses
+                 if isinstance(response, dict) and "id" in response}
+        for payload, future in batch:
+            response = by_id.get(payload["id"])
+            if response is not None and not future.done():
+                future.set_result(json.dumps(response))
+
+    async def close(self):
+        self._flush()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().close()
+
+    def describe(self) -> str:
+        return (f"{self.calls} call(s) in {self.posts} HTTP request(s), {self.coalesced} coalesced, "
+                f"batches of up to {self.max_batch}")
@@ -0,0 +1,37 @@
+import json
+from typing import Sequence
+
+from solana.rpc.async_api import AsyncClient
+from solders.pubkey import Pubkey
+
+from rpc_batch import BatchingProvider
+from settings import RPC_BATCHING
+
+
+class SolanaClient(AsyncClient):
+    """AsyncClient plus the RPC methods solana-py does not wrap."""
+
+    def __init__(self, endpoint: str, batching: bool = RPC_BATCHING, **kwargs):
+        super().__init__(endpoint, **kwargs)
+        self.batcher: BatchingProvider | None = None
+        if batching:
+            self.batcher = self._provider = BatchingProvider(endpoint, timeout=kwargs.get("timeout", 10),
+                                                             extra_headers=kwargs.get("extra_headers"))
+
+    async def _raw_request(self, method: str, params: list):
+        provider = self._provider
+        body = {"jsonrpc": "2.0", "id": next(provider._request_counter) + 1, "method": method, "params": params}
+        if self.batcher is not None:
+            payload = json.loads(await self.batcher.request(body))
+        else:
+            response = await provider.session.post(**provider._build_common_request_kwargs(),
+                                                   content=json.dumps(body))
+            response.raise_for_status()
+            payload = response.json()
+        if "error" in payload:
+            raise RuntimeError(f"{method} failed: {payload['error']}")
+        return payload["result"]
+
+    async def get_recent_prioritization_fees(self, accounts: Sequence[Pubkey] = ()) -> list[tuple[int, int]]:
+        result = await self._raw_request("getRecentPrioritizationFees", [[str(account) for account in accounts]])
+        return [(entry["slot"], entry["prioritizationFee"]) for entry in result]
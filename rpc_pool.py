@@ -0,0 +1,195 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from collections import deque
+
+from solana.rpc.commitment import Processed
+
+import metrics
+from rate_limit import RateLimitedClient, TokenBucket
+from rpc_client import SolanaClient
+from settings import RPC_HEALTH_INTERVAL, RPC_HEDGE
+
+logger = logging.getLogger(__name__)
+
+# Latency-critical reads that may be raced against a second endpoint
+HEDGED_METHODS = frozenset({
+    "get_account_info",
+    "get_multiple_accounts",
+    "get_multiple_accounts_json_parsed",
+    "get_latest_blockhash",
+})
+
+LATENCY_WINDOW = 200
+EWMA_ALPHA = 0.2
+# Seconds of extra score at a 100% error rate, added so it applies even before an endpoint has answered once
+ERROR_PENALTY = 5.0
+# Latency a failed call counts as when it failed faster than this, e.g. on a refused connection
+FAILURE_LATENCY = 1.0
+# Seconds of extra score per slot an endpoint lags behind the best one (roughly one slot time)
+SLOT_LAG_PENALTY = 0.4
+MIN_HEDGE_DELAY = 0.01
+
+
+class EndpointHealth:
+    def __init__(self, url: str):
+        self.url = url
+        self.label = metrics.endpoint_label(url)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.latency_ewma = 0.0
+        self.error_rate = 0.0
+        self.slot = 0
+        self.slot_lag = 0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def record(self, latency: float, ok: bool):
+        self.requests += 1
+        if ok:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+            latency = max(latency, FAILURE_LATENCY)
+        self.latency_ewma = latency if not self.latency_ewma else \
+            (1 - EWMA_ALPHA) * self.latency_ewma + EWMA_ALPHA * latency
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+
+    def p95(self) -> float:
+        if not self.latencies:
+            return self.latency_ewma
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @property
+    def score(self) -> float:
+        # Lower is better. In-flight requests count as a small load penalty so ties spread across endpoints.
+        return (self.latency_ewma + ERROR_PENALTY * self.error_rate
+                + self.slot_lag * SLOT_LAG_PENALTY
+                + self.in_flight * self.latency_ewma * 0.01)
+
+
+class RpcPool:
+    """Drop-in replacement for AsyncClient that routes each call to the healthiest of several endpoints."""
+
+    def __init__(self, endpoints: list[str], hedge: bool = RPC_HEDGE, health_interval: float = RPC_HEALTH_INTERVAL):
+        if not endpoints:
+            raise ValueError("RpcPool needs at least one endpoint")
+        # One AsyncClient per endpoint keeps its own persistent httpx connection pool and rate limiter.
+        self.clients = [RateLimitedClient(SolanaClient(url), TokenBucket()) for url in endpoints]
+        self.health = [EndpointHealth(url) for url in endpoints]
+        self.hedge = hedge and len(endpoints) > 1
+        self.health_interval = health_interval
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._health_task: asyncio.Task | None = None
+
+    @property
+    def throttled(self) -> int:
+        return sum(client.bucket.throttled for client in self.clients)
+
+    def _ranked(self) -> list[int]:
+        return sorted(range(len(self.clients)), key=lambda i: self.health[i].score)
+
+    async def _call(self, index: int, name: str, args, kwargs):
+        health = self.health[index]
+        health.in_flight += 1
+        metrics.inc("rpc_in_flight", (health.label,))
+        metrics.inc("rpc_requests_total", (name, health.label))
+        started = time.monotonic()
+        try:
+            result = await getattr(self.clients[index], name)(*args, **kwargs)
+        except Exception:
+            health.record(time.monotonic() - started, False)
+            metrics.inc("rpc_errors_total", (name, health.label))
+            raise
+        finally:
+            health.in_flight -= 1
+            metrics.inc("rpc_in_flight", (health.label,), -1)
+        health.record(time.monotonic() - started, True)
+        return result
+
+    async def _hedged_call(self, primary: int, secondary: int, name: str, args, kwargs):
+        delay = max(MIN_HEDGE_DELAY, self.health[primary].p95())
+        first = asyncio.ensure_future(self._call(primary, name, args, kwargs))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done and not first.exception():
+            return first.result()
+
+        self.hedged += 1
+        second = asyncio.ensure_future(self._call(secondary, name, args, kwargs))
+        pending = {first, second} - done
+        error = first.exception() if done else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is second:
+                        self.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def __getattr__(self, name):
+        attr = getattr(self.clients[0].client, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def routed(*args, **kwargs):
+            ranked = self._ranked()
+            if self.hedge and name in HEDGED_METHODS:
+                return await self._hedged_call(ranked[0], ranked[1], name, args, kwargs)
+            return await self._call(ranked[0], name, args, kwargs)
+
+        setattr(self, name, routed)
+        return routed
+
+    async def refresh_health(self):
+        async def probe(index: int):
+            try:
+                return (await self._call(index, "get_slot", (Processed,), {})).value
+            except Exception as e:
+                logger.debug("Health probe of %s failed: %s", self.health[index].url, e)
+                return None
+
+        slots = await asyncio.gather(*(probe(i) for i in range(len(self.clients))))
+        best = max((slot for slot in slots if slot is not None), default=0)
+        for health, slot in zip(self.health, slots):
+            if slot is not None:
+                health.slot = slot
+                health.slot_lag = best - slot
+
+    async def _run_health(self):
+        while True:
+            await self.refresh_health()
+            await asyncio.sleep(self.health_interval)
+
+    async def start(self):
+        if self._health_task is None:
+            await self.refresh_health()
+            self._health_task = asyncio.create_task(self._run_health())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        await asyncio.gather(*(client.close() for client in self.clients))
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def describe(self) -> str:
+        return ", ".join(f"{h.url}: score={h.score * 1000:.0f}ms p95={h.p95() * 1000:.0f}ms "
+                         f"errors={h.error_rate:.0%} lag={h.slot_lag}"
+                         + (f" ({client.client.batcher.describe()})" if client.client.batcher else "")
+                         for h, client in zip(self.health, self.clients))
@@ -0,0 +1,500 @@
+import asyncio
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from solana.rpc.async_api import AsyncClient
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+
+from blockhash import BlockhashService
+from bundler import Bundle, SwapGroup, pack_groups, send_packed
+from confirmation import ConfirmationResult, ConfirmationTracker
+from constants import WSOL
+from derivations import seed_derivations, warm_derivations
+from fee_engine import FeeEngine, estimate_units
+from lookup_tables import LookupTableManager, lookup_tables_for
+import metrics
+from quote import plan_wave
+from raydium_amm import _process_start_swap, _snapshot_state, build_buy_instructions, build_sell_instructions, buy, \
+    get_raw_reserve, sell
+from reserve_feed import ReserveFeed
+from settings import ADAPTIVE_COMPUTE_BUDGET, BUNDLE_SWAPS, CYCLES, DELAY_BETWEEN_ROUNDS, PERSISTENT_WSOL, \
+    SELL_PERCENTAGE_MAX, SELL_PERCENTAGE_MIN, SELL_PROBABILITY, SLIPPAGE, SOL_IN, STATE_MAX_AGE, THREADS, \
+    WSOL_SWEEP_CYCLES
+from state_store import WalletStateStore
+from swap_template import swap_amounts, swap_index, swap_template, with_minimum_amount_out
+from wallet_snapshot import WalletSnapshot
+from wsol_accounts import WsolAccounts
+
+logger = logging.getLogger(__name__)
+
+# Lower value runs first: pending sells are drained before new buys are started.
+SELL_PRIORITY = 0
+BUY_PRIORITY = 1
+
+
+@dataclass(order=True)
+class TradeJob:
+    priority: int
+    seq: int
+    kind: str = field(compare=False)
+    key_pair: Keypair = field(compare=False)
+    percentage: int = field(default=0, compare=False)
+    # (amount_in, minimum_amount_out) planned for this job's place in its wave
+    quote: tuple[int, int] | None = field(default=None, compare=False)
+
+
+@dataclass
+class SchedulerStats:
+    # Trades that landed (or were sent, without a confirmation tracker) and those that never did
+    buys: int = 0
+    sells: int = 0
+    failed: int = 0
+    in_flight: int = 0
+    # Trades sent so far, and those of them still awaiting their confirmation
+    sent: int = 0
+    unconfirmed: int = 0
+
+    @property
+    def trades(self) -> int:
+        return self.buys + self.sells
+
+
+class FairDispatcher:
+    """Worker pool shared by several schedulers, taking one job from each of their queues in turn."""
+
+    def __init__(self, threads: int = THREADS):
+        self.threads = threads
+        self._lanes: list["TradeScheduler"] = []
+        self._cursor = 0
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    def attach(self, scheduler: "TradeScheduler"):
+        self._lanes.append(scheduler)
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.threads)]
+
+    async def detach(self, scheduler: "TradeScheduler"):
+        self._lanes.remove(scheduler)
+        if not self._lanes:
+            workers, self._workers = self._workers, []
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _next_job(self) -> tuple["TradeScheduler", TradeJob] | None:
+        # Round-robin over the lanes so a campaign with a long queue cannot starve the others of workers or of
+        # the shared RPC rate limit; each lane still runs its own sells before its buys.
+        for _ in range(len(self._lanes)):
+            self._cursor = (self._cursor + 1) % len(self._lanes)
+            lane = self._lanes[self._cursor]
+            if not lane._queue.empty():
+                return lane, lane._queue.get_nowait()
+        return None
+
+    async def _worker(self):
+        while True:
+            entry = self._next_job()
+            if entry is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            lane, job = entry
+            await lane._execute(job)
+
+
+class TradeScheduler:
+    """Runs buy/sell cycles for many wallets on a bounded worker pool."""
+
+    def __init__(self, client: AsyncClient, key_pairs: list[Keypair], token_address: str,
+                 sol_in: float = SOL_IN, slippage: int = SLIPPAGE, cycles: int | None = CYCLES,
+                 delay: float = DELAY_BETWEEN_ROUNDS, threads: int = THREADS,
+                 sell_probability: float = SELL_PROBABILITY,
+                 sell_percentage_range: tuple[int, int] = (SELL_PERCENTAGE_MIN, SELL_PERCENTAGE_MAX),
+                 blockhash_service: BlockhashService | None = None, use_snapshot: bool = True,
+                 tracker: ConfirmationTracker | None = None, reserve_ws_url: str | None = None,
+                 lookup_table_manager: LookupTableManager | None = None, bundle: bool = BUNDLE_SWAPS,
+                 persistent_wsol: bool = PERSISTENT_WSOL, wsol_sweep_cycles: int = WSOL_SWEEP_CYCLES,
+                 adaptive_compute_budget: bool = ADAPTIVE_COMPUTE_BUDGET, store: WalletStateStore | None = None,
+                 state_max_age: float = STATE_MAX_AGE, budget: float | None = None, name: str | None = None,
+                 dispatcher: FairDispatcher | None = None, fee_engine: FeeEngine | None = None):
+        self.client = client
+        self.key_pairs = key_pairs
+        self.token_address = token_address
+        self.sol_in = sol_in
+        self.slippage = slippage
+        self.cycles = cycles
+        self.delay = delay
+        self.threads = threads
+        self.sell_probability = sell_probability
+        self.sell_percentage_range = sell_percentage_range
+        self.blockhash_service = blockhash_service
+        self.use_snapshot = use_snapshot
+        self.tracker = tracker
+        self.reserve_ws_url = reserve_ws_url
+        self.lookup_table_manager = lookup_table_manager
+        self.bundle = bundle
+        self.persistent_wsol = persistent_wsol
+        self.wsol_sweep_cycles = wsol_sweep_cycles
+        self.adaptive_compute_budget = adaptive_compute_budget
+        self.fee_engine = fee_engine
+        self._owns_fee_engine = False
+        self.store = store
+        self.state_max_age = state_max_age
+        self._resume_owners: set | None = None
+        self.budget = budget
+        self.name = name
+        # Prepended to log lines so interleaved campaigns can be told apart.
+        self._prefix = f"{name}: " if name else ""
+        self.dispatcher = dispatcher
+        self.mint = None
+        self.pool_keys: dict | None = None
+        self.stats = SchedulerStats()
+        self.snapshot: WalletSnapshot | None = None
+        self.wsol_accounts: WsolAccounts | None = None
+        self._wsol_outcomes: set[asyncio.Future] = set()
+        self._queue: asyncio.PriorityQueue[TradeJob] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._deferred_sells: list[TradeJob] = []
+        self._buys_sent = 0
+        # Swap groups built by the workers for the current bundled wave
+        self._groups: list[SwapGroup] = []
+
+    def _submit(self, job: TradeJob):
+        self._queue.put_nowait(job)
+        if self.dispatcher is not None:
+            self.dispatcher.notify()
+
+    def _enqueue(self, priority: int, kind: str, key_pair: Keypair, percentage: int = 0):
+        self._submit(TradeJob(priority, next(self._seq), kind, key_pair, percentage))
+
+    def _buys_left(self) -> int:
+        if self.budget is None:
+            return len(self.key_pairs)
+        sol_in = int(self.sol_in * 10 ** 9)
+        # Buys count against the budget once sent, so unconfirmed ones cannot be spent twice.
+        remaining = int(self.budget * 10 ** 9) - self._buys_sent * sol_in
+        return max(0, min(len(self.key_pairs), remaining // sol_in if sol_in else len(self.key_pairs)))
+
+    async def _run_job(self, job: TradeJob) -> Signature | None:
+        if job.kind == "buy":
+            return await buy(self.client, job.key_pair, self.token_address, self.sol_in, self.slippage,
+                             self.blockhash_service, self.snapshot, job.quote, tracker=self.tracker,
+                             wsol_accounts=self.wsol_accounts)
+        return await sell(self.client, job.key_pair, self.token_address, job.percentage, self.slippage,
+                          self.blockhash_service, self.snapshot, job.quote, tracker=self.tracker,
+                          wsol_accounts=self.wsol_accounts)
+
+    def _record(self, job: TradeJob, signature: Signature | None):
+        if signature is not None:
+            self.stats.sent += 1
+            if job.kind == "buy":
+                self._buys_sent += 1
+                if random.random() < self.sell_probability:
+                    percentage = random.randint(*self.sell_percentage_range)
+                    # The sell needs the bought tokens on-chain, so it runs at the start of the next
+                    # cycle against a refreshed snapshot instead of racing the unconfirmed buy.
+                    self._deferred_sells.append(
+                        TradeJob(SELL_PRIORITY, next(self._seq), "sell", job.key_pair, percentage))
+        outcome = self.tracker.outcome(signature) if signature is not None and self.tracker is not None else None
+        if outcome is None:
+            self._finish(job, "error" if signature is None else "sent")
+            return
+        # The trade counts once the tracker knows whether it landed, without holding a worker until then.
+        self.stats.unconfirmed += 1
+        outcome.add_done_callback(lambda future: self._settle(job, future))
+        if self.wsol_accounts is not None:
+            # Swaps spending from this campaign's wSOL accounts, which a sweep waits for before closing them.
+            self._wsol_outcomes.add(outcome)
+            outcome.add_done_callback(self._wsol_outcomes.discard)
+
+    def _settle(self, job: TradeJob, future: "asyncio.Future[ConfirmationResult]"):
+        self.stats.unconfirmed -= 1
+        if not future.cancelled():
+            self._finish(job, future.result().status.value)
+
+    def _finish(self, job: TradeJob, result: str):
+        metrics.inc("trades_total", (job.kind, result))
+        if result not in ("sent", "landed"):
+            self.stats.failed += 1
+        elif job.kind == "buy":
+            self.stats.buys += 1
+        else:
+            self.stats.sells += 1
+
+    async def _execute(self, job: TradeJob):
+        self.stats.in_flight += 1
+        metrics.inc("trades_in_flight")
+        try:
+            if self.bundle:
+                await self._build_group(job)
+            else:
+                self._record(job, await self._run_job(job))
+        except Exception as e:
+            self._record(job, None)
+            logger.error("unhandled error kind=%s wallet=%s error=%s", job.kind, job.key_pair.pubkey(), e)
+        finally:
+            self.stats.in_flight -= 1
+            metrics.inc("trades_in_flight", value=-1)
+            self._queue.task_done()
+
+    async def _worker(self):
+        while True:
+            await self._execute(await self._queue.get())
+
+    async def _build_group(self, job: TradeJob):
+        wallet_state = _snapshot_state(self.snapshot, job.key_pair, self.mint)
+        try:
+            with metrics.stage("build"):
+                instructions = await self._build_instructions(job, wallet_state)
+        except Exception as e:
+            logger.error("build failed kind=%s wallet=%s error=%s", job.kind, job.key_pair.pubkey(), e)
+            instructions = None
+        if instructions is None:
+            self._record(job, None)
+            return
+        self._groups.append(SwapGroup(job.key_pair, instructions, units=estimate_units(instructions), tag=job))
+
+    async def _build_instructions(self, job: TradeJob, wallet_state) -> list | None:
+        if job.kind == "buy":
+            return await build_buy_instructions(self.client, job.key_pair, self.mint, self.pool_keys, self.sol_in,
+                                                self.slippage, wallet_state, job.quote, self.wsol_accounts)
+        return await build_sell_instructions(self.client, job.key_pair, self.mint, self.pool_keys, job.percentage,
+                                             self.slippage, wallet_state, job.quote, self.wsol_accounts)
+
+    async def _plan_wave(self, jobs: list[TradeJob]) -> tuple[int, int] | None:
+        # One reserve read prices the whole wave: each job's limit allows for the impact of the rest of the wave
+        # landing first, instead of every job fetching the same reserves and ignoring the others' impact.
+        # Sell amounts come from the snapshot; without one, jobs keep quoting themselves.
+        if self.snapshot is None or not jobs:
+            return
+        try:
+            sol_reserve, token_reserve, _ = await get_raw_reserve(self.client, self.pool_keys)
+        except Exception as e:
+            logger.warning("Reserve read failed, trades will quote themselves: %s", e)
+            return
+        sol_in = int(self.sol_in * 10 ** 9)
+        amounts = []
+        for job in jobs:
+            if job.kind == "buy":
+                amounts.append(sol_in)
+            else:
+                wallet_state = _snapshot_state(self.snapshot, job.key_pair, self.mint)
+                amounts.append(wallet_state.token_amount * job.percentage // 100 if wallet_state else 0)
+        with metrics.stage("quote"):
+            plan = plan_wave(sol_reserve, token_reserve, [job.kind == "buy" for job in jobs], amounts, self.slippage,
+                             self.pool_keys["trade_fee_numerator"], self.pool_keys["trade_fee_denominator"])
+        for i, job in enumerate(jobs):
+            job.quote = plan.quote(i)
+        return sol_reserve, token_reserve
+
+    def _reprice(self, bundles: list[Bundle], reserves: tuple[int, int]):
+        # A bundle lands or fails as a whole, so one swap missing its limit sinks the others. The swaps as built
+        # are repriced together, with limits that hold whichever order the bundles land in.
+        groups = [group for bundle in bundles for group in bundle.groups]
+        swaps = [swap_index(group.instructions) for group in groups]
+        amounts = [swap_amounts(group.instructions[i])[0] for group, i in zip(groups, swaps)]
+        with metrics.stage("quote"):
+            plan = plan_wave(*reserves, [group.tag.kind == "buy" for group in groups], amounts, self.slippage,
+                             self.pool_keys["trade_fee_numerator"], self.pool_keys["trade_fee_denominator"])
+        for n, (group, i) in enumerate(zip(groups, swaps)):
+            group.instructions[i] = with_minimum_amount_out(group.instructions[i], int(plan.min_amount_out[n]))
+
+    async def _run_bundled(self, jobs: list[TradeJob], reserves: tuple[int, int] | None = None):
+        # The swaps are built on the worker pool (shared with the other campaigns when there is a dispatcher),
+        # then packed and sent together.
+        self._groups = []
+        for job in jobs:
+            self._submit(job)
+        await self._queue.join()
+        groups, self._groups = self._groups, []
+        if not groups:
+            return
+        lookup_tables = lookup_tables_for(self.pool_keys["amm_id"])
+        bundles = pack_groups(groups, lookup_tables)
+        if reserves is not None:
+            self._reprice(bundles, reserves)
+        sent = await send_packed(self.client, bundles, self.blockhash_service, tracker=self.tracker,
+                                 lookup_tables=lookup_tables)
+        for bundle, signature in sent:
+            for group in bundle.groups:
+                job = group.tag
+                if signature is not None and self.snapshot is not None:
+                    if job.kind == "buy":
+                        self.snapshot.mark_ata_created(job.key_pair.pubkey())
+                    elif job.percentage == 100:
+                        self.snapshot.mark_ata_closed(job.key_pair.pubkey())
+                self._record(job, signature)
+
+    async def _run_cycle(self, label: str, buys: bool = True):
+        started = time.monotonic()
+        sent_before = self.stats.sent
+        refreshes = []
+        if self.snapshot is not None:
+            refreshes.append(self.snapshot.refresh(self.client, owners=self._resume_owners))
+            self._resume_owners = None
+        if self.wsol_accounts is not None:
+            refreshes.append(self.wsol_accounts.refresh(self.client))
+        try:
+            await asyncio.gather(*refreshes)
+        except Exception as e:
+            logger.warning("Wallet refresh failed, trading on the previous snapshot: %s", e)
+        buyers = self.key_pairs[:self._buys_left()] if buys else []
+        # Sells first, then buys: the order the queue hands them out in.
+        jobs = sorted(self._deferred_sells)
+        self._deferred_sells = []
+        jobs += [TradeJob(BUY_PRIORITY, next(self._seq), "buy", key_pair) for key_pair in buyers]
+        reserves = await self._plan_wave(jobs)
+        if self.bundle:
+            await self._run_bundled(jobs, reserves)
+        else:
+            for job in jobs:
+                self._submit(job)
+            await self._queue.join()
+
+        elapsed = time.monotonic() - started
+        sent = self.stats.sent - sent_before
+        logger.info("%s%s finished: %s trade(s) sent in %.1fs (%.1f/s), %s failed so far", self._prefix, label, sent,
+                    elapsed, sent / elapsed if elapsed else 0, self.stats.failed)
+        if self.tracker is not None:
+            counts = ", ".join(f"{count} {status.value}" for status, count in self.tracker.counts.items())
+            logger.info("Confirmations: %s, %s pending, %s rebroadcast(s)", counts, self.tracker.pending,
+                        self.tracker.rebroadcasts)
+        if self.fee_engine is not None:
+            logger.info("Compute budget: %s", self.fee_engine.describe())
+
+    async def _sweep_wsol(self, keep: Iterable[Pubkey] = ()):
+        # Closing a wSOL account under an unconfirmed swap would unwrap the SOL it is about to spend. Only this
+        # campaign's swaps touch its accounts, so other campaigns' transactions on the shared tracker don't count.
+        if self._wsol_outcomes:
+            _, pending = await asyncio.wait(set(self._wsol_outcomes), timeout=self.tracker.drain_timeout)
+            if pending:
+                logger.warning("%s%s swap(s) still unconfirmed, skipping the wSOL sweep", self._prefix, len(pending))
+                return
+        try:
+            await self.wsol_accounts.sweep(self.client, self.blockhash_service, self.tracker, keep,
+                                           int(self.sol_in * 10 ** 9))
+        except Exception as e:
+            logger.error("wSOL sweep failed: %s", e)
+
+    def _resume_campaign(self) -> int:
+        cycle, sells = self.store.load_campaign(self.token_address)
+        key_pairs = {key_pair.pubkey(): key_pair for key_pair in self.key_pairs}
+        self._deferred_sells = [TradeJob(SELL_PRIORITY, next(self._seq), "sell", key_pairs[owner], percentage)
+                                for owner, percentage in sells if owner in key_pairs]
+        if cycle:
+            logger.info("Resuming campaign for %s after cycle %s with %s deferred sell(s)", self.token_address, cycle,
+                        len(self._deferred_sells))
+        return cycle
+
+    def _save_progress(self, cycle: int):
+        if self.store is not None:
+            self.store.save_campaign(self.token_address, cycle,
+                                     [(job.key_pair.pubkey(), job.percentage) for job in self._deferred_sells])
+
+    async def run(self):
+        start = await _process_start_swap(self.client, self.token_address)
+        if not start:
+            logger.critical("Could not resolve a pool for %s", self.token_address)
+            return self.stats
+        mint, pool_keys = start
+        self.mint, self.pool_keys = mint, pool_keys
+        rows = []
+        start_cycle = 0
+        if self.store is not None:
+            rows = self.store.load_wallets(mint)
+            seed_derivations(itertools.chain(((owner, mint, ata) for owner, ata, *_ in rows),
+                                             ((owner, WSOL, wsol_ata) for owner, _, wsol_ata, *_ in rows)))
+            start_cycle = self._resume_campaign()
+        warm_derivations([key_pair.pubkey() for key_pair in self.key_pairs], [mint])
+        if self.use_snapshot:
+            self.snapshot = WalletSnapshot.for_key_pairs(mint, self.key_pairs)
+            if self.store is not None and self.snapshot.restore(self.store, rows) and \
+                    time.monotonic() - self.snapshot.refreshed_at < self.state_max_age:
+                # Only wallets that may have changed since the state was written are read again.
+                self._resume_owners = {job.key_pair.pubkey() for job in self._deferred_sells}
+                if self.tracker is not None:
+                    self._resume_owners |= self.tracker.pending_signers()
+                logger.info("Restored %s wallet(s) from %s, rescanning %s", len(rows), self.store.path,
+                            len(self._resume_owners))
+        if self.persistent_wsol:
+            self.wsol_accounts = WsolAccounts(self.key_pairs)
+            try:
+                await self.wsol_accounts.top_up(self.client, int(self.sol_in * 10 ** 9), self.blockhash_service,
+                                                self.tracker)
+            except Exception as e:
+                logger.error("Bulk wSOL top-up failed, buys will fund their accounts inline: %s", e)
+        if self.lookup_table_manager is not None:
+            try:
+                await self.lookup_table_manager.ensure(pool_keys)
+            except Exception as e:
+                logger.error("Lookup table unavailable, compiling without it: %s", e)
+        if self.adaptive_compute_budget:
+            writable = [meta.pubkey for meta in swap_template(pool_keys).fixed_accounts if meta.is_writable]
+            if self.fee_engine is None:
+                self.fee_engine = FeeEngine(self.client, writable)
+                self._owns_fee_engine = True
+                await self.fee_engine.start()
+            else:
+                self.fee_engine.watch(writable)
+        reserve_feed = None
+        if self.reserve_ws_url:
+            reserve_feed = ReserveFeed(pool_keys, self.reserve_ws_url, self.client)
+            await reserve_feed.start()
+
+        workers = []
+        if self.dispatcher is not None:
+            self.dispatcher.attach(self)
+        else:
+            workers = [asyncio.create_task(self._worker()) for _ in range(self.threads)]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        try:
+            for cycle in itertools.count(start_cycle + 1):
+                if self.cycles and cycle > self.cycles:
+                    break
+                if self.budget is not None and not self._buys_left():
+                    logger.info("%sBudget of %s SOL spent after cycle %s", self._prefix, self.budget, cycle - 1)
+                    break
+                await self._run_cycle(f"Cycle {cycle}")
+                self._save_progress(cycle)
+                if self.wsol_accounts is not None and self.wsol_sweep_cycles and cycle % self.wsol_sweep_cycles == 0:
+                    # Wallets due to buy next cycle only give back what their accounts hold above a top-up.
+                    await self._sweep_wsol(keep=[key_pair.pubkey() for key_pair in self.key_pairs[:self._buys_left()]])
+                # Cycles start on a fixed wall-clock grid; a cycle that overruns its slot starts the next one
+                # immediately and the grid is re-anchored instead of bursting to catch up.
+                deadline += self.delay
+                now = loop.time()
+                if deadline > now:
+                    await asyncio.sleep(deadline - now)
+                else:
+                    if self.delay > 0:
+                        logger.warning("%sCycle %s overran its %ss slot by %.1fs", self._prefix, cycle, self.delay,
+                                       now - deadline)
+                    deadline = now
+            if self._deferred_sells:
+                await self._run_cycle("Final sell round", buys=False)
+            if self.wsol_accounts is not None:
+                await self._sweep_wsol()
+            if self.store is not None:
+                self.store.clear_campaign(self.token_address)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if self.dispatcher is not None:
+                await self.dispatcher.detach(self)
+            if reserve_feed is not None:
+                await reserve_feed.stop()
+            if self._owns_fee_engine:
+                await self.fee_engine.stop()
+        return self.stats
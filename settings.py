@@ -26,8 +26,130 @@ CYCLES = 10
 # Delay between trade cycles in seconds
 DELAY_BETWEEN_ROUNDS = 5
 
+# Token campaigns to run side by side in one process, sharing the RPC endpoints, blockhash service, confirmation
+# tracker and a worker pool of THREADS that serves them in turn. Each entry is a dict with "token_address" and
+# optionally "sol_in", "slippage", "cycles", "delay", "sell_probability", "sell_percentage_min",
+# "sell_percentage_max", "budget" (total SOL for buys, None = unlimited), "wallets" ((start, stop) slice of the
+# wallets in PRIVATE_KEYS_FILE, None = all) and "name"; left-out keys take the values above.
+# Empty = a single campaign for TOKEN_ADDRESS.
+CAMPAIGNS = []
+
 # File path containing private keys (one per line in Base58 format)
 PRIVATE_KEYS_FILE = "private_keys.txt"
 
 # Maximum number of concurrent tasks (simulating multithreading)
-THREADS = 5
\ No newline at end of file
+THREADS = 5
+
+# Look the Raydium pair of TOKEN_ADDRESS up on DexScreener when the RPC refuses getProgramAccounts
+DEXSCREENER_FALLBACK = True
+
+# Base URL of the DexScreener API used by that fallback
+DEXSCREENER_API = "https://api.dexscreener.com"
+
+# File used to persist resolved pool keys between restarts (set to None to keep them in memory only)
+POOL_CACHE_FILE = "pool_cache.json"
+
+# Seconds after which cached pool keys are revalidated against the AMM and market accounts (0 = only once per run)
+POOL_CACHE_TTL = 0
+
+# Interval in seconds between background blockhash refreshes
+BLOCKHASH_REFRESH_INTERVAL = 2
+
+# Maximum age in seconds of a prefetched blockhash before it is fetched again on the critical path
+BLOCKHASH_MAX_AGE = 30
+
+# Requests per second allowed against the RPC endpoint (0 = unlimited) and the burst size of the token bucket
+RPC_RATE_LIMIT = 50
+RPC_BURST = 100
+
+# Lowest rate the limiter backs off to when the RPC answers with 429s or timeouts
+RPC_MIN_RATE_LIMIT = 5
+
+# Additional RPC endpoints; when set, calls are routed to the healthiest one instead of the single RPC above
+RPC_ENDPOINTS = []
+
+# Coalesce identical in-flight RPC reads into one request and send the distinct calls issued within
+# RPC_BATCH_WINDOW seconds of each other as one JSON-RPC batch of up to RPC_BATCH_SIZE calls
+# (RPC_BATCH_SIZE 1 = coalescing only; turn RPC_BATCHING off for endpoints that bill batches badly)
+RPC_BATCHING = True
+RPC_BATCH_WINDOW = 0.002
+RPC_BATCH_SIZE = 20
+
+# Race latency-critical reads (reserves, blockhash) against a second endpoint after the primary's p95 latency
+RPC_HEDGE = True
+
+# Interval in seconds between endpoint health probes (slot lag)
+RPC_HEALTH_INTERVAL = 5
+
+# How transactions are simulated before sending:
+# "skip" - send without simulating, "parallel" - simulate alongside the send for diagnostics only,
+# "blocking" - simulate first and abort the trade if the simulation fails
+SEND_MODE = "parallel"
+
+# Interval in seconds between batched getSignatureStatuses polls of submitted transactions
+CONFIRM_POLL_INTERVAL = 1
+
+# Interval in seconds after which an unconfirmed transaction is sent again (until its blockhash expires)
+REBROADCAST_INTERVAL = 2
+
+# Maximum seconds shutdown (and a wSOL sweep) waits for pending transactions to land or expire; whatever is still
+# unconfirmed then is counted as expired and left in STATE_DB for the next run to check
+CONFIRM_DRAIN_TIMEOUT = 90
+
+# WebSocket endpoint used for the pushed reserve feed (derived from RPC when empty)
+RPC_WS = ""
+
+# Interval in seconds between vault polls while the reserve feed socket is down
+RESERVE_POLL_INTERVAL = 1
+
+# Maximum age in seconds of polled reserves before trades fetch them directly again
+RESERVE_MAX_STALENESS = 2
+
+# Compile swaps against a per-pool address lookup table (created and paid for by the PRIVATE_KEY wallet)
+USE_LOOKUP_TABLES = False
+
+# File used to remember the lookup table created for each pool
+LOOKUP_TABLE_FILE = "lookup_tables.json"
+
+# Pack the swaps of several wallets into shared multi-signer transactions (up to the 1232-byte packet and compute
+# limits). Swaps in one transaction land or fail together; works best together with USE_LOOKUP_TABLES.
+BUNDLE_SWAPS = False
+
+# Keep one long-lived wSOL account per wallet instead of creating and closing it around every swap
+PERSISTENT_WSOL = False
+
+# Amount of SOL each persistent wSOL account is topped up with when it runs low
+WSOL_TOP_UP = 0.01
+
+# Number of cycles between sweeps that unwrap the persistent wSOL accounts back to SOL (0 = only at the end);
+# a mid-run sweep only unwraps what the accounts of the wallets due to buy next cycle hold above a top-up
+WSOL_SWEEP_CYCLES = 0
+
+# Learn compute unit limits per swap shape from simulations (needs SEND_MODE "parallel" or "blocking") and price
+# transactions off getRecentPrioritizationFees for the pool's writable accounts instead of UNIT_BUDGET/UNIT_PRICE
+ADAPTIVE_COMPUTE_BUDGET = False
+
+# Safety margin added on top of the largest observed compute units of a shape
+CU_MARGIN = 0.1
+
+# Percentile of the recent per-slot priority fees to bid, and the bounds of the bid (micro-lamports per CU)
+PRIORITY_FEE_PERCENTILE = 75
+PRIORITY_FEE_MIN = 1_000
+PRIORITY_FEE_MAX = 5_000_000
+
+# Interval in seconds between priority fee refreshes
+PRIORITY_FEE_REFRESH_INTERVAL = 10
+
+# Local address of the Prometheus text endpoint (/metrics) exposing per-stage latencies and RPC counters
+# (METRICS_PORT None to disable; the metrics are still collected)
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# SQLite file holding wallet state, pending signatures and campaign progress across restarts (None to disable)
+STATE_DB = "wallet_state.db"
+
+# Interval in seconds between batched writes of changed wallet state to STATE_DB
+STATE_FLUSH_INTERVAL = 1
+
+# Maximum age in seconds of persisted wallet state that a restart trusts instead of rescanning every wallet
+STATE_MAX_AGE = 300
@@ -0,0 +1,306 @@
+import os
+
+# config.py insists on credentials at import time; the simulator never signs or sends anything.
+os.environ.setdefault("PRIVATE_KEY", "offline-simulator")
+os.environ.setdefault("RPC", "http://127.0.0.1")
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from functools import partial
+
+import numpy as np
+from solana.rpc.async_api import AsyncClient
+from solders.pubkey import Pubkey
+
+from config import UNIT_BUDGET, UNIT_PRICE
+from constants import WSOL
+from fast_layouts import LIQUIDITY_STATE_V4, decode_token_amount
+from settings import CYCLES, SELL_PERCENTAGE_MAX, SELL_PERCENTAGE_MIN, SELL_PROBABILITY, SLIPPAGE, SOL_IN
+
+LAMPORTS_PER_SOL = 10 ** 9
+# Base fee charged per transaction signature
+LAMPORTS_PER_SIGNATURE = 5_000
+PERCENTILES = (5, 50, 95)
+
+
+@dataclass(frozen=True)
+class PoolParams:
+    """Reserves and trade fee of a Raydium V4 pool, in lamports and raw token units."""
+
+    sol_reserve: float = 500 * LAMPORTS_PER_SOL
+    token_reserve: float = 10 ** 15
+    fee_numerator: int = 25
+    fee_denominator: int = 10_000
+
+    @property
+    def fee_rate(self) -> float:
+        return self.fee_numerator / self.fee_denominator if self.fee_denominator else 0.0
+
+
+@dataclass(frozen=True)
+class CampaignParams:
+    sol_in: float = SOL_IN
+    slippage: float = SLIPPAGE
+    sell_probability: float = SELL_PROBABILITY
+    sell_percentage_min: int = SELL_PERCENTAGE_MIN
+    sell_percentage_max: int = SELL_PERCENTAGE_MAX
+    cycles: int = CYCLES or 10
+    wallets: int = 100
+
+
+def pool_from_accounts(amm_data: bytes, vaults: dict[bytes, bytes]) -> PoolParams:
+    state = LIQUIDITY_STATE_V4.parse(amm_data)
+    coin = decode_token_amount(vaults[state.poolCoinTokenAccount])
+    pc = decode_token_amount(vaults[state.poolPcTokenAccount])
+    sol_is_coin = state.coinMintAddress == bytes(WSOL)
+    return PoolParams(sol_reserve=coin if sol_is_coin else pc, token_reserve=pc if sol_is_coin else coin,
+                      fee_numerator=state.tradeFeeNumerator, fee_denominator=state.tradeFeeDenominator)
+
+
+async def fetch_pool(rpc: str, pair_address: str) -> PoolParams:
+    async with AsyncClient(rpc) as client:
+        amm_data = bytes((await client.get_account_info(Pubkey.from_string(pair_address))).value.data)
+        state = LIQUIDITY_STATE_V4.parse(amm_data)
+        vault_keys = [Pubkey.from_bytes(state.poolCoinTokenAccount), Pubkey.from_bytes(state.poolPcTokenAccount)]
+        response = await client.get_multiple_accounts(vault_keys)
+    return pool_from_accounts(amm_data, {bytes(key): bytes(account.data)
+                                         for key, account in zip(vault_keys, response.value)})
+
+
+def load_fixture_pool(path: str) -> PoolParams:
+    # Reads the pool accounts recorded by `benchmark.py --record`.
+    from benchmark import Fixture
+
+    fixture = Fixture.load(path)
+    return pool_from_accounts(fixture.accounts[fixture.amm_id].data,
+                              {bytes(key): account.data for key, account in fixture.accounts.items()})
+
+
+def swap_out(amount_in: np.ndarray, reserve_in: np.ndarray, reserve_out: np.ndarray,
+             fee_rate: float) -> tuple[np.ndarray, np.ndarray]:
+    # quote_exact_in's constant product after the pool's trade fee, across every simulation at once. Floats instead
+    # of its exact integers: u64 products overflow and the statistics do not need lamport precision.
+    # Returns (amount out, trade fee in input units).
+    fee = amount_in * fee_rate
+    after_fee = amount_in - fee
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.where(after_fee > 0, reserve_out * after_fee / (reserve_in + after_fee), 0.0)
+    return out, fee
+
+
+def _summary(values: np.ndarray) -> dict:
+    low, median, high = np.percentile(values, PERCENTILES)
+    return {"mean": float(values.mean()), "p5": float(low), "p50": float(median), "p95": float(high)}
+
+
+def simulate(params: CampaignParams, pool: PoolParams = PoolParams(), simulations: int = 1000,
+             seed: int | None = None, external_flow: float = 0.0,
+             tx_fee: float = LAMPORTS_PER_SIGNATURE + UNIT_PRICE * UNIT_BUDGET / 10 ** 6) -> dict:
+    """Play one campaign `simulations` times side by side and summarize its outcome.
+
+    Mirrors TradeScheduler: every cycle's wave holds the sells deferred by the previous cycle and one buy per
+    wallet, and a final round drains the sells left after the last cycle. Like plan_wave, a wave is priced from one
+    reserve read at the start of its cycle, each trade's limit allowing for the rest of the wave landing ahead of
+    it, and its trades land in random order. external_flow is the standard deviation, as a fraction of the SOL
+    reserve, of other traders' net flow into the pool between that read and the wave landing; it is what makes
+    trades fail on slippage.
+    """
+    rng = np.random.default_rng(seed)
+    n, wallets = simulations, params.wallets
+    fee_rate = pool.fee_rate
+    # Float rounding must not fail a trade that lands exactly on its limit.
+    keep = (1 - params.slippage / 100) * (1 - 1e-9)
+    sol_in = np.full(n, params.sol_in * LAMPORTS_PER_SOL)
+
+    sol = np.full(n, float(pool.sol_reserve))
+    token = np.full(n, float(pool.token_reserve))
+    start_price = sol / token
+    holdings = np.zeros((n, wallets))
+    deferred = np.zeros((n, wallets))
+    volume, trade_fees, bought, sold = (np.zeros(n) for _ in range(4))
+    impact, attempts, failed = (np.zeros(n) for _ in range(3))
+
+    for cycle in range(params.cycles + 1):
+        buying = cycle < params.cycles
+        sell_amounts = holdings * deferred / 100
+        deferred[:] = 0
+        quote_sol, quote_token = sol.copy(), token.copy()
+        wave_sold = sell_amounts.sum(axis=1)
+        wave_bought = sol_in * wallets if buying else 0.0
+        if external_flow:
+            flow = rng.normal(0.0, external_flow, n) * sol
+            tokens_in = np.maximum(-flow, 0.0) * token / sol
+            token_out, _ = swap_out(np.maximum(flow, 0.0), sol, token, fee_rate)
+            sol_out, _ = swap_out(tokens_in, token, sol, fee_rate)
+            sol, token = sol + np.maximum(flow, 0.0) - sol_out, token + tokens_in - token_out
+
+        trades = [(False, j) for j in range(wallets)] + ([(True, j) for j in range(wallets)] if buying else [])
+        for k in rng.permutation(len(trades)):
+            buy, j = trades[k]
+            if buy:
+                # plan_wave's worst position: behind every other buy of the wave and ahead of its sells.
+                reserve_in = quote_sol + wave_bought - sol_in
+                worst, _ = swap_out(sol_in, reserve_in, quote_sol * quote_token / reserve_in, fee_rate)
+                out, fee = swap_out(sol_in, sol, token, fee_rate)
+                ok = out >= worst * keep
+                spot = token / sol
+                sol = np.where(ok, sol + sol_in, sol)
+                token = np.where(ok, token - out, token)
+                holdings[:, j] += np.where(ok, out, 0.0)
+                volume += np.where(ok, sol_in, 0.0)
+                bought += np.where(ok, sol_in, 0.0)
+                trade_fees += np.where(ok, fee, 0.0)
+                impact += np.where(ok, 1 - out / ((sol_in - fee) * spot), 0.0)
+                attempts += 1
+                failed += ~ok
+                sells = ok & (rng.random(n) < params.sell_probability)
+                percentages = rng.integers(params.sell_percentage_min, params.sell_percentage_max + 1, n)
+                deferred[:, j] = np.where(sells, percentages, 0)
+                continue
+
+            amount = sell_amounts[:, j]
+            active = amount > 0
+            if not active.any():
+                continue
+            reserve_in = quote_token + wave_sold - amount
+            worst, _ = swap_out(amount, reserve_in, quote_sol * quote_token / reserve_in, fee_rate)
+            out, fee = swap_out(amount, token, sol, fee_rate)
+            ok = active & (out >= worst * keep)
+            spot = sol / token
+            sol = np.where(ok, sol - out, sol)
+            token = np.where(ok, token + amount, token)
+            holdings[:, j] -= np.where(ok, amount, 0.0)
+            volume += np.where(ok, out, 0.0)
+            sold += np.where(ok, out, 0.0)
+            trade_fees += np.where(ok, fee * spot, 0.0)
+            impact += np.where(ok, 1 - out / np.maximum((amount - fee) * spot, 1e-300), 0.0)
+            attempts += active
+            failed += active & ~ok
+
+    end_price = sol / token
+    network_fees = attempts * tx_fee
+    succeeded = attempts - failed
+    # SOL that left the wallets for good: buys and fees minus sells and what selling the leftover tokens would
+    # return. Marking them at the end price instead would count price impact the wallets created as profit.
+    liquidation, _ = swap_out(holdings.sum(axis=1), token, sol, fee_rate)
+    net_cost = bought - sold + network_fees - liquidation
+    return {
+        "params": asdict(params),
+        "simulations": n,
+        "volume_sol": _summary(volume / LAMPORTS_PER_SOL),
+        "trade_fees_sol": _summary(trade_fees / LAMPORTS_PER_SOL),
+        "network_fees_sol": _summary(network_fees / LAMPORTS_PER_SOL),
+        "price_impact_bps": _summary(impact / np.maximum(succeeded, 1) * 10_000),
+        "price_drift_pct": _summary((end_price / start_price - 1) * 100),
+        "net_cost_sol": _summary(net_cost / LAMPORTS_PER_SOL),
+        "failed_pct": _summary(failed / np.maximum(attempts, 1) * 100),
+    }
+
+
+def sweep(grid: list[CampaignParams], pool: PoolParams = PoolParams(), simulations: int = 1000, seed: int = 0,
+          processes: int = 1, **options) -> list[dict]:
+    # Every parameter set sees the same random draws (common random numbers), so differences between rows come
+    # from the parameters rather than from sampling noise.
+    run = partial(_simulate_params, pool=pool, simulations=simulations, seed=seed, **options)
+    if processes <= 1 or len(grid) == 1:
+        return [run(params) for params in grid]
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(run, grid, chunksize=max(1, len(grid) // (processes * 4))))
+
+
+def _simulate_params(params: CampaignParams, **options) -> dict:
+    return simulate(params, **options)
+
+
+def parameter_grid(sol_in: list[float], slippage: list[float], sell_probability: list[float],
+                   sell_percentage: list[tuple[int, int]], cycles: list[int],
+                   wallets: list[int]) -> list[CampaignParams]:
+    return [CampaignParams(sol_in=amount, slippage=slip, sell_probability=probability, sell_percentage_min=low,
+                           sell_percentage_max=high, cycles=cycle_count, wallets=wallet_count)
+            for amount, slip, probability, (low, high), cycle_count, wallet_count
+            in itertools.product(sol_in, slippage, sell_probability, sell_percentage, cycles, wallets)]
+
+
+def format_report(results: list[dict]) -> str:
+    header = (f"{'sol_in':>9}{'slip':>6}{'sell_p':>7}{'sell%':>8}{'cycles':>7}{'wallets':>8}"
+              f"{'volume SOL':>12}{'fees SOL':>10}{'tx fees SOL':>12}{'impact bps':>11}{'drift % p5..p95':>20}"
+              f"{'net cost SOL':>13}{'failed %':>9}")
+    lines = [header]
+    for result in results:
+        p = result["params"]
+        drift = result["price_drift_pct"]
+        lines.append(
+            f"{p['sol_in']:>9g}{p['slippage']:>6g}{p['sell_probability']:>7g}"
+            f"{p['sell_percentage_min']:>4}-{p['sell_percentage_max']:<3}{p['cycles']:>7}{p['wallets']:>8}"
+            f"{result['volume_sol']['mean']:>12.4f}{result['trade_fees_sol']['mean']:>10.5f}"
+            f"{result['network_fees_sol']['mean']:>12.5f}{result['price_impact_bps']['mean']:>11.2f}"
+            f"{drift['mean']:>8.3f} ({drift['p5']:>.2f}..{drift['p95']:.2f})"
+            f"{result['net_cost_sol']['mean']:>13.5f}{result['failed_pct']['mean']:>9.2f}")
+    return "\n".join(lines)
+
+
+def _floats(text: str) -> list[float]:
+    return [float(value) for value in text.split(",")]
+
+
+def _ints(text: str) -> list[int]:
+    return [int(value) for value in text.split(",")]
+
+
+def _ranges(text: str) -> list[tuple[int, int]]:
+    return [tuple(int(bound) for bound in value.split("-")) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo simulation of volume campaigns against a Raydium V4 "
+                                                 "pool. List parameters take comma-separated values; every "
+                                                 "combination is simulated.")
+    parser.add_argument("--sol-in", type=_floats, default=[SOL_IN])
+    parser.add_argument("--slippage", type=_floats, default=[SLIPPAGE])
+    parser.add_argument("--sell-probability", type=_floats, default=[SELL_PROBABILITY])
+    parser.add_argument("--sell-percentage", type=_ranges, default=[(SELL_PERCENTAGE_MIN, SELL_PERCENTAGE_MAX)],
+                        help="MIN-MAX ranges, e.g. 50-100,25-50")
+    parser.add_argument("--cycles", type=_ints, default=[CYCLES or 10])
+    parser.add_argument("--wallets", type=_ints, default=[100])
+    parser.add_argument("--simulations", type=int, default=1000, help="campaigns simulated per parameter set")
+    parser.add_argument("--external-flow", type=float, default=0.0,
+                        help="std dev of other traders' net flow while a wave is in flight, as a fraction of the "
+                             "SOL reserve")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixture", help="pool accounts recorded with benchmark.py --record")
+    parser.add_argument("--pair", help="AMM address of a live pool to read reserves and fees from (needs --rpc)")
+    parser.add_argument("--rpc", help="RPC endpoint used by --pair")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.pair:
+        if not args.rpc:
+            parser.error("--pair needs --rpc")
+        pool = asyncio.run(fetch_pool(args.rpc, args.pair))
+    elif args.fixture:
+        pool = load_fixture_pool(args.fixture)
+    else:
+        pool = PoolParams()
+    grid = parameter_grid(args.sol_in, args.slippage, args.sell_probability, args.sell_percentage, args.cycles,
+                          args.wallets)
+
+    started = time.perf_counter()
+    results = sweep(grid, pool, args.simulations, args.seed, args.processes, external_flow=args.external_flow)
+    elapsed = time.perf_counter() - started
+    print(f"Pool: {pool.sol_reserve / LAMPORTS_PER_SOL:,.2f} SOL / {pool.token_reserve:,.0f} tokens, "
+          f"fee {pool.fee_numerator}/{pool.fee_denominator}")
+    print(format_report(results))
+    print(f"{len(grid)} parameter set(s) x {args.simulations} simulation(s) in {elapsed:.1f}s")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"pool": asdict(pool), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,67 @@
+import asyncio
+import functools
 import logging
+import time
+from enum import Enum
+from typing import Sequence
 
 from solana.rpc.async_api import AsyncClient
-from solana.rpc.types import TxOpts, TokenAccountOpts
+from solana.rpc.types import DataSliceOpts, TxOpts, TokenAccountOpts
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.hash import Hash
 from solders.keypair import Keypair
 from solders.message import MessageV0
 from solders.pubkey import Pubkey
 from solders.system_program import TransferParams, transfer
-from solders.token.associated import get_associated_token_address
 from solders.transaction import VersionedTransaction
 from spl.token.instructions import create_associated_token_account, \
     sync_native, SyncNativeParams, close_account, CloseAccountParams
 
+from blockhash import BlockhashService
+from confirmation import ConfirmationTracker
 from constants import TOKEN_PROGRAM_ID, WSOL
+from derivations import wsol_address
+from fast_layouts import TOKEN_ACCOUNT_AMOUNT_OFFSET, TOKEN_ACCOUNT_AMOUNT_SIZE, decode_token_amount
+from fee_engine import observe_simulation
+import metrics
+from settings import SEND_MODE
 
 
 logger = logging.getLogger(__name__)
 
-async def get_token_balance(client: AsyncClient, key_pair: Keypair, mint: Pubkey):
-    try:
-        pubkey_str = key_pair.pubkey()
-        response = await client.get_token_accounts_by_owner(pubkey_str, TokenAccountOpts(mint=mint))
-        if response.value:
-            token_account_pubkey = response.value[0].pubkey
-            balance_info = await client.get_token_account_balance(token_account_pubkey)
-            return balance_info.value.ui_amount
-        else:
-            logging.info(f"No token accounts found for {pubkey_str}")
-            return 0
-    except Exception as e:
-        logging.error(f"An error occurred: {e}")
+# Reads only the 8-byte amount of a token account instead of the whole (or jsonParsed) account
+TOKEN_AMOUNT_SLICE = DataSliceOpts(offset=TOKEN_ACCOUNT_AMOUNT_OFFSET, length=TOKEN_ACCOUNT_AMOUNT_SIZE)
+# Zero-length slice for calls that only need to know whether accounts exist
+EMPTY_SLICE = DataSliceOpts(offset=0, length=0)
+
+def load_key_pairs(path: str) -> list[Keypair]:
+    key_pairs = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                key_pairs.append(Keypair.from_base58_string(line))
+            except Exception as e:
+                logging.error(f"Skipping invalid private key on line {line_number} of {path}: {e}")
+    logging.info(f"Loaded {len(key_pairs)} wallet(s) from {path}")
+    return key_pairs
+
+
+async def get_raw_token_balance(client: AsyncClient, key_pair: Keypair, mint: Pubkey) -> int:
+    response = await client.get_token_accounts_by_owner(
+        key_pair.pubkey(),
+        TokenAccountOpts(mint=mint, encoding="base64", data_slice=TOKEN_AMOUNT_SLICE),
+    )
+    if not response.value:
+        logging.info(f"No token accounts found for {key_pair.pubkey()}")
         return 0
+    return decode_token_amount(bytes(response.value[0].account.data))
+
 
 def create_wsol_account_instructions(key_pair: Keypair, amount_in):
-    wsol_token_account = get_associated_token_address(key_pair.pubkey(), WSOL)
+    wsol_token_account = wsol_address(key_pair.pubkey())
     create_instr = create_associated_token_account(
         payer=key_pair.pubkey(),
         owner=key_pair.pubkey(),
@@ -60,22 +89,90 @@ def create_wsol_account_instructions(key_pair: Keypair, amount_in):
         wsol_inst = [create_instr, transfer_instr, sync_instr]
     else:
         wsol_inst = [create_instr, sync_instr, close_instr]
-    logging.debug(f"Generated WSOL account instructions for {wsol_token_account}")
+    logger.debug("generated wsol account instructions account=%s", wsol_token_account)
     return wsol_token_account, wsol_inst
 
-async def compile_and_send_transaction(client: AsyncClient, key_pair: Keypair, instructions):
-    logging.debug("Compiling transaction message...")
-    latest_blockhash = await client.get_latest_blockhash()
-    compiled_message = MessageV0.try_compile(
-        key_pair.pubkey(),
-        instructions,
-        [],
-        latest_blockhash.value.blockhash,
-    )
-    logging.debug("Sending transaction...")
-    txn = VersionedTransaction(compiled_message, [key_pair])
-    response = await client.simulate_transaction(txn)
-    logging.info(f"{response}")
-    txn_send = await client.send_transaction(txn, opts=TxOpts(skip_preflight=True))
-    logging.info(f"Transaction Signature: https://solscan.io/tx/{txn_send.value}")
-    return txn_send.value
\ No newline at end of file
+class SendMode(str, Enum):
+    SKIP = "skip"
+    PARALLEL = "parallel"
+    BLOCKING = "blocking"
+
+
+class SimulationError(Exception):
+    pass
+
+
+# Keeps fire-and-forget simulation tasks referenced until they finish
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _get_blockhash(client: AsyncClient, blockhash_service: BlockhashService | None) -> tuple[Hash, int]:
+    with metrics.stage("blockhash"):
+        if blockhash_service is not None:
+            return await blockhash_service.get()
+        latest_blockhash = (await client.get_latest_blockhash()).value
+    return latest_blockhash.blockhash, latest_blockhash.last_valid_block_height
+
+
+def compile_transaction(key_pair: Keypair, instructions, blockhash: Hash,
+                        lookup_tables: Sequence[AddressLookupTableAccount] = ()) -> VersionedTransaction:
+    with metrics.stage("compile"):
+        compiled_message = MessageV0.try_compile(
+            key_pair.pubkey(),
+            instructions,
+            list(lookup_tables),
+            blockhash,
+        )
+        return VersionedTransaction(compiled_message, [key_pair])
+
+
+def _log_simulation(txn: VersionedTransaction, started: float, task: asyncio.Task):
+    _background_tasks.discard(task)
+    if task.cancelled():
+        return
+    metrics.observe_stage("simulate", time.perf_counter() - started)
+    if task.exception() is not None:
+        logger.debug("simulation request failed signature=%s error=%s", txn.signatures[0], task.exception())
+        return
+    response = task.result()
+    observe_simulation(txn, response)
+    if response.value.err:
+        logger.warning("simulation failed signature=%s error=%s logs=%s", txn.signatures[0], response.value.err,
+                       response.value.logs)
+    else:
+        logger.debug("simulation ok signature=%s units=%s", txn.signatures[0], response.value.units_consumed)
+
+
+async def send_compiled_transaction(client: AsyncClient, txn: VersionedTransaction,
+                                    send_mode: SendMode = SEND_MODE,
+                                    tracker: ConfirmationTracker | None = None,
+                                    last_valid_block_height: int = 0):
+    send_mode = SendMode(send_mode)
+    if send_mode == SendMode.BLOCKING:
+        with metrics.stage("simulate"):
+            response = await client.simulate_transaction(txn)
+        observe_simulation(txn, response)
+        if response.value.err:
+            raise SimulationError(f"Simulation failed: {response.value.err}, logs: {response.value.logs}")
+    elif send_mode == SendMode.PARALLEL:
+        task = asyncio.ensure_future(client.simulate_transaction(txn))
+        _background_tasks.add(task)
+        task.add_done_callback(functools.partial(_log_simulation, txn, time.perf_counter()))
+
+    with metrics.stage("send"):
+        txn_send = await client.send_transaction(txn, opts=TxOpts(skip_preflight=True))
+    logger.info("sent transaction signature=%s url=https://solscan.io/tx/%s", txn_send.value, txn_send.value)
+    if tracker is not None:
+        tracker.track(txn, last_valid_block_height)
+    return txn_send.value
+
+
+async def compile_and_send_transaction(client: AsyncClient, key_pair: Keypair, instructions,
+                                      blockhash_service: BlockhashService | None = None,
+                                      send_mode: SendMode = SEND_MODE,
+                                      tracker: ConfirmationTracker | None = None,
+                                      lookup_tables: Sequence[AddressLookupTableAccount] = ()):
+    blockhash, last_valid_block_height = await _get_blockhash(client, blockhash_service)
+    txn = compile_transaction(key_pair, instructions, blockhash, lookup_tables)
+    return await send_compiled_transaction(client, txn, send_mode, tracker, last_valid_block_height)
+
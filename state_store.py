@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import sqlite3
+import time
+
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction import VersionedTransaction
+
+from derivations import wsol_address
+from settings import STATE_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS wallets (
+    owner BLOB NOT NULL,
+    mint BLOB NOT NULL,
+    ata BLOB NOT NULL,
+    wsol_ata BLOB NOT NULL,
+    ata_exists INTEGER NOT NULL,
+    token_amount INTEGER NOT NULL,
+    lamports INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (owner, mint)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    mint BLOB PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending (
+    signature BLOB PRIMARY KEY,
+    txn BLOB NOT NULL,
+    last_valid_block_height INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS campaigns (
+    token TEXT PRIMARY KEY,
+    cycle INTEGER NOT NULL,
+    deferred_sells TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class WalletStateStore:
+    """SQLite mirror of per-wallet state, pending signatures and campaign progress, written behind in batches."""
+
+    def __init__(self, path: str, flush_interval: float = STATE_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.flushes = 0
+        # Pending writes, keyed so that repeated updates between flushes collapse into one row
+        self._wallets: dict[tuple[bytes, bytes], tuple] = {}
+        self._refreshes: dict[bytes, float] = {}
+        self._pending_added: dict[bytes, tuple] = {}
+        self._pending_removed: set[bytes] = set()
+        self._campaigns: dict[str, tuple | None] = {}
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+
+    def load_wallets(self, mint: Pubkey) -> list[tuple]:
+        # (owner, ata, wsol_ata, ata_exists, token_amount, lamports, updated_at)
+        rows = self.db.execute(
+            "SELECT owner, ata, wsol_ata, ata_exists, token_amount, lamports, updated_at FROM wallets WHERE mint = ?",
+            (bytes(mint),)).fetchall()
+        return [(Pubkey.from_bytes(owner), Pubkey.from_bytes(ata), Pubkey.from_bytes(wsol_ata), bool(ata_exists),
+                 token_amount, lamports, updated_at)
+                for owner, ata, wsol_ata, ata_exists, token_amount, lamports, updated_at in rows]
+
+    def save_wallet(self, mint: Pubkey, owner: Pubkey, ata: Pubkey, ata_exists: bool, token_amount: int,
+                    lamports: int):
+        owner_bytes, mint_bytes = bytes(owner), bytes(mint)
+        self._wallets[(owner_bytes, mint_bytes)] = (
+            owner_bytes, mint_bytes, bytes(ata), bytes(wsol_address(owner)), int(ata_exists), token_amount,
+            lamports, time.time())
+
+    def load_refresh_time(self, mint: Pubkey) -> float | None:
+        row = self.db.execute("SELECT refreshed_at FROM snapshots WHERE mint = ?", (bytes(mint),)).fetchone()
+        return row[0] if row else None
+
+    def save_refresh_time(self, mint: Pubkey):
+        self._refreshes[bytes(mint)] = time.time()
+
+    def load_pending(self) -> list[tuple[VersionedTransaction, int]]:
+        rows = self.db.execute("SELECT txn, last_valid_block_height FROM pending").fetchall()
+        return [(VersionedTransaction.from_bytes(txn), last_valid_block_height)
+                for txn, last_valid_block_height in rows]
+
+    def add_pending(self, txn: VersionedTransaction, last_valid_block_height: int):
+        signature = bytes(txn.signatures[0])
+        self._pending_removed.discard(signature)
+        self._pending_added[signature] = (signature, bytes(txn), last_valid_block_height)
+
+    def remove_pending(self, signature: Signature):
+        signature = bytes(signature)
+        self._pending_added.pop(signature, None)
+        self._pending_removed.add(signature)
+
+    def load_campaign(self, token: str) -> tuple[int, list[tuple[Pubkey, int]]]:
+        row = self.db.execute("SELECT cycle, deferred_sells FROM campaigns WHERE token = ?", (token,)).fetchone()
+        if row is None:
+            return 0, []
+        cycle, deferred_sells = row
+        sells = []
+        for entry in deferred_sells.split(",") if deferred_sells else ():
+            owner, percentage = entry.split(":")
+            sells.append((Pubkey.from_string(owner), int(percentage)))
+        return cycle, sells
+
+    def save_campaign(self, token: str, cycle: int, deferred_sells: list[tuple[Pubkey, int]]):
+        encoded = ",".join(f"{owner}:{percentage}" for owner, percentage in deferred_sells)
+        self._campaigns[token] = (token, cycle, encoded, time.time())
+
+    def clear_campaign(self, token: str):
+        self._campaigns[token] = None
+
+    def _write(self, wallets: list[tuple], refreshes: list[tuple], added: list[tuple], removed: list[bytes],
+               campaigns: dict[str, tuple | None]):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO wallets VALUES (?, ?, ?, ?, ?, ?, ?, ?)", wallets)
+            self.db.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?)", refreshes)
+            self.db.executemany("INSERT OR REPLACE INTO pending VALUES (?, ?, ?)", added)
+            self.db.executemany("DELETE FROM pending WHERE signature = ?", [(s,) for s in removed])
+            for token, row in campaigns.items():
+                if row is None:
+                    self.db.execute("DELETE FROM campaigns WHERE token = ?", (token,))
+                else:
+                    self.db.execute("INSERT OR REPLACE INTO campaigns VALUES (?, ?, ?, ?)", row)
+
+    async def flush(self):
+        async with self._lock:
+            if not (self._wallets or self._refreshes or self._pending_added or self._pending_removed
+                    or self._campaigns):
+                return
+            batch = (list(self._wallets.values()), list(self._refreshes.items()), list(self._pending_added.values()),
+                     list(self._pending_removed), self._campaigns)
+            self._wallets, self._refreshes, self._pending_added, self._pending_removed, self._campaigns = \
+                {}, {}, {}, set(), {}
+            # The connection is only ever used by one flush at a time, so the write can leave the event loop.
+            await asyncio.to_thread(self._write, *batch)
+            self.flushes += 1
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Failed to flush wallet state to %s: %s", self.path, e)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        self.db.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# config.py insists on credentials at import time; nothing under test signs with them or reaches a cluster.
+os.environ.setdefault("PRIVATE_KEY", "offline-tests")
+os.environ.setdefault("RPC", "http://127.0.0.1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+from solders.hash import Hash
+from solders.keypair import Keypair
+from solders.message import MessageV0
+from solders.transaction import VersionedTransaction
+
+from confirmation import ConfirmationTracker, TxStatus
+
+
+class DeadClient:
+    """Every RPC call fails, as with an unreachable endpoint."""
+
+    async def get_block_height(self, *args, **kwargs):
+        raise ConnectionError("endpoint unreachable")
+
+    async def get_signature_statuses(self, *args, **kwargs):
+        raise ConnectionError("endpoint unreachable")
+
+    async def send_raw_transaction(self, *args, **kwargs):
+        raise ConnectionError("endpoint unreachable")
+
+
+def _transaction() -> VersionedTransaction:
+    key_pair = Keypair()
+    return VersionedTransaction(MessageV0.try_compile(key_pair.pubkey(), [], [], Hash.new_unique()), [key_pair])
+
+
+def test_drain_gives_up_on_an_unreachable_rpc():
+    async def run():
+        tracker = ConfirmationTracker(DeadClient(), poll_interval=0.01, drain_timeout=0.2)
+        async with tracker:
+            outcome = tracker.track(_transaction(), last_valid_block_height=10 ** 9)
+        return tracker, outcome
+
+    started = time.monotonic()
+    tracker, outcome = asyncio.run(asyncio.wait_for(run(), 5))
+    assert time.monotonic() - started < 5
+    assert tracker.pending == 0
+    assert outcome.result().status == TxStatus.EXPIRED
+    assert tracker.counts[TxStatus.EXPIRED] == 1
+
+
+def test_wait_idle_reports_whether_everything_settled():
+    async def run():
+        tracker = ConfirmationTracker(DeadClient(), poll_interval=0.01)
+        assert await tracker.wait_idle(0.05)
+        txn = _transaction()
+        tracker.track(txn, last_valid_block_height=10 ** 9)
+        assert tracker.outcome(txn.signatures[0]) is not None
+        assert not await tracker.wait_idle(0.05)
+        tracker.expire_pending("test")
+        assert tracker.outcome(txn.signatures[0]) is None
+
+    asyncio.run(run())
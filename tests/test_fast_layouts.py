@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from fast_layouts import ACCOUNT_FLAG_NAMES, LIQUIDITY_STATE_COIN_MINT_OFFSET, LIQUIDITY_STATE_PC_MINT_OFFSET, \
+    LIQUIDITY_STATE_V4, MARKET_STATE_V3, TOKEN_ACCOUNT, TOKEN_ACCOUNT_AMOUNT_OFFSET, TOKEN_ACCOUNT_AMOUNT_SIZE, \
+    AccountFlags, build_swap_data, decode_token_amount, pubkey_column, u128_column
+from layouts import ACCOUNT_LAYOUT, LIQUIDITY_STATE_LAYOUT_V4, MARKET_STATE_LAYOUT_V3, SWAP_LAYOUT
+
+SAMPLES = 200
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    return rng.randbytes(size)
+
+
+def _random_market(rng: random.Random) -> bytes:
+    data = bytearray(_random_bytes(rng, MARKET_STATE_V3.size))
+    # The construct layout only accepts account flags with the seven known bits set.
+    data[5:13] = rng.getrandbits(len(ACCOUNT_FLAG_NAMES)).to_bytes(8, "little")
+    return bytes(data)
+
+
+LAYOUTS = {
+    "LIQUIDITY_STATE_LAYOUT_V4": (LIQUIDITY_STATE_LAYOUT_V4, LIQUIDITY_STATE_V4,
+                                  lambda rng: _random_bytes(rng, LIQUIDITY_STATE_V4.size)),
+    "MARKET_STATE_LAYOUT_V3": (MARKET_STATE_LAYOUT_V3, MARKET_STATE_V3, _random_market),
+    "ACCOUNT_LAYOUT": (ACCOUNT_LAYOUT, TOKEN_ACCOUNT, lambda rng: _random_bytes(rng, TOKEN_ACCOUNT.size)),
+}
+
+
+@pytest.fixture(params=list(LAYOUTS))
+def layout(request):
+    slow, fast, generate = LAYOUTS[request.param]
+    rng = random.Random(request.param)
+    return slow, fast, [generate(rng) for _ in range(SAMPLES)]
+
+
+def test_size_matches_construct(layout):
+    slow, fast, _ = layout
+    assert fast.size == slow.sizeof()
+
+
+def test_parse_matches_construct(layout):
+    slow, fast, datas = layout
+    for data in datas:
+        expected = slow.parse(data)
+        decoded = fast.parse(data)
+        for field_name in fast.tuple_type._fields:
+            value = getattr(decoded, field_name)
+            if isinstance(value, AccountFlags):
+                assert list(value) == [expected[field_name][flag] for flag in ACCOUNT_FLAG_NAMES]
+            else:
+                assert value == expected[field_name], field_name
+
+
+def test_build_matches_construct(layout):
+    slow, fast, datas = layout
+    for data in datas:
+        assert fast.build(fast.parse(data)) == slow.build(slow.parse(data))
+
+
+def test_parse_batch_matches_parse(layout):
+    _, fast, datas = layout
+    batch = fast.parse_batch(datas)
+    for field_name, kind in fast.fields:
+        if kind.startswith("pad") or kind == "flags":
+            continue
+        expected = [getattr(fast.parse(data), field_name) for data in datas]
+        if kind == "u128":
+            assert u128_column(batch, field_name) == expected
+        elif kind == "pubkey":
+            assert pubkey_column(batch, field_name) == expected
+        else:
+            assert batch[field_name].tolist() == expected, field_name
+
+
+def test_market_flags_reject_unknown_bits():
+    data = bytearray(MARKET_STATE_V3.size)
+    data[5:13] = (1 << len(ACCOUNT_FLAG_NAMES)).to_bytes(8, "little")
+    with pytest.raises(ValueError):
+        MARKET_STATE_V3.parse(bytes(data))
+
+
+def _construct_offset(layout, name: str) -> int:
+    offset = 0
+    for subcon in layout.subcons:
+        if subcon.name == name:
+            return offset
+        offset += subcon.sizeof()
+    raise KeyError(name)
+
+
+def test_mint_offsets_match_construct():
+    assert LIQUIDITY_STATE_COIN_MINT_OFFSET == _construct_offset(LIQUIDITY_STATE_LAYOUT_V4, "coinMintAddress")
+    assert LIQUIDITY_STATE_PC_MINT_OFFSET == _construct_offset(LIQUIDITY_STATE_LAYOUT_V4, "pcMintAddress")
+
+
+def test_decode_token_amount_full_account_and_slice():
+    data = random.Random(0).randbytes(TOKEN_ACCOUNT.size)
+    amount = ACCOUNT_LAYOUT.parse(data).amount
+    assert decode_token_amount(data) == amount
+    assert decode_token_amount(data[TOKEN_ACCOUNT_AMOUNT_OFFSET:TOKEN_ACCOUNT_AMOUNT_OFFSET
+                                    + TOKEN_ACCOUNT_AMOUNT_SIZE]) == amount
+
+
+@pytest.mark.parametrize("amount_in, min_amount_out", [(0, 0), (123456789, 987654321), (2 ** 64 - 1, 2 ** 64 - 1)])
+def test_build_swap_data_matches_construct(amount_in, min_amount_out):
+    assert build_swap_data(amount_in, min_amount_out) == SWAP_LAYOUT.build(
+        dict(instruction=9, amount_in=amount_in, min_amount_out=min_amount_out))
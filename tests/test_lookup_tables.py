@@ -0,0 +1,71 @@
+import asyncio
+import struct
+
+from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import derive_lookup_table_address
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+import lookup_tables
+import raydium_amm
+from benchmark import StandInServer, synthetic_fixture
+from lookup_tables import CREATE_LOOKUP_TABLE, EXTEND_LOOKUP_TABLE, LookupTableManager, \
+    create_lookup_table_instruction, extend_lookup_table_instruction, lookup_tables_for, pool_lookup_addresses
+
+
+def test_create_instruction_data():
+    authority, payer = Pubkey.new_unique(), Pubkey.new_unique()
+    instruction, table = create_lookup_table_instruction(authority, payer, 123_456)
+    tag, slot, bump = struct.unpack("<IQB", bytes(instruction.data))
+    assert (tag, slot) == (CREATE_LOOKUP_TABLE, 123_456)
+    assert (table, bump) == derive_lookup_table_address(authority, 123_456)
+    assert [meta.pubkey for meta in instruction.accounts[:3]] == [table, authority, payer]
+
+
+def test_extend_instruction_data():
+    table, authority = Pubkey.new_unique(), Pubkey.new_unique()
+    addresses = [Pubkey.new_unique() for _ in range(3)]
+    data = bytes(extend_lookup_table_instruction(table, authority, authority, addresses).data)
+    assert struct.unpack_from("<IQ", data) == (EXTEND_LOOKUP_TABLE, 3)
+    assert [Pubkey(data[12 + 32 * i:44 + 32 * i]) for i in range(3)] == addresses
+
+
+def _run(test):
+    async def run():
+        fixtures = [synthetic_fixture(), synthetic_fixture()]
+        fixtures[0].accounts.update(fixtures[1].accounts)
+        async with StandInServer(fixtures[0]) as server, AsyncClient(server.url) as client:
+            pools = [await raydium_amm.fetch_pool_keys(client, str(fixture.amm_id)) for fixture in fixtures]
+            await test(server, client, pools)
+
+    asyncio.run(asyncio.wait_for(run(), 60))
+
+
+def test_ensure_creates_and_extends_a_table(monkeypatch, tmp_path):
+    # Small extends so the table takes a create transaction and several extend-only ones.
+    monkeypatch.setattr(lookup_tables, "MAX_ADDRESSES_PER_EXTEND", 5)
+
+    async def test(server, client, pools):
+        path = str(tmp_path / "tables.json")
+        account = await LookupTableManager(client, Keypair(), path).ensure(pools[0])
+        wanted = pool_lookup_addresses(pools[0])
+        assert account.addresses == wanted
+        assert lookup_tables_for(pools[0]["amm_id"]) == [account]
+        assert server.calls["sendTransaction"] == -(-len(wanted) // 5)
+
+        # A later run finds the table in the file and on chain and sends nothing.
+        reused = await LookupTableManager(client, Keypair(), path).ensure(pools[0])
+        assert reused.key == account.key
+        assert server.calls["sendTransaction"] == -(-len(wanted) // 5)
+
+    _run(test)
+
+
+def test_concurrent_pools_get_tables_of_their_own():
+    async def test(server, client, pools):
+        manager = LookupTableManager(client, Keypair(), path=None)
+        accounts = await asyncio.gather(*(manager.ensure(pool_keys) for pool_keys in pools))
+        assert accounts[0].key != accounts[1].key
+        assert [account.addresses for account in accounts] == [pool_lookup_addresses(pool) for pool in pools]
+
+    _run(test)
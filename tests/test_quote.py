@@ -0,0 +1,43 @@
+import itertools
+import random
+
+import pytest
+
+from quote import apply_slippage, plan_wave, quote_exact_in
+
+FEE = (25, 10_000)
+
+
+def _land(order, sol, token, is_buy, amounts):
+    # Executes the wave on the constant-product curve in the given landing order.
+    outs = {}
+    for i in order:
+        if is_buy[i]:
+            out = quote_exact_in(amounts[i], sol, token, *FEE)
+            sol, token = sol + amounts[i], token - out
+        else:
+            out = quote_exact_in(amounts[i], token, sol, *FEE)
+            sol, token = sol - out, token + amounts[i]
+        outs[i] = out
+    return outs
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_limits_hold_in_every_landing_order(seed):
+    rng = random.Random(seed)
+    sol, token = rng.randint(10 ** 10, 10 ** 12), rng.randint(10 ** 12, 10 ** 15)
+    is_buy = [rng.random() < 0.6 for _ in range(rng.randint(1, 6))]
+    amounts = [rng.randint(1, sol // 5) if buy else rng.randint(1, token // 5) for buy in is_buy]
+    plan = plan_wave(sol, token, is_buy, amounts, slippage=0, fee_numerator=FEE[0], fee_denominator=FEE[1])
+    for order in itertools.permutations(range(len(amounts))):
+        outs = _land(order, sol, token, is_buy, amounts)
+        assert all(outs[i] >= plan.worst_amount_out[i] for i in outs)
+
+
+def test_worst_case_is_landing_behind_the_rest_of_the_wave():
+    sol, token, amounts = 500 * 10 ** 9, 10 ** 15, [10 ** 9, 2 * 10 ** 9, 3 * 10 ** 9]
+    plan = plan_wave(sol, token, [True] * 3, amounts, slippage=5, fee_numerator=FEE[0], fee_denominator=FEE[1])
+    # The first buy in planned order only loses the other two buys' impact, within a few units of rounding.
+    last = _land((1, 2, 0), sol, token, [True] * 3, amounts)[0]
+    assert plan.amount_out[0] > last >= plan.worst_amount_out[0] > last * 0.9999
+    assert plan.min_amount_out[0] == apply_slippage(int(plan.worst_amount_out[0]), 5)
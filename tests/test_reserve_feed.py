@@ -0,0 +1,71 @@
+import asyncio
+
+from solana.rpc.async_api import AsyncClient
+
+import raydium_amm
+from benchmark import StandInServer, synthetic_fixture
+from reserve_feed import ReserveFeed, active_feed, ws_url_from_http
+
+TIMEOUT = 10
+
+
+async def _eventually(predicate, timeout: float = TIMEOUT):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+
+def _run(test, **server_options):
+    async def run():
+        fixture = synthetic_fixture()
+        async with StandInServer(fixture, **server_options) as server, AsyncClient(server.url) as client:
+            pool_keys = await raydium_amm.fetch_pool_keys(client, str(fixture.amm_id))
+            feed = ReserveFeed(pool_keys, ws_url_from_http(server.url), client, poll_interval=0.05)
+            async with feed:
+                await test(server, feed)
+
+    asyncio.run(asyncio.wait_for(run(), 3 * TIMEOUT))
+
+
+def test_notifications_update_the_reserves():
+    async def test(server, feed):
+        await _eventually(lambda: feed.connected)
+        await server.update_token_amount(feed.sol_vault, 123 * 10 ** 9)
+        await _eventually(lambda: feed.reserves()[0] == 123 * 10 ** 9)
+        assert feed.notifications >= 1
+        assert active_feed(feed.pool_keys["amm_id"]) is feed
+
+    _run(test)
+
+
+def test_resubscribes_after_the_connection_drops():
+    async def test(server, feed):
+        await _eventually(lambda: feed.connected)
+        await server.drop_connections()
+        await _eventually(lambda: server.ws_connections == 2 and feed.connected)
+        await server.update_token_amount(feed.token_vault, 42)
+        await _eventually(lambda: feed.reserves()[1] == 42)
+        assert server.calls["accountSubscribe"] == 4
+
+    _run(test)
+
+
+def test_polls_while_the_socket_is_unavailable():
+    async def test(server, feed):
+        assert not feed.connected
+        # Without subscribers nothing is pushed, so only the polling fallback can pick this up.
+        await server.update_token_amount(feed.sol_vault, 7 * 10 ** 9)
+        await _eventually(lambda: feed.reserves()[0] == 7 * 10 ** 9)
+        assert feed.polls > 1
+        assert active_feed(feed.pool_keys["amm_id"]) is feed
+
+        server.ws_enabled = True
+        await _eventually(lambda: feed.connected)
+        polls = feed.polls
+        await asyncio.sleep(0.3)
+        # Subscribed again, so polling has stopped.
+        assert feed.polls == polls
+
+    _run(test, ws_enabled=False)
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import pytest
+
+from rpc_batch import BatchingProvider
+
+
+class CannedProvider(BatchingProvider):
+    """Answers every HTTP request with the same body, as a misbehaving endpoint or proxy would."""
+
+    def __init__(self, body):
+        super().__init__("http://127.0.0.1:1", window=0.01, max_batch=10)
+        self.body = body
+
+    async def _post(self, content: str) -> str:
+        self.posts += 1
+        return self.body(json.loads(content)) if callable(self.body) else self.body
+
+
+def _call(provider: BatchingProvider, slot: int):
+    return provider.request({"jsonrpc": "2.0", "id": 0, "method": "getBlock", "params": [slot]})
+
+
+async def _gather(provider: BatchingProvider, count: int):
+    calls = [_call(provider, slot) for slot in range(count)]
+    return await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 2)
+
+
+@pytest.mark.parametrize("body", ["<html>502 Bad Gateway</html>", '[{"jsonrpc": "2.0", "result": 1', "[1, 2, 3]"])
+def test_unparseable_batch_fails_the_callers_instead_of_hanging(body):
+    results = asyncio.run(_gather(CannedProvider(body), 3))
+    assert all(isinstance(result, Exception) for result in results)
+
+
+def test_batch_routes_responses_and_fails_the_missing_ones():
+    def answer(batch):
+        # The last call gets no response and one entry is not an object at all.
+        return json.dumps([{"jsonrpc": "2.0", "id": p["id"], "result": p["params"][0]} for p in batch[:-1]] + [7])
+
+    results = asyncio.run(_gather(CannedProvider(answer), 3))
+    assert [json.loads(result)["result"] for result in results[:2]] == [0, 1]
+    assert isinstance(results[2], RuntimeError)
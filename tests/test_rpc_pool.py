@@ -0,0 +1,29 @@
+import asyncio
+import socket
+
+from benchmark import StandInServer, synthetic_fixture
+from rpc_pool import RpcPool
+
+
+def _unused_url() -> str:
+    # Nothing listens on a port that was just released, so every call is refused.
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def test_routes_away_from_an_endpoint_that_never_answers():
+    async def run():
+        async with StandInServer(synthetic_fixture()) as server:
+            pool = RpcPool([_unused_url(), server.url], hedge=False)
+            async with pool:
+                dead, healthy = pool.health
+                assert dead.score > healthy.score
+                for _ in range(5):
+                    await pool.get_slot()
+            # Both endpoints see the same health probes; every routed call went to the live one.
+            assert dead.requests == server.calls["getSlot"] - 5
+            assert healthy.requests == server.calls["getSlot"]
+
+    asyncio.run(asyncio.wait_for(run(), 30))
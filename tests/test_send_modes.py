@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+from solana.rpc.async_api import AsyncClient
+from solders.address_lookup_table_account import AddressLookupTableAccount
+from solders.instruction import AccountMeta, Instruction
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+from benchmark import StandInServer, synthetic_fixture
+from solana_helpers import SendMode, SimulationError, compile_and_send_transaction
+
+MEMO_PROGRAM = Pubkey.from_string("MemoSq4gqABAXKb96qnH8TysNcWxMyWCqXgDLGmfcHr")
+
+
+def _send(send_mode: SendMode, lookup_tables=(), account: Pubkey | None = None):
+    async def run():
+        async with StandInServer(synthetic_fixture()) as server, AsyncClient(server.url) as client:
+            key_pair = Keypair()
+            instruction = Instruction(MEMO_PROGRAM, b"send mode",
+                                      [AccountMeta(account or key_pair.pubkey(), is_signer=False, is_writable=True)])
+            try:
+                result = await compile_and_send_transaction(client, key_pair, [instruction], send_mode=send_mode,
+                                                            lookup_tables=lookup_tables)
+            except Exception as e:
+                result = e
+            # Lets a background simulation reach the stand-in before it shuts down.
+            await asyncio.sleep(0.2)
+            return server, result
+
+    return asyncio.run(asyncio.wait_for(run(), 30))
+
+
+@pytest.mark.parametrize("send_mode, simulations", [(SendMode.SKIP, 0), (SendMode.PARALLEL, 1),
+                                                    (SendMode.BLOCKING, 1)])
+def test_send_modes(send_mode, simulations):
+    server, signature = _send(send_mode)
+    assert not isinstance(signature, Exception)
+    assert server.calls["sendTransaction"] == 1
+    assert server.calls["simulateTransaction"] == simulations
+
+
+def test_failed_simulation_aborts_a_blocking_send():
+    # The account resolves through a table the stand-in has never seen, so simulating the transaction fails.
+    account = Pubkey.new_unique()
+    missing_table = AddressLookupTableAccount(Pubkey.new_unique(), [account])
+    server, result = _send(SendMode.BLOCKING, [missing_table], account)
+    assert isinstance(result, SimulationError)
+    assert server.calls["sendTransaction"] == 0
@@ -0,0 +1,32 @@
+import pytest
+
+from quote import plan_wave
+from simulator import LAMPORTS_PER_SOL, CampaignParams, PoolParams, simulate
+
+
+def test_campaign_matches_plan_wave():
+    # One cycle of buys, then a final round selling everything: both waves priced the way the scheduler does.
+    pool = PoolParams()
+    params = CampaignParams(sol_in=1.0, slippage=5, sell_probability=1.0, sell_percentage_min=100,
+                            sell_percentage_max=100, cycles=1, wallets=100)
+    result = simulate(params, pool, simulations=50, seed=0)
+
+    sol_in = int(params.sol_in * LAMPORTS_PER_SOL)
+    buys = plan_wave(int(pool.sol_reserve), int(pool.token_reserve), [True] * params.wallets,
+                     [sol_in] * params.wallets, params.slippage, pool.fee_numerator, pool.fee_denominator)
+    assert (buys.amount_out >= buys.min_amount_out).all()
+    sells = plan_wave(*buys.final_reserves, [False] * params.wallets, buys.amount_out.tolist(), params.slippage,
+                      pool.fee_numerator, pool.fee_denominator)
+    sol, token = sells.final_reserves
+
+    assert result["failed_pct"]["p95"] == 0
+    assert result["volume_sol"]["mean"] == pytest.approx((sol_in * params.wallets + int(sells.amount_out.sum()))
+                                                         / LAMPORTS_PER_SOL, rel=1e-6)
+    assert result["price_drift_pct"]["p50"] == pytest.approx(
+        ((sol / token) / (pool.sol_reserve / pool.token_reserve) - 1) * 100, rel=1e-4)
+
+
+def test_flow_during_the_wave_fails_tight_limits():
+    params = CampaignParams(sol_in=1.0, slippage=0.1, cycles=2, wallets=20)
+    assert simulate(params, simulations=200, seed=0)["failed_pct"]["mean"] == 0
+    assert simulate(params, simulations=200, seed=0, external_flow=0.01)["failed_pct"]["mean"] > 0
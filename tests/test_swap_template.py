@@ -0,0 +1,25 @@
+from solders.instruction import Instruction
+from solders.pubkey import Pubkey
+
+from swap_template import swap_amounts, swap_index, swap_template, with_minimum_amount_out
+
+POOL_KEYS = {name: Pubkey.new_unique() for name in (
+    "amm_id", "open_orders", "target_orders", "base_vault", "quote_vault", "market_id", "bids", "asks",
+    "event_queue", "market_base_vault", "market_quote_vault", "market_authority")}
+
+
+def test_with_minimum_amount_out_keeps_amount_accounts_and_size():
+    owner, account_in, account_out = Pubkey.new_unique(), Pubkey.new_unique(), Pubkey.new_unique()
+    swap = swap_template(POOL_KEYS).build(1_000_000, 900_000, account_in, account_out, owner)
+    repriced = with_minimum_amount_out(swap, 850_000)
+    assert swap_amounts(repriced) == (1_000_000, 850_000)
+    assert repriced.accounts == swap.accounts
+    assert len(repriced.data) == len(swap.data)
+    assert repriced == swap_template(POOL_KEYS).build(1_000_000, 850_000, account_in, account_out, owner)
+
+
+def test_swap_index_finds_the_raydium_instruction():
+    owner = Pubkey.new_unique()
+    swap = swap_template(POOL_KEYS).build(1, 1, Pubkey.new_unique(), Pubkey.new_unique(), owner)
+    assert swap_index([swap]) == 0
+    assert swap_index([Instruction(Pubkey.new_unique(), b"", []), swap]) == 1
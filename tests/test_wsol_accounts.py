@@ -0,0 +1,37 @@
+import asyncio
+
+from solana.rpc.async_api import AsyncClient
+from solders.keypair import Keypair
+
+from benchmark import TOKEN_ACCOUNT_RENT, StandInAccount, StandInServer, synthetic_fixture, token_account_data
+from confirmation import ConfirmationTracker
+from constants import TOKEN_PROGRAM_ID, WSOL
+from derivations import wsol_address
+from wsol_accounts import WsolAccounts
+
+TOP_UP = 10 ** 7
+
+
+def test_sweep_unwraps_only_the_surplus_of_wallets_due_to_buy():
+    async def run():
+        fixture = synthetic_fixture()
+        proceeds, funded, idle = Keypair(), Keypair(), Keypair()
+        for key_pair, amount in ((proceeds, 5 * 10 ** 9), (funded, TOP_UP), (idle, TOP_UP)):
+            owner = key_pair.pubkey()
+            fixture.accounts[wsol_address(owner)] = StandInAccount(TOKEN_ACCOUNT_RENT + amount, TOKEN_PROGRAM_ID,
+                                                                   token_account_data(WSOL, owner, amount))
+        async with StandInServer(fixture) as server, AsyncClient(server.url) as client:
+            tracker = ConfirmationTracker(client, poll_interval=0.05)
+            await tracker.start()
+            accounts = WsolAccounts([proceeds, funded, idle], top_up=TOP_UP / 10 ** 9)
+            await accounts.sweep(client, tracker=tracker, keep=[proceeds.pubkey(), funded.pubkey()],
+                                 minimum=TOP_UP // 2)
+            await tracker.stop()
+            # The wallet holding sell proceeds is closed and funded again, the idle one stays closed and the one at
+            # the top-up level is left alone.
+            assert server.closed == {wsol_address(idle.pubkey())}
+            assert server.calls["sendTransaction"] == 2
+            assert accounts.get(proceeds.pubkey()).exists
+            assert not accounts.get(idle.pubkey()).exists
+
+    asyncio.run(asyncio.wait_for(run(), 60))
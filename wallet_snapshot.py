@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Processed
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+
+from derivations import ata_address
+from fast_layouts import TOKEN_ACCOUNT
+from state_store import WalletStateStore
+
+logger = logging.getLogger(__name__)
+
+# getMultipleAccounts accepts at most 100 pubkeys per request
+MAX_ACCOUNTS_PER_REQUEST = 100
+MAX_CONCURRENT_REQUESTS = 8
+
+
+@dataclass
+class WalletState:
+    owner: Pubkey
+    ata: Pubkey
+    ata_exists: bool = False
+    token_amount: int = 0
+    lamports: int = 0
+
+
+class WalletSnapshot:
+    """ATA existence, raw token balance and SOL lamports for a set of wallets and one mint."""
+
+    def __init__(self, mint: Pubkey, owners: list[Pubkey]):
+        self.mint = mint
+        self.wallets = {owner: WalletState(owner, ata_address(owner, mint)) for owner in owners}
+        self.store: WalletStateStore | None = None
+        self._unsaved: set[Pubkey] = set()
+        self.refreshed_at = 0.0
+
+    @classmethod
+    def for_key_pairs(cls, mint: Pubkey, key_pairs: list[Keypair]) -> "WalletSnapshot":
+        return cls(mint, [key_pair.pubkey() for key_pair in key_pairs])
+
+    def __contains__(self, owner: Pubkey) -> bool:
+        return owner in self.wallets
+
+    def __getitem__(self, owner: Pubkey) -> WalletState:
+        return self.wallets[owner]
+
+    def get(self, owner: Pubkey) -> WalletState | None:
+        return self.wallets.get(owner)
+
+    def token_balance(self, owner: Pubkey, decimals: int) -> float:
+        return self.wallets[owner].token_amount / 10 ** decimals
+
+    def _save(self, state: WalletState):
+        if self.store is not None:
+            self._unsaved.discard(state.owner)
+            self.store.save_wallet(self.mint, state.owner, state.ata, state.ata_exists, state.token_amount,
+                                   state.lamports)
+
+    def restore(self, store: WalletStateStore, rows: list[tuple]) -> bool:
+        # Adopts the persisted state of known wallets and mirrors every later change back to the store. Returns
+        # whether every wallet was covered, in which case the persisted refresh time carries over as well.
+        self.store = store
+        self._unsaved = set(self.wallets)
+        for owner, _, _, ata_exists, token_amount, lamports, _ in rows:
+            state = self.wallets.get(owner)
+            if state is None:
+                continue
+            state.ata_exists, state.token_amount, state.lamports = ata_exists, token_amount, lamports
+            self._unsaved.discard(owner)
+        refreshed_at = store.load_refresh_time(self.mint)
+        if self._unsaved or refreshed_at is None:
+            return False
+        self.refreshed_at = time.monotonic() - max(0.0, time.time() - refreshed_at)
+        return True
+
+    def mark_ata_created(self, owner: Pubkey):
+        state = self.wallets[owner]
+        state.ata_exists = True
+        self._save(state)
+
+    def mark_ata_closed(self, owner: Pubkey):
+        state = self.wallets[owner]
+        state.ata_exists = False
+        state.token_amount = 0
+        self._save(state)
+
+    async def refresh(self, client: AsyncClient, commitment: Commitment = Processed,
+                      max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS, owners: Iterable[Pubkey] | None = None):
+        # Each wallet contributes two accounts (the wallet itself and its ATA), so keep pairs in the same chunk.
+        if owners is None:
+            states = list(self.wallets.values())
+        else:
+            states = [self.wallets[owner] for owner in owners if owner in self.wallets]
+        per_chunk = MAX_ACCOUNTS_PER_REQUEST // 2
+        chunks = [states[i:i + per_chunk] for i in range(0, len(states), per_chunk)]
+        semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+        async def fetch_chunk(chunk: list[WalletState]):
+            pubkeys = [pubkey for state in chunk for pubkey in (state.owner, state.ata)]
+            async with semaphore:
+                response = await client.get_multiple_accounts(pubkeys, commitment)
+            accounts = response.value
+            for i, state in enumerate(chunk):
+                owner_account, ata_account = accounts[2 * i], accounts[2 * i + 1]
+                before = (state.lamports, state.ata_exists, state.token_amount)
+                state.lamports = owner_account.lamports if owner_account is not None else 0
+                if ata_account is None:
+                    state.ata_exists = False
+                    state.token_amount = 0
+                else:
+                    state.ata_exists = True
+                    state.token_amount = TOKEN_ACCOUNT.parse(ata_account.data).amount
+                if (state.lamports, state.ata_exists, state.token_amount) != before or state.owner in self._unsaved:
+                    self._save(state)
+
+        await asyncio.gather(*(fetch_chunk(chunk) for chunk in chunks))
+        if owners is None:
+            self.refreshed_at = time.monotonic()
+            if self.store is not None:
+                self.store.save_refresh_time(self.mint)
+        logger.debug("refreshed snapshot wallets=%d mint=%s requests=%d", len(states), self.mint, len(chunks))
+
+
+async def take_snapshot(client: AsyncClient, mint: Pubkey, key_pairs: list[Keypair],
+                        commitment: Commitment = Processed) -> WalletSnapshot:
+    snapshot = WalletSnapshot.for_key_pairs(mint, key_pairs)
+    await snapshot.refresh(client, commitment)
+    return snapshot
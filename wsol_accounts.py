@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Iterable
+
+from solana.rpc.async_api import AsyncClient
+from solana.rpc.commitment import Commitment, Processed
+from solders.instruction import Instruction
+from solders.keypair import Keypair
+from solders.pubkey import Pubkey
+from solders.system_program import TransferParams, transfer
+from spl.token.instructions import CloseAccountParams, SyncNativeParams, close_account, \
+    create_idempotent_associated_token_account, sync_native
+
+from blockhash import BlockhashService
+from bundler import SwapGroup, send_bundles
+from confirmation import ConfirmationTracker
+from constants import TOKEN_PROGRAM_ID, WSOL
+from derivations import wsol_address
+from fast_layouts import decode_token_amount
+from settings import WSOL_TOP_UP
+from solana_helpers import TOKEN_AMOUNT_SLICE
+
+logger = logging.getLogger(__name__)
+
+# getMultipleAccounts accepts at most 100 pubkeys per request
+MAX_ACCOUNTS_PER_REQUEST = 100
+# Compute units budgeted for one wallet's top-up (idempotent ATA create, transfer, sync) and for one close
+TOP_UP_UNITS = 40_000
+SWEEP_UNITS = 5_000
+FUNDING_TIMEOUT = 30
+
+
+@dataclass
+class WsolAccount:
+    owner: Pubkey
+    address: Pubkey
+    exists: bool = False
+    amount: int = 0
+
+
+class WsolAccounts:
+    """Long-lived wSOL accounts per wallet, funded in bulk and unwrapped back to SOL by a periodic sweep."""
+
+    def __init__(self, key_pairs: list[Keypair], top_up: float = WSOL_TOP_UP):
+        self.top_up_lamports = int(top_up * 10 ** 9)
+        self.key_pairs = {key_pair.pubkey(): key_pair for key_pair in key_pairs}
+        self.accounts = {owner: WsolAccount(owner, wsol_address(owner)) for owner in self.key_pairs}
+
+    def __contains__(self, owner: Pubkey) -> bool:
+        return owner in self.accounts
+
+    def get(self, owner: Pubkey) -> WsolAccount | None:
+        return self.accounts.get(owner)
+
+    async def refresh(self, client: AsyncClient, commitment: Commitment = Processed):
+        accounts = list(self.accounts.values())
+        chunks = [accounts[i:i + MAX_ACCOUNTS_PER_REQUEST] for i in range(0, len(accounts), MAX_ACCOUNTS_PER_REQUEST)]
+        responses = await asyncio.gather(*(
+            client.get_multiple_accounts([account.address for account in chunk], commitment,
+                                         data_slice=TOKEN_AMOUNT_SLICE)
+            for chunk in chunks))
+        for chunk, response in zip(chunks, responses):
+            for account, info in zip(chunk, response.value):
+                account.exists = info is not None
+                account.amount = decode_token_amount(bytes(info.data)) if info is not None else 0
+
+    def _funding_instructions(self, key_pair: Keypair, account: WsolAccount, lamports: int) -> list[Instruction]:
+        owner = key_pair.pubkey()
+        instructions = []
+        if not account.exists:
+            instructions.append(create_idempotent_associated_token_account(owner, owner, WSOL))
+        instructions.append(transfer(TransferParams(from_pubkey=owner, to_pubkey=account.address, lamports=lamports)))
+        instructions.append(sync_native(SyncNativeParams(account=account.address, program_id=TOKEN_PROGRAM_ID)))
+        account.exists = True
+        account.amount += lamports
+        return instructions
+
+    def spend_instructions(self, key_pair: Keypair, amount_in: int) -> tuple[Pubkey, list[Instruction]]:
+        # Hot path of a buy: nothing but the swap while the account holds enough, otherwise fund it inline with a
+        # full top-up so the following swaps can skip it again.
+        account = self.accounts[key_pair.pubkey()]
+        instructions = []
+        if account.amount < amount_in:
+            instructions = self._funding_instructions(key_pair, account, max(self.top_up_lamports, amount_in))
+        account.amount -= amount_in
+        return account.address, instructions
+
+    def receive_instructions(self, key_pair: Keypair) -> tuple[Pubkey, list[Instruction]]:
+        account = self.accounts[key_pair.pubkey()]
+        if account.exists:
+            return account.address, []
+        account.exists = True
+        return account.address, [create_idempotent_associated_token_account(key_pair.pubkey(), key_pair.pubkey(),
+                                                                             WSOL)]
+
+    async def _wait_funded(self, client: AsyncClient, owners: list[Pubkey], minimum: int):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + FUNDING_TIMEOUT
+        while loop.time() < deadline:
+            await asyncio.sleep(0.5)
+            await self.refresh(client)
+            if all(self.accounts[owner].amount >= minimum for owner in owners):
+                return
+        unfunded = sum(1 for owner in owners if self.accounts[owner].amount < minimum)
+        logger.warning("%s wSOL account(s) not funded after %ss, buys will fund them inline", unfunded, FUNDING_TIMEOUT)
+
+    async def _wait_closed(self, client: AsyncClient, sent: list, tracker: ConfirmationTracker | None) -> bool:
+        outcomes = [tracker.outcome(signature) for _, signature in sent if signature is not None] \
+            if tracker is not None else []
+        outcomes = [outcome for outcome in outcomes if outcome is not None]
+        if outcomes:
+            _, pending = await asyncio.wait(outcomes, timeout=FUNDING_TIMEOUT)
+            return not pending
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + FUNDING_TIMEOUT
+        owners = [group.key_pair.pubkey() for bundle, _ in sent for group in bundle.groups]
+        while loop.time() < deadline:
+            await asyncio.sleep(0.5)
+            await self.refresh(client)
+            if not any(self.accounts[owner].exists for owner in owners):
+                return True
+        return False
+
+    async def top_up(self, client: AsyncClient, minimum: int,
+                     blockhash_service: BlockhashService | None = None,
+                     tracker: ConfirmationTracker | None = None, owners: Iterable[Pubkey] | None = None):
+        await self.refresh(client)
+        owners = set(self.accounts if owners is None else owners)
+        groups = []
+        for owner, account in self.accounts.items():
+            if owner in owners and account.amount < minimum:
+                key_pair = self.key_pairs[owner]
+                lamports = max(self.top_up_lamports, minimum) - account.amount
+                instructions = self._funding_instructions(key_pair, account, lamports)
+                groups.append(SwapGroup(key_pair, instructions, units=TOP_UP_UNITS))
+        if not groups:
+            return
+        logger.info("Topping up %s wSOL account(s)", len(groups))
+        await send_bundles(client, groups, blockhash_service, tracker=tracker)
+        await self._wait_funded(client, [group.key_pair.pubkey() for group in groups], minimum)
+
+    async def sweep(self, client: AsyncClient, blockhash_service: BlockhashService | None = None,
+                    tracker: ConfirmationTracker | None = None, keep: Iterable[Pubkey] = (), minimum: int = 0):
+        # Closing a native account unwraps its whole balance; there is no partial unwrap. Owners in keep are due to
+        # spend at least minimum soon: theirs is only closed when it holds more than a top-up (sell proceeds pile up
+        # there) and is funded again in bulk once the close has landed, so only the surplus comes back as SOL.
+        keep = set(keep)
+        level = max(self.top_up_lamports, minimum)
+        await self.refresh(client)
+        groups = []
+        for owner, account in self.accounts.items():
+            if account.exists and (owner not in keep or account.amount > level):
+                close_instr = close_account(CloseAccountParams(account=account.address, dest=owner, owner=owner,
+                                                               program_id=TOKEN_PROGRAM_ID))
+                groups.append(SwapGroup(self.key_pairs[owner], [close_instr], units=SWEEP_UNITS))
+                account.exists = False
+                account.amount = 0
+        if not groups:
+            return
+        logger.info("Sweeping %s wSOL account(s) back to SOL", len(groups))
+        sent = await send_bundles(client, groups, blockhash_service, tracker=tracker)
+        refund = keep & {group.key_pair.pubkey() for group in groups}
+        if not refund:
+            return
+        if not await self._wait_closed(client, sent, tracker):
+            logger.warning("wSOL closes not confirmed after %ss, buys will fund their accounts inline", FUNDING_TIMEOUT)
+            return
+        await self.top_up(client, minimum, blockhash_service, tracker, owners=refund)